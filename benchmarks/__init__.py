@@ -0,0 +1,22 @@
+"""
+benchmarks
+==========
+
+Self-contained performance benchmarks for checklib.
+
+Synthetic netCDF files and a synthetic pyessv vocabulary archive are generated
+on local disk (see `benchmarks.generators`), so no example data or network
+access is needed. Every registered check, the vocabulary look-ups and the file
+name parsers are timed at several scales (see `benchmarks.runner`).
+
+Usage:
+    # Run the benchmarks and save the timings as a baseline
+    $ python -m benchmarks run --output baseline.json
+
+    # Run them again and compare with the baseline (exits with 1 on a slowdown)
+    $ python -m benchmarks run --baseline baseline.json
+
+    # Compare two sets of saved timings
+    $ python -m benchmarks compare baseline.json current.json
+
+"""
@@ -0,0 +1,6 @@
+import sys
+
+from benchmarks.runner import main
+
+
+sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+generators.py
+=============
+
+Generators of synthetic data for the benchmarks:
+
+ - `make_netcdf_file` writes a netCDF file of a given size, number of
+   variables, chunking and compression.
+ - `make_vocab_archive` writes a pyessv vocabulary archive whose terms
+   describe the files written by `make_netcdf_file`.
+
+The files are laid out as follows (with `n_variables` data variables):
+
+    dimensions:
+        time = <n_times> ; x = <n_x> ; station = <n_stations> ; strlen = 16 ; nv = 2 ;
+    variables:
+        double time(time) ;
+        double x(x) ;               (values: 0, 1, ..., n_x - 1)
+        double x_bnds(x, nv) ;
+        char station(station, strlen) ;
+        float var0(time, x) ;       (the main variable, if it is the biggest:
+                                     i.e. n_times > 2 and n_times * n_x > n_stations * 16)
+        float var1(time, station) ;
+        ...
+
+"""
+
+import os
+
+import numpy as np
+
+
+AUTHORITY = "bench"
+SCOPE = "synthetic"
+
+FREQUENCIES = ("day", "mon", "yr")
+
+_STRLEN = 16
+
+
+def get_station_names(n_stations):
+    "Returns the names of `n_stations` stations (in alphabetical order)."
+    return ["station-{:04d}".format(i) for i in range(n_stations)]
+
+
+def get_variable_attrs(i):
+    "Returns the attributes of data variable `i` (as also held in the vocabulary)."
+    return {"units": "K", "long_name": "Variable {}".format(i)}
+
+
+def get_file_name(label, frequency="day"):
+    """
+    Returns the name of a synthetic file: "var0_<frequency>_bench-<label>.nc"
+    (matching the order: "variable~frequency~regex:bench-.+").
+    """
+    return "var0_{}_bench-{}.nc".format(frequency, label)
+
+
+def make_netcdf_file(fpath, n_times=10, n_x=100, n_stations=10, n_variables=5,
+                     n_global_attrs=10, chunking=None, compression=None,
+                     file_format="NETCDF4_CLASSIC", frequency="day", seed=0):
+    """
+    Writes a synthetic netCDF file.
+
+    :param fpath: output file path [string]
+    :param n_times: length of the time dimension [integer]
+    :param n_x: length of the x dimension [integer]
+    :param n_stations: length of the station dimension [integer]
+    :param n_variables: number of data variables (at least 1) [integer]
+    :param n_global_attrs: number of extra global attributes [integer]
+    :param chunking: chunk shape of the main variable as (time, x), or None
+                     for contiguous storage [tuple]
+    :param compression: zlib compression level (1-9), or None [integer]
+    :param file_format: netCDF file format [string]
+    :param frequency: value of the "frequency" global attribute [string]
+    :param seed: seed of the random data [integer]
+    :return: fpath
+    """
+    from netCDF4 import Dataset
+
+    rng = np.random.default_rng(seed)
+    is_netcdf4 = file_format.startswith("NETCDF4")
+
+    def get_storage(shape):
+        "Returns the storage arguments of a data variable of the given shape."
+        if not is_netcdf4:
+            return {}
+
+        storage = {}
+        if compression:
+            storage.update({"zlib": True, "complevel": int(compression), "shuffle": True})
+        if chunking:
+            storage["chunksizes"] = tuple(max(1, min(chunk, size)) for chunk, size in zip(chunking, shape))
+        elif not compression:
+            storage["contiguous"] = True
+
+        return storage
+
+    with Dataset(fpath, "w", format=file_format) as ds:
+        ds.setncatts({"Conventions": "CF-1.6", "frequency": frequency, "variable": "var0",
+                      "title": "Synthetic benchmark data", "institution": "checklib"})
+        for i in range(n_global_attrs):
+            ds.setncattr("attr_{}".format(i), "value {}".format(i))
+
+        ds.createDimension("time", n_times)
+        ds.createDimension("x", n_x)
+        ds.createDimension("station", n_stations)
+        ds.createDimension("strlen", _STRLEN)
+        ds.createDimension("nv", 2)
+
+        time = ds.createVariable("time", "f8", ("time",))
+        time.setncatts({"units": "days since 1970-01-01", "long_name": "time"})
+        time[:] = np.arange(n_times, dtype="f8")
+
+        x = ds.createVariable("x", "f8", ("x",))
+        x.setncatts({"units": "m", "long_name": "x", "bounds": "x_bnds"})
+        x[:] = np.arange(n_x, dtype="f8")
+
+        x_bnds = ds.createVariable("x_bnds", "f8", ("x", "nv"))
+        x_bnds[:] = np.stack([np.arange(n_x) - 0.5, np.arange(n_x) + 0.5], axis=1)
+
+        station = ds.createVariable("station", "S1", ("station", "strlen"))
+        station[:] = np.array([list(name) + [""] * (_STRLEN - len(name))
+                               for name in get_station_names(n_stations)], dtype="S1")
+
+        var0 = ds.createVariable("var0", "f4", ("time", "x"), fill_value=np.float32(1e20),
+                                **get_storage((n_times, n_x)))
+        var0.setncatts(get_variable_attrs(0))
+        var0[:] = rng.uniform(0, 100, size=(n_times, n_x)).astype("f4")
+
+        for i in range(1, n_variables):
+            var = ds.createVariable("var{}".format(i), "f4", ("time", "station"),
+                                    fill_value=np.float32(1e20), **get_storage((n_times, n_stations)))
+            var.setncatts(get_variable_attrs(i))
+            var[:] = rng.uniform(0, 100, size=(n_times, n_stations)).astype("f4")
+
+    return fpath
+
+
+def make_vocab_archive(archive_dir, scope=SCOPE, n_terms=100, n_x=100, n_stations=10):
+    """
+    Writes a synthetic pyessv vocabulary archive (authority "bench") to
+    `archive_dir`, with a scope holding the collections:
+
+     - variable:   `n_terms` terms ("var0", "var1", ...) with the variable attributes as data
+     - frequency:  "day", "mon" and "yr"
+     - coordinate: "x" with its values and length as data
+     - dimension:  "time" and "x" with their lengths and attributes as data
+     - station:    `n_stations` station names
+
+    Note that pyessv must be imported with the 'PYESSV_ARCHIVE_HOME'
+    environment variable set to an existing directory. The vocabularies are
+    also held in memory by pyessv so they can be loaded in this process
+    straight away.
+
+    :param archive_dir: directory to write the archive to [string]
+    :param scope: name of the scope (one can be written for each scale) [string]
+    :param n_terms: number of terms in the "variable" collection [integer]
+    :param n_x: length of the x dimension of the files [integer]
+    :param n_stations: number of stations in the files [integer]
+    :return: vocabulary reference ("bench:<scope>") [string]
+    """
+    import pyessv
+    from pyessv import io_manager
+
+    if not os.path.isdir(archive_dir):
+        os.makedirs(archive_dir)
+
+    # Add the scope to the authority if it has already been created (in memory)
+    authority = (pyessv.load(AUTHORITY, verbose=False) or
+                 pyessv.create_authority(AUTHORITY, "Synthetic benchmark vocabularies"))
+    vocab_scope = pyessv.create_scope(authority, scope, "Synthetic benchmark scope")
+
+    collection = pyessv.create_collection(vocab_scope, "variable", "Variables")
+    for i in range(n_terms):
+        pyessv.create_term(collection, "var{}".format(i), label="var{}".format(i),
+                           data=get_variable_attrs(i))
+
+    collection = pyessv.create_collection(vocab_scope, "frequency", "Frequencies")
+    for frequency in FREQUENCIES:
+        pyessv.create_term(collection, frequency, label=frequency)
+
+    collection = pyessv.create_collection(vocab_scope, "coordinate", "Coordinates")
+    pyessv.create_term(collection, "x", data={"value": [float(i) for i in range(n_x)],
+                                              "length": n_x})
+
+    collection = pyessv.create_collection(vocab_scope, "dimension", "Dimensions")
+    pyessv.create_term(collection, "time", data={"length": "<n>", "units": "days since 1970-01-01",
+                                                 "long_name": "time"})
+    pyessv.create_term(collection, "x", data={"length": str(n_x), "units": "m", "long_name": "x"})
+
+    collection = pyessv.create_collection(vocab_scope, "station", "Stations")
+    for name in get_station_names(n_stations):
+        pyessv.create_term(collection, name)
+
+    io_manager.write(authority, archive_dir)
+    return "{}:{}".format(AUTHORITY, scope)
@@ -0,0 +1,434 @@
+"""
+runner.py
+=========
+
+Runs the benchmarks and compares their timings with a baseline.
+
+For each scale (see `SCALES`) a vocabulary scope and a set of netCDF files
+(one per storage layout, see `LAYOUTS`) are generated. The following are
+then timed:
+
+ - check/<check>/<layout>: calling each registered check on an open Dataset
+   (or the file path, for checks of files)
+ - suite/<layout>: a `CheckSuite` of all checks run on the file (including
+   opening and closing it)
+ - vocab/...: loading the vocabularies and looking up terms and values
+ - file_name/...: building a file name parser and parsing many file names
+
+Each benchmark is called enough times to take at least `min_time` seconds and
+this is repeated `repeat` times. The best time per call is recorded, as it is
+the least affected by other activity on the machine.
+
+Timings are saved as JSON:
+
+    {"meta": {"python": ..., "platform": ..., "checklib": ..., "created": ...},
+     "benchmarks": {"<scale>/<benchmark>": {"seconds": ..., "number": ..., "repeat": ...}}}
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks import generators
+
+
+# Sizes of the generated data
+SCALES = {
+    "tiny": {"n_times": 4, "n_x": 50, "n_stations": 3, "n_variables": 2, "n_terms": 10,
+             "n_file_names": 10},
+    "small": {"n_times": 10, "n_x": 100, "n_stations": 10, "n_variables": 5, "n_terms": 100,
+              "n_file_names": 100},
+    "medium": {"n_times": 100, "n_x": 1000, "n_stations": 50, "n_variables": 20, "n_terms": 1000,
+               "n_file_names": 1000},
+    "large": {"n_times": 1000, "n_x": 10000, "n_stations": 100, "n_variables": 50, "n_terms": 5000,
+              "n_file_names": 10000},
+}
+
+DEFAULT_SCALES = ["small", "medium"]
+
+# Storage layouts of the generated files: arguments of `generators.make_netcdf_file`
+LAYOUTS = {
+    "contiguous": {"chunking": None, "compression": None},
+    "chunked-zlib": {"chunking": (10, 100), "compression": 4},
+}
+
+FILE_FORMAT = "NETCDF4_CLASSIC"
+
+# File name components: as in the files written by `generators.make_netcdf_file`
+FILE_NAME_ORDER = ["variable", "frequency", "regex:bench-.+"]
+
+# A slowdown of more than this fraction fails the comparison
+DEFAULT_TOLERANCE = 0.25
+
+# Differences of less than this (in seconds per call) are ignored as noise
+DEFAULT_MIN_SECONDS = 1e-6
+
+
+def get_check_configs(vocabulary_ref, file_format=FILE_FORMAT):
+    """
+    Returns the configuration of each registered check for the generated data,
+    as a dictionary of {check name: (kwargs, primary argument type)}. The
+    primary argument type is "ds" (an open Dataset) or "path" (the file path).
+
+    :param vocabulary_ref: vocabulary reference [string]
+    :param file_format: format of the generated files [string]
+    :return: dictionary
+    """
+    vocab = {"vocabulary_ref": vocabulary_ref}
+
+    return {
+        "FileNameRegexCheck": ({"regex": "var0_day_bench-.+\\.nc"}, "path"),
+        "FileNameStructureCheck": ({"delimiter": "_", "extension": ".nc"}, "path"),
+        "FileSizeCheck": ({"threshold": 2}, "path"),
+        "GlobalAttrRegexCheck": ({"attribute": "Conventions", "regex": "CF-\\d+\\.\\d+"}, "ds"),
+        "GlobalAttrVocabCheck": (dict(vocab, attribute="frequency",
+                                      vocab_lookup="frequency:raw_name"), "ds"),
+        "MainVariableAttributeCheck": ({"attr_name": "units", "attr_value": "K"}, "ds"),
+        "MainVariableTypeCheck": ({"dtype": "float32"}, "ds"),
+        "MultiGlobalAttrRegexCheck": ({"checks": [
+            {"attribute": "Conventions", "regex": "CF-\\d+\\.\\d+"},
+            {"attribute": "frequency", "regex": "day|mon|yr"}]}, "ds"),
+        "NCArrayMatchesVocabTermsCheck": (dict(vocab, var_id="station",
+                                               pyessv_namespace="station"), "ds"),
+        "NCCoordVarHasBoundsCheck": ({"var_id": "x"}, "ds"),
+        "NCCoordVarHasLengthInVocabCheck": (dict(vocab, var_id="x"), "ds"),
+        "NCCoordVarHasValuesInVocabCheck": (dict(vocab, var_id="x"), "ds"),
+        "NCFileIsReadableCheck": ({"file_format": file_format}, "ds"),
+        "NCFileSoftwareCheck": ({}, "path"),
+        "NCMainVariableMetadataCheck": (dict(vocab, pyessv_namespace="variable"), "ds"),
+        "NCVariableMetadataCheck": (dict(vocab, var_id="var1", pyessv_namespace="variable"), "ds"),
+        "NetCDFDimensionCheck": (dict(vocab, dim_id="x", pyessv_namespace="dimension"), "ds"),
+        "NetCDFFormatCheck": ({"format": file_format}, "ds"),
+        "OneMainVariablePerFileCheck": ({}, "ds"),
+        "ValidGlobalAttrsMatchFileNameCheck": (dict(vocab, order="~".join(FILE_NAME_ORDER)), "ds"),
+        "VariableExistsInFileCheck": ({"var_id": "var0"}, "ds"),
+        "VariableRangeCheck": ({"var_id": "var0", "minimum": 0, "maximum": 100}, "ds"),
+        "VariableTypeCheck": ({"var_id": "var0", "dtype": "float32"}, "ds"),
+    }
+
+
+def time_callable(func, repeat=3, min_time=0.05, max_number=100000):
+    """
+    Times calls of `func()`. The number of calls per repeat is increased until
+    they take at least `min_time` seconds. The first call is not timed, so
+    that one-off costs (e.g. imports) are excluded.
+
+    :param func: function that takes no arguments
+    :param repeat: number of times to repeat the timing [integer]
+    :param min_time: minimum time of each repeat (in seconds) [float]
+    :param max_number: maximum number of calls per repeat [integer]
+    :return: tuple of (best time per call in seconds, number of calls per repeat)
+    """
+    def run(number):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+
+    func()
+
+    number = 1
+    duration = run(number)
+
+    while duration < min_time and number < max_number:
+        number = min(max_number, number * max(2, int(min_time / max(duration, 1e-9))))
+        duration = run(number)
+
+    timings = [duration] + [run(number) for _ in range(repeat - 1)]
+    return min(timings) / number, number
+
+
+def _get_file_names(n_file_names):
+    "Returns a mix of valid and invalid file names to parse."
+    names = []
+
+    for i in range(n_file_names):
+        frequency = generators.FREQUENCIES[i % len(generators.FREQUENCIES)]
+        name = "var{}_{}_bench-{}.nc".format(i % 10, frequency, i)
+
+        # Every fourth name is invalid
+        if i % 4 == 3:
+            name = name.replace("_bench", "_other")
+
+        names.append(name)
+
+    return names
+
+
+class BenchmarkRunner(object):
+    """
+    Generates the data for the benchmarks, runs them and collects the timings.
+
+    Usage:
+        runner = BenchmarkRunner(scales=["small"])
+        timings = runner.run()
+    """
+
+    def __init__(self, scales=None, work_dir=None, repeat=3, min_time=0.05, pattern=None,
+                 verbose=False):
+        """
+        :param scales: names of the scales to run (default: DEFAULT_SCALES) [list]
+        :param work_dir: directory for the generated data (default: a temporary
+                         directory that is removed afterwards) [string]
+        :param repeat: number of times to repeat each timing [integer]
+        :param min_time: minimum time of each repeat (in seconds) [float]
+        :param pattern: only run benchmarks whose names match this regex [string]
+        :param verbose: if True, print each timing as it is made [boolean]
+        """
+        self.scales = list(scales or DEFAULT_SCALES)
+        self.work_dir = work_dir
+        self.repeat = repeat
+        self.min_time = min_time
+        self.pattern = re.compile(pattern) if pattern else None
+        self.verbose = verbose
+        self.timings = {}
+
+        unknown = [scale for scale in self.scales if scale not in SCALES]
+        if unknown:
+            raise ValueError("Unknown scales: {} (choose from: {}).".format(unknown, sorted(SCALES)))
+
+    def _time(self, name, func):
+        if self.pattern and not self.pattern.search(name):
+            return
+
+        seconds, number = time_callable(func, repeat=self.repeat, min_time=self.min_time)
+        self.timings[name] = {"seconds": seconds, "number": number, "repeat": self.repeat}
+
+        if self.verbose:
+            print("{:<70} {:>12.3f} us".format(name, seconds * 1e6))
+
+    def run(self):
+        """
+        Runs the benchmarks for each scale.
+
+        :return: dictionary of timings (see module docstring)
+        """
+        work_dir = self.work_dir or tempfile.mkdtemp(prefix="checklib-benchmarks-")
+        archive_dir = os.path.join(work_dir, "pyessv-archive")
+
+        if not os.path.isdir(archive_dir):
+            os.makedirs(archive_dir)
+
+        # pyessv loads the archive when it is first imported, so this must be set first
+        os.environ["PYESSV_ARCHIVE_HOME"] = archive_dir
+
+        try:
+            for scale in self.scales:
+                self._run_scale(scale, work_dir, archive_dir)
+        finally:
+            if not self.work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        from checklib import __version__
+
+        meta = {"python": platform.python_version(), "platform": platform.platform(),
+                "machine": platform.machine(), "checklib": __version__,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        return {"meta": meta, "benchmarks": dict(sorted(self.timings.items()))}
+
+    def _run_scale(self, scale, work_dir, archive_dir):
+        params = SCALES[scale]
+        vocabulary_ref = generators.make_vocab_archive(
+            archive_dir, scope="{}-{}".format(generators.SCOPE, scale), n_terms=params["n_terms"],
+            n_x=params["n_x"], n_stations=params["n_stations"])
+
+        scale_dir = os.path.join(work_dir, scale)
+        if not os.path.isdir(scale_dir):
+            os.makedirs(scale_dir)
+
+        self._run_vocab_benchmarks(scale, vocabulary_ref, params)
+
+        for layout, storage in LAYOUTS.items():
+            fpath = os.path.join(scale_dir, generators.get_file_name("{}-{}".format(scale, layout)))
+            generators.make_netcdf_file(fpath, n_times=params["n_times"], n_x=params["n_x"],
+                                        n_stations=params["n_stations"],
+                                        n_variables=params["n_variables"],
+                                        file_format=FILE_FORMAT, **storage)
+
+            self._run_check_benchmarks(scale, layout, fpath, vocabulary_ref)
+
+    def _run_check_benchmarks(self, scale, layout, fpath, vocabulary_ref):
+        from netCDF4 import Dataset
+
+        from checklib.checks import ALL_CHECKS
+        from checklib.register import get_check_class
+        from checklib.suite import CheckSuite
+
+        configs = get_check_configs(vocabulary_ref)
+        missing = sorted(set(ALL_CHECKS) - set(configs))
+
+        if missing:
+            raise Exception("No benchmark configuration for checks: {}.".format(missing))
+
+        checks = []
+
+        with Dataset(fpath) as ds:
+            for name in ALL_CHECKS:
+                kwargs, arg_type = configs[name]
+                check = get_check_class(name)(kwargs=kwargs, vocabulary_ref=kwargs.get("vocabulary_ref"))
+                checks.append(check)
+
+                primary_arg = ds if arg_type == "ds" else fpath
+                self._time("{}/check/{}/{}".format(scale, name, layout),
+                           lambda: check(primary_arg))
+
+        suite = CheckSuite(checks)
+        self._time("{}/suite/{}".format(scale, layout), lambda: suite.run(fpath))
+
+    def _run_vocab_benchmarks(self, scale, vocabulary_ref, params):
+        from checklib.cvs.ess_vocabs import ESSVocabs
+
+        authority, scope = vocabulary_ref.split(":")
+        vocabs = ESSVocabs(authority, scope)
+        term_ids = ["variable:var{}".format(i) for i in range(params["n_terms"])]
+        file_names = _get_file_names(params["n_file_names"])
+
+        def get_values(vocabs):
+            for term_id in term_ids:
+                vocabs.get_value(term_id, "data")
+
+        # Cold: new instances, so that every index, cache and parser is built
+        self._time("{}/vocab/load".format(scale), lambda: ESSVocabs(authority, scope))
+        self._time("{}/vocab/get_value/cold".format(scale),
+                   lambda: get_values(ESSVocabs(authority, scope)))
+        self._time("{}/vocab/get_allowed_values/cold".format(scale),
+                   lambda: ESSVocabs(authority, scope).get_allowed_values("variable", "raw_name"))
+        self._time("{}/vocab/get_version/cold".format(scale),
+                   lambda: ESSVocabs(authority, scope).get_version())
+        self._time("{}/file_name/parser/cold".format(scale),
+                   lambda: ESSVocabs(authority, scope)._get_file_name_parser(FILE_NAME_ORDER, "_"))
+
+        # Warm: the shared instance
+        get_values(vocabs)
+        self._time("{}/vocab/get_value/warm".format(scale), lambda: get_values(vocabs))
+        self._time("{}/vocab/get_array_mismatch".format(scale),
+                   lambda: vocabs.get_array_mismatch(generators.get_station_names(params["n_stations"]),
+                                                     "station"))
+        self._time("{}/file_name/check_file_name".format(scale),
+                   lambda: [vocabs.check_file_name(name, keys=FILE_NAME_ORDER) for name in file_names])
+        self._time("{}/file_name/check_file_names".format(scale),
+                   lambda: vocabs.check_file_names(file_names, keys=FILE_NAME_ORDER))
+
+
+def load_timings(path):
+    "Loads timings from the JSON file at `path`."
+    with open(path) as reader:
+        return json.load(reader)
+
+
+def save_timings(timings, path):
+    "Saves `timings` to the JSON file at `path`."
+    with open(path, "w") as writer:
+        json.dump(timings, writer, indent=2, sort_keys=True)
+        writer.write("\n")
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE, min_seconds=DEFAULT_MIN_SECONDS):
+    """
+    Compares two sets of timings. A benchmark has slowed down if it takes more
+    than (1 + `tolerance`) times as long as in the baseline, and at least
+    `min_seconds` longer. Benchmarks that are only in one set are ignored.
+
+    :param baseline: baseline timings [dictionary]
+    :param current: current timings [dictionary]
+    :param tolerance: allowed fractional slowdown [float]
+    :param min_seconds: allowed absolute slowdown (in seconds per call) [float]
+    :return: tuple of (list of rows: (name, baseline seconds, current seconds,
+             ratio, slowed down: boolean), list of names of slowed down benchmarks)
+    """
+    rows = []
+
+    for name, base in sorted(baseline["benchmarks"].items()):
+        if name not in current["benchmarks"]:
+            continue
+
+        base_seconds = base["seconds"]
+        current_seconds = current["benchmarks"][name]["seconds"]
+        ratio = current_seconds / base_seconds if base_seconds else float("inf")
+
+        slower = (ratio > 1 + tolerance and current_seconds - base_seconds > min_seconds)
+        rows.append((name, base_seconds, current_seconds, ratio, slower))
+
+    return rows, [row[0] for row in rows if row[4]]
+
+
+def print_comparison(rows, stream=None):
+    "Prints the rows returned by `compare` as a table."
+    stream = stream or sys.stdout
+    stream.write("{:<70} {:>14} {:>14} {:>8}\n".format("benchmark", "baseline (us)", "current (us)", "ratio"))
+
+    for name, base_seconds, current_seconds, ratio, slower in rows:
+        stream.write("{:<70} {:>14.3f} {:>14.3f} {:>8.2f}{}\n".format(
+                     name, base_seconds * 1e6, current_seconds * 1e6, ratio,
+                     "  SLOWER" if slower else ""))
+
+
+def _report(baseline, current, tolerance, min_seconds):
+    rows, slower = compare(baseline, current, tolerance=tolerance, min_seconds=min_seconds)
+    print_comparison(rows)
+
+    if slower:
+        print("\n{} benchmark(s) slower than the baseline by more than {:.0%}:".format(
+              len(slower), tolerance))
+        for name in slower:
+            print("    {}".format(name))
+        return 1
+
+    print("\nNo benchmarks slower than the baseline by more than {:.0%}.".format(tolerance))
+    return 0
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Run checklib benchmarks and compare timings.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("--scale", action="append", choices=sorted(SCALES), dest="scales",
+                            help="Scale to run (can be repeated; default: {}).".format(
+                                 ", ".join(DEFAULT_SCALES)))
+    run_parser.add_argument("--repeat", type=int, default=3, help="Repeats of each timing.")
+    run_parser.add_argument("--min-time", type=float, default=0.05,
+                            help="Minimum time of each repeat (in seconds).")
+    run_parser.add_argument("--filter", dest="pattern",
+                            help="Only run benchmarks whose names match this regex.")
+    run_parser.add_argument("--work-dir", help="Directory for the generated data "
+                                               "(default: a temporary directory).")
+    run_parser.add_argument("--output", help="Save the timings to this JSON file.")
+    run_parser.add_argument("--baseline", help="Compare the timings with this JSON file.")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two sets of saved timings.")
+    compare_parser.add_argument("baseline", help="Baseline timings (JSON file).")
+    compare_parser.add_argument("current", help="Current timings (JSON file).")
+
+    for subparser in (run_parser, compare_parser):
+        subparser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                               help="Allowed fractional slowdown (default: %(default)s).")
+        subparser.add_argument("--min-seconds", type=float, default=DEFAULT_MIN_SECONDS,
+                               help="Allowed absolute slowdown per call (default: %(default)s).")
+
+    args = parser.parse_args(args)
+
+    if args.command == "compare":
+        return _report(load_timings(args.baseline), load_timings(args.current),
+                       args.tolerance, args.min_seconds)
+
+    runner = BenchmarkRunner(scales=args.scales, work_dir=args.work_dir, repeat=args.repeat,
+                             min_time=args.min_time, pattern=args.pattern, verbose=True)
+    timings = runner.run()
+
+    if args.output:
+        save_timings(timings, args.output)
+
+    if args.baseline:
+        print()
+        return _report(load_timings(args.baseline), timings, args.tolerance, args.min_seconds)
+
+    return 0
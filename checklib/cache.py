@@ -0,0 +1,404 @@
+"""
+cache.py
+========
+
+Caches of check results.
+
+`ResultCache` is a persistent (SQLite) cache of check results.
+
+Results are keyed by the identity of the file (path, size, modification time,
+inode and, optionally, a hash of its content) and the configuration hash of
+the check (see `CallableCheckBase.get_config_hash`), which includes the
+versions of checklib and of the check. A cached result is returned without
+opening the file, so re-running checks over an unchanged archive only does
+work for the files that have changed.
+
+`HeaderResultMemo` is an in-memory store of the results of header-only checks,
+keyed by the fingerprint of the file header (see `nc_util.get_header_fingerprint`),
+so that files with identical headers are only checked once.
+
+"""
+
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from checklib.code import file_util
+
+
+# Number of results stored between automatic evictions
+_EVICT_INTERVAL = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    file_key TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    fpath TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (file_key, config_hash)
+);
+CREATE INDEX IF NOT EXISTS results_fpath ON results (fpath, config_hash);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+"""
+
+
+def _result_to_dict(result):
+    data = {"weight": result.weight, "value": result.value, "name": result.name,
+            "msgs": list(result.msgs), "variable_name": result.variable_name,
+            "children": [_result_to_dict(child) for child in result.children]}
+
+    if hasattr(result, "details"):
+        data["details"] = result.details
+
+    return data
+
+
+def _result_from_dict(data):
+    from compliance_checker.base import Result
+
+    value = data["value"]
+    if isinstance(value, list):
+        value = tuple(value)
+
+    result = Result(data["weight"], value, data["name"], data["msgs"],
+                    children=[_result_from_dict(child) for child in data["children"]],
+                    variable_name=data["variable_name"])
+
+    if "details" in data:
+        result.details = data["details"]
+
+    return result
+
+
+def get_content_hash(fpath, block_size=2**20):
+    """
+    Returns the SHA-256 hash of the content of the file at `fpath`.
+
+    :param fpath: file path [string] or StatFile object
+    :param block_size: number of bytes read at a time [integer]
+    :return: hex digest [string]
+    """
+    digest = hashlib.sha256()
+
+    with open(os.fspath(fpath), "rb") as reader:
+        for block in iter(lambda: reader.read(block_size), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """
+    SQLite-backed cache of check results.
+
+    Usage:
+        cache = ResultCache("results.sqlite", max_age=30 * 86400)
+        result = cache.get(fpath, check)
+        if result is None:
+            result = check(...)
+            cache.put(fpath, check, result)
+
+    The cache can be shared by several processes (each opens its own
+    connection to the database when first used).
+    """
+
+    def __init__(self, path, max_age=None, max_entries=None, hash_content=False):
+        """
+        :param path: path to the SQLite database file [string]
+        :param max_age: results older than this (in seconds) are evicted [float]
+        :param max_entries: maximum number of results kept - the least recently
+                            used are evicted [integer]
+        :param hash_content: if True, include a hash of the file content in the
+                             file identity (this reads the whole file) [boolean]
+        """
+        self.path = os.fspath(path)
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.hash_content = hash_content
+
+        self.hits = 0
+        self.misses = 0
+        self._n_puts = 0
+        self._conn = None
+        self._pid = None
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        # Each process opens its own connection (and counts its own hits/misses)
+        state = self.__dict__.copy()
+        state.update({"_conn": None, "_pid": None, "_lock": None,
+                      "hits": 0, "misses": 0, "_n_puts": 0})
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def _get_connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+            self._conn, self._pid = conn, os.getpid()
+
+        return self._conn
+
+    def get_file_key(self, fpath):
+        """
+        Returns a key identifying the file at `fpath` in its current state.
+
+        :param fpath: file path [string] or StatFile object
+        :return: key [string]
+        """
+        if not isinstance(fpath, file_util.StatFile):
+            fpath = file_util.StatFile(fpath)
+
+        st = fpath.stat()
+        identity = [os.path.realpath(fpath.filepath()), st.st_size, st.st_mtime_ns, st.st_ino]
+
+        if self.hash_content:
+            identity.append(get_content_hash(fpath))
+
+        return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()
+
+    def get(self, fpath, check, file_key=None):
+        """
+        Returns the cached Result of `check` for the file at `fpath`, or None
+        if there is no cached result (or the file cannot be stat-ed).
+
+        :param fpath: file path [string] or StatFile object
+        :param check: check instance
+        :param file_key: key from `get_file_key` (computed if not given) [string]
+        :return: Result object or None
+        """
+        try:
+            file_key = file_key or self.get_file_key(fpath)
+        except OSError:
+            self.misses += 1
+            return None
+
+        config_hash = check.get_config_hash()
+
+        with self._lock:
+            conn = self._get_connection()
+            row = conn.execute("SELECT result FROM results WHERE file_key = ? AND config_hash = ?",
+                               (file_key, config_hash)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+            with conn:
+                conn.execute("UPDATE results SET last_used = ? WHERE file_key = ? AND config_hash = ?",
+                             (time.time(), file_key, config_hash))
+
+        return _result_from_dict(json.loads(row[0]))
+
+    def put(self, fpath, check, result, file_key=None):
+        """
+        Stores the Result of `check` for the file at `fpath`. Any result for an
+        earlier state of the same file (and check) is replaced.
+
+        :param fpath: file path [string] or StatFile object
+        :param check: check instance
+        :param result: Result object
+        :param file_key: key from `get_file_key` (computed if not given) [string]
+        """
+        try:
+            file_key = file_key or self.get_file_key(fpath)
+        except OSError:
+            return
+
+        config_hash = check.get_config_hash()
+        path = os.path.realpath(os.fspath(fpath))
+        now = time.time()
+        encoded = json.dumps(_result_to_dict(result), default=repr)
+
+        with self._lock:
+            conn = self._get_connection()
+
+            with conn:
+                conn.execute("DELETE FROM results WHERE fpath = ? AND config_hash = ? AND file_key != ?",
+                             (path, config_hash, file_key))
+                conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                             (file_key, config_hash, path, encoded, now, now))
+
+            self._n_puts += 1
+
+            if self._n_puts % _EVICT_INTERVAL == 0:
+                self.evict()
+
+    def evict(self, max_age=None, max_entries=None):
+        """
+        Removes results older than `max_age` seconds and then the least
+        recently used results beyond `max_entries` (defaulting to the values
+        set for the cache).
+
+        :param max_age: maximum age (in seconds) [float]
+        :param max_entries: maximum number of results [integer]
+        :return: number of results removed [integer]
+        """
+        max_age = max_age if max_age is not None else self.max_age
+        max_entries = max_entries if max_entries is not None else self.max_entries
+        removed = 0
+
+        with self._lock:
+            conn = self._get_connection()
+
+            with conn:
+                if max_age is not None:
+                    removed += conn.execute("DELETE FROM results WHERE created < ?",
+                                            (time.time() - max_age,)).rowcount
+
+                if max_entries is not None:
+                    removed += conn.execute(
+                        "DELETE FROM results WHERE rowid NOT IN (SELECT rowid FROM results "
+                        "ORDER BY last_used DESC LIMIT ?)", (max_entries,)).rowcount
+
+        return removed
+
+    def clear(self):
+        "Removes all results from the cache."
+        with self._lock:
+            conn = self._get_connection()
+
+            with conn:
+                conn.execute("DELETE FROM results")
+
+    def __len__(self):
+        with self._lock:
+            return self._get_connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def stats(self):
+        """
+        Returns a dictionary of usage statistics for the cache (in this process).
+
+        :return: dictionary of: entries, hits, misses, hit_rate
+        """
+        lookups = self.hits + self.misses
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses,
+                "hit_rate": float(self.hits) / lookups if lookups else 0.0}
+
+    def close(self):
+        "Evicts old results (if limits are set) and closes the database connection."
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                if self.max_age is not None or self.max_entries is not None:
+                    self.evict()
+                self._conn.close()
+
+            self._conn = None
+
+
+class HeaderResultMemo(object):
+    """
+    Thread-safe, bounded, in-memory store of the results of header-only checks
+    (those with `header_only = True`), keyed by the header fingerprint of the
+    Dataset and the configuration hash of the check. For checks that depend on
+    the file name (`uses_file_name = True`) the file name is also in the key.
+    The least recently used results are dropped when `max_size` is exceeded.
+
+    Usage:
+        memo = HeaderResultMemo()
+        result = memo.get(ds, check)
+        if result is None:
+            result = check(ds)
+            memo.put(ds, check, result)
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_memoizable(check):
+        "Returns True if results of `check` can be stored in the memo."
+        return check.header_only
+
+    def _get_key(self, ds, check):
+        from checklib.code import nc_util
+
+        key = (nc_util.get_header_fingerprint(ds), check.get_config_hash())
+
+        if check.uses_file_name:
+            key += (os.path.basename(ds.filepath()),)
+
+        return key
+
+    def get(self, ds, check):
+        """
+        Returns (a copy of) the stored Result of `check` for a Dataset with
+        the same header as `ds`, or None if there is no stored result.
+
+        :param ds: netCDF4 Dataset object
+        :param check: check instance
+        :return: Result object or None
+        """
+        key = self._get_key(ds, check)
+
+        with self._lock:
+            result = self._results.get(key)
+
+            if result is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._results.move_to_end(key)
+
+        return copy.deepcopy(result)
+
+    def put(self, ds, check, result):
+        """
+        Stores (a copy of) the Result of `check` for the header of `ds`.
+
+        :param ds: netCDF4 Dataset object
+        :param check: check instance
+        :param result: Result object
+        """
+        key = self._get_key(ds, check)
+        result = copy.deepcopy(result)
+
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def __len__(self):
+        return len(self._results)
+
+    def stats(self):
+        """
+        Returns a dictionary of usage statistics for the memo.
+
+        :return: dictionary of: size, max_size, hits, misses, hit_rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._results), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_rate": float(self.hits) / lookups if lookups else 0.0}
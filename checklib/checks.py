@@ -1,9 +1,20 @@
-# Top-level location of all checks so that they can easily be located
+# Top-level location of all checks so that they can easily be located.
+# Each check is imported from its register module on first access, so
+# `from checklib.checks import *` imports them all.
 
-from .register.nc_coords_checks_register import *
-from .register.nc_var_checks_register import *
-from .register.nc_file_checks_register import *
-from .register.format_checks_register import *
-from .register.file_checks_register import *
+from .register import CHECK_MODULES, get_check_class
 
-ALL_CHECKS = [check for check in dir() if check.endswith("Check")]
+ALL_CHECKS = sorted(CHECK_MODULES)
+
+__all__ = ALL_CHECKS + ["ALL_CHECKS"]
+
+
+def __getattr__(name):
+    if name in CHECK_MODULES:
+        return get_check_class(name)
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(ALL_CHECKS))
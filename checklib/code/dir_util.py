@@ -7,8 +7,75 @@ that gets scanned for its contents.
 
 """
 
+import fnmatch
+import itertools
 import os
 
+from checklib.code.file_util import StatFile
+
+
+def _matches_any(name, patterns):
+    "Returns True if `name` matches any of the glob `patterns`."
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def iter_files_in_dir(dr, include=None, exclude=None, max_depth=None):
+    """
+    Generator that yields the files under directory `dr` (as they are found,
+    using `os.scandir`). Each file is yielded as a StatFile object so that its
+    stat result is cached for later use.
+
+    Glob patterns are matched against the file name. Directories whose names
+    match an `exclude` pattern are not scanned. Directories that cannot be
+    read are skipped (as with `os.walk`) and symbolic links to directories are
+    not followed.
+
+    :param dr: directory path [string]
+    :param include: glob patterns - only yield files matching one of these [list]
+    :param exclude: glob patterns - do not yield files matching any of these [list]
+    :param max_depth: maximum depth of sub-directories to scan (0 means
+                      only the files directly in `dr`) [integer or None]
+    :return: generator of StatFile objects
+    """
+    include = list(include or [])
+    exclude = list(exclude or [])
+    dirs = [(os.fspath(dr), 0)]
+
+    while dirs:
+        current, depth = dirs.pop()
+
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+
+        sub_dirs = []
+
+        with entries:
+            for entry in entries:
+                if exclude and _matches_any(entry.name, exclude):
+                    continue
+
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if max_depth is None or depth < max_depth:
+                            sub_dirs.append((entry.path, depth + 1))
+                        continue
+
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+
+                if include and not _matches_any(entry.name, include):
+                    continue
+
+                yield StatFile.from_dir_entry(entry)
+
+        # Scan sub-directories in the order they were found
+        dirs.extend(reversed(sub_dirs))
+
+
 def get_files_in_dir(dr):
     """
     Returns paths to all the files under directory `dr`.
@@ -16,22 +83,20 @@ def get_files_in_dir(dr):
     :param dr: directory path [string]
     :return: list of file paths
     """
-    files = []
-
-    for root, dirs, files in os.walk(dr):
-        for filename in files:
-            files.append(os.path.join(root, filename))
-    return files
+    return [stat_file.filepath() for stat_file in iter_files_in_dir(dr)]
 
 
 def has_too_many_files(dr, n):
     """
-    Returns True if more files in `dr` than threshold `n`.
+    Returns True if more files in `dr` than threshold `n`. The scan stops as
+    soon as the threshold is crossed.
 
     :param dr: directory [string]
     :param n:  threshold for number of files in directory [integer]
     :return: boolean
     """
-    if len(get_files_in_dir(dr)) > n:
+    extra_files = itertools.islice(iter_files_in_dir(dr), int(n), None)
+
+    if next(extra_files, None) is not None:
         return True
     return False
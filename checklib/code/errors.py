@@ -4,3 +4,7 @@ class ParameterError(Exception):
 
 class FileError(Exception):
     pass
+
+
+class RegistryError(Exception):
+    pass
@@ -7,9 +7,96 @@ Utilities for interrogating files (without reading them).
 """
 
 import os
+import stat
+
+# Magic numbers at the start of netCDF classic format files
+_CDF_FORMATS = {b"CDF\x01": "NETCDF3_CLASSIC",
+                b"CDF\x02": "NETCDF3_64BIT_OFFSET",
+                b"CDF\x05": "NETCDF3_64BIT_DATA"}
+
+# Smallest valid size of each netCDF classic format file: the magic number, the
+# number of records and the (empty) dimension, attribute and variable lists
+_CDF_MIN_SIZES = {"NETCDF3_CLASSIC": 32,
+                  "NETCDF3_64BIT_OFFSET": 32,
+                  "NETCDF3_64BIT_DATA": 48}
+
+# HDF5 signature (used by netCDF-4 files) and the largest offset searched for it
+_HDF5_SIGNATURE = b"\x89HDF\r\n\x1a\n"
+_HDF5_MAX_SIGNATURE_OFFSET = 2**20
+
+# Formats that a netCDF-4 (HDF5) file can have
+_HDF5_FORMATS = ("NETCDF4", "NETCDF4_CLASSIC")
+
+
+class StatFile(object):
+    """
+    A file path together with its `os.stat` result. The file is only stat-ed
+    once (on first request) so that several file checks can share the result.
+    It provides a `filepath()` method, like netCDF4 Dataset and GenericFile
+    objects, so that it can be given to file checks as the primary argument.
+    """
+    __slots__ = ("_fpath", "_stat", "_entry")
+
+    def __init__(self, fpath, stat_result=None):
+        self._fpath = os.fspath(fpath)
+        self._stat = stat_result
+        self._entry = None
+
+    @classmethod
+    def from_dir_entry(cls, entry):
+        """
+        Returns a StatFile for an `os.DirEntry` (from `os.scandir`). The stat
+        is taken from the entry (when first requested) so that any result it
+        has already cached is reused.
+
+        :param entry: os.DirEntry object
+        :return: StatFile object
+        """
+        stat_file = cls(entry.path)
+        stat_file._entry = entry
+        return stat_file
+
+    def filepath(self):
+        return self._fpath
+
+    def stat(self):
+        "Returns the (cached) `os.stat_result` for the file."
+        if self._stat is None:
+            if self._entry is not None:
+                self._stat = self._entry.stat()
+                self._entry = None
+            else:
+                self._stat = os.stat(self._fpath)
+        return self._stat
+
+    def is_file(self):
+        "Returns True if the path exists and is a regular file."
+        try:
+            return stat.S_ISREG(self.stat().st_mode)
+        except OSError:
+            return False
+
+    def __fspath__(self):
+        return self._fpath
+
+    def __str__(self):
+        return self._fpath
+
+    def __repr__(self):
+        return "<StatFile: {}>".format(self._fpath)
+
+
+def _is_file(fpath):
+    "Returns True if `fpath` (a path or StatFile) is an existing regular file."
+    if isinstance(fpath, StatFile):
+        return fpath.is_file()
+    return os.path.isfile(fpath)
+
 
 def _get_file_size(fpath):
     "Returns size of file (in bytes)."
+    if isinstance(fpath, StatFile):
+        return fpath.stat().st_size
     return os.path.getsize(fpath)
 
 
@@ -17,7 +104,7 @@ def _is_file_size_less_than(fpath, n):
     """
     Checks file size of `fpath` and returns True if its size is less than `n` MBs.
 
-    :param fpath: file path [string]
+    :param fpath: file path [string] or StatFile object
     :param n: size in Mbytes [float]
     :return: boolean
     """
@@ -30,3 +117,49 @@ def _is_file_size_less_than(fpath, n):
     return False
 
 
+def sniff_netcdf_formats(fpath):
+    """
+    Identifies the possible netCDF sub-formats of a file by reading its first
+    bytes (without using the netCDF library):
+     - netCDF classic files start with "CDF" and a version byte, which gives
+       the format.
+     - netCDF-4 files are HDF5 files, with a signature at offset 0, 512, 1024,
+       2048, etc. These can be "NETCDF4" or "NETCDF4_CLASSIC", which can only
+       be told apart by reading the HDF5 metadata.
+
+    Returns an empty tuple if the file is a truncated classic file and None if
+    the file is neither (or cannot be read), in which case only the netCDF
+    library can decide. Note that a file of one of the returned formats is not
+    necessarily readable.
+
+    :param fpath: file path [string] or StatFile object
+    :return: tuple of netCDF4 `file_format` strings or None
+    """
+    try:
+        with open(os.fspath(fpath), "rb") as reader:
+            magic = reader.read(4)
+
+            size = os.fstat(reader.fileno()).st_size
+
+            if magic in _CDF_FORMATS:
+                file_format = _CDF_FORMATS[magic]
+
+                # A truncated header cannot be read in any format
+                if size < _CDF_MIN_SIZES[file_format]:
+                    return ()
+
+                return (file_format,)
+
+            offset = 0
+
+            while offset <= min(size - len(_HDF5_SIGNATURE), _HDF5_MAX_SIGNATURE_OFFSET):
+                reader.seek(offset)
+
+                if reader.read(len(_HDF5_SIGNATURE)) == _HDF5_SIGNATURE:
+                    return _HDF5_FORMATS
+
+                offset = offset * 2 if offset else 512
+    except OSError:
+        pass
+
+    return None
@@ -0,0 +1,326 @@
+"""
+metrics.py
+==========
+
+Optional instrumentation of check calls: the number of calls, failures and
+exceptions and the wall-clock and CPU time spent, per check class and per
+check short name. When I/O accounting is enabled (see `nc_audit`), the number
+of slices, elements and bytes of variable data read are also recorded.
+
+Metrics are switched off by default. When they are switched on (with
+`enable()`), every call of a check instance is timed. Each thread records
+into its own store so no locks are taken when a check is run; the stores are
+only combined when a snapshot is taken. When a thread ends, its store is
+folded into the store of merged metrics (so short-lived threads, e.g. of a
+rebuilt thread pool, do not accumulate). Snapshots from other processes (e.g.
+the workers of a `ParallelCheckSuite`) can be added with `merge()`.
+
+Snapshots can be written as JSON (`write_json`) or in the Prometheus text
+exposition format (`write_prometheus`), e.g. for the node exporter's
+textfile collector.
+
+"""
+
+import json
+import os
+import threading
+import time
+import weakref
+
+
+_METRICS = {"enabled": False}
+
+# Order of the values held for each (check class, short name) key
+_FIELDS = ("calls", "failures", "exceptions", "wall_seconds", "cpu_seconds",
+           "read_slices", "read_elements", "read_bytes")
+
+# Store of each live thread that has recorded a call, by id (plus one for merged
+# snapshots and the stores of ended threads). The lock is only taken when a
+# store is added or folded and when the stores are read.
+_STORES = {}
+_MERGED = {}
+_LOCAL = threading.local()
+_LOCK = threading.RLock()
+
+_PROMETHEUS_METRICS = (
+    ("calls", "checklib_check_calls_total", "Number of calls of the check."),
+    ("failures", "checklib_check_failures_total", "Number of calls that did not get full marks."),
+    ("exceptions", "checklib_check_exceptions_total", "Number of calls that raised an exception."),
+    ("wall_seconds", "checklib_check_wall_seconds_total", "Wall-clock time spent in the check."),
+    ("cpu_seconds", "checklib_check_cpu_seconds_total", "CPU time (of the calling thread) spent in the check."),
+    ("read_slices", "checklib_check_read_slices_total", "Number of slices of variable data read."),
+    ("read_elements", "checklib_check_read_elements_total", "Number of elements of variable data read."),
+    ("read_bytes", "checklib_check_read_bytes_total", "Estimated number of bytes of variable data read."),
+)
+
+
+def enable():
+    "Switches on recording of metrics for check calls."
+    _METRICS["enabled"] = True
+
+
+def disable():
+    "Switches off recording of metrics for check calls."
+    _METRICS["enabled"] = False
+
+
+def is_enabled():
+    return _METRICS["enabled"]
+
+
+class _StoreOwner(object):
+    "Held by each thread (in `_LOCAL`) so that the end of the thread can be detected."
+    __slots__ = ("__weakref__",)
+
+
+def _fold_store(store):
+    "Adds the values in `store` (of an ended thread) to `_MERGED` and drops the store."
+    with _LOCK:
+        _STORES.pop(id(store), None)
+        _add_values(_MERGED, store.items())
+
+
+def _get_store():
+    """
+    Returns the store of the current thread (registering it on first use).
+    The store is folded into `_MERGED` when the thread ends (and its
+    thread-local data is released).
+    """
+    try:
+        return _LOCAL.store
+    except AttributeError:
+        store, owner = {}, _StoreOwner()
+        weakref.finalize(owner, _fold_store, store)
+
+        with _LOCK:
+            _STORES[id(store)] = store
+
+        _LOCAL.store, _LOCAL.owner = store, owner
+        return store
+
+
+def _get_values(store, check):
+    "Returns the list of values held in `store` for `check` (creating it if needed)."
+    key = (check.__class__.__name__, check.get_short_name())
+    values = store.get(key)
+
+    if values is None:
+        values = store[key] = [0] * len(_FIELDS)
+
+    return values
+
+
+def _is_failure(result):
+    "Returns True if the Result `result` did not get full marks."
+    value = result.value
+
+    if isinstance(value, tuple):
+        return value[0] < value[1]
+
+    return not value
+
+
+def record_call(check, func, primary_arg):
+    """
+    Calls `func(primary_arg)` and records its timings (and outcome) against
+    the check instance `check`.
+
+    :param check: check instance
+    :param func: function that runs the check
+    :param primary_arg: main argument (object to check)
+    :return: the return value of `func(primary_arg)`
+    """
+    failed = raised = 0
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+
+    try:
+        result = func(primary_arg)
+        failed = int(_is_failure(result))
+        return result
+    except BaseException:
+        raised = 1
+        raise
+    finally:
+        wall = time.perf_counter() - start_wall
+        cpu = time.thread_time() - start_cpu
+
+        values = _get_values(_get_store(), check)
+        values[0] += 1
+        values[1] += failed
+        values[2] += raised
+        values[3] += wall
+        values[4] += cpu
+
+
+def record_io(check, io):
+    """
+    Records the data read by a call of the check instance `check`.
+
+    :param check: check instance
+    :param io: summary of the data read (see `nc_audit.DataReadRecorder.get_summary`)
+               [dictionary]
+    """
+    values = _get_values(_get_store(), check)
+    values[5] += io["slices"]
+    values[6] += io["elements"]
+    values[7] += io["bytes"]
+
+
+def _add_values(totals, items):
+    "Adds the values of each (key, values) pair in `items` to those held in `totals`."
+    # Copying the items is atomic so other threads can keep recording
+    for key, values in list(items):
+        total = totals.setdefault(key, [0] * len(_FIELDS))
+
+        for i, value in enumerate(list(values)):
+            total[i] += value
+
+
+def _combine(stores):
+    "Returns a dictionary of summed values (per key) over all `stores`."
+    totals = {}
+
+    for store in stores:
+        _add_values(totals, store.items())
+
+    return totals
+
+
+def snapshot():
+    """
+    Returns the metrics recorded so far (in all threads, plus any merged
+    snapshots) as a dictionary that can be serialised as JSON:
+
+        {"checks": [{"check": <class name>, "short_name": <short name>,
+                     "calls": ..., "failures": ..., "exceptions": ...,
+                     "wall_seconds": ..., "cpu_seconds": ..., "read_slices": ...,
+                     "read_elements": ..., "read_bytes": ...}, ...],
+         "classes": {<class name>: {"calls": ..., ...}, ...}}
+
+    :return: dictionary
+    """
+    with _LOCK:
+        totals = _combine(list(_STORES.values()) + [_MERGED])
+
+    checks = []
+    classes = {}
+
+    for (cls, short_name), values in sorted(totals.items()):
+        record = dict(zip(_FIELDS, values))
+        checks.append(dict(record, check=cls, short_name=short_name))
+
+        class_record = classes.setdefault(cls, dict.fromkeys(_FIELDS, 0))
+        for field in _FIELDS:
+            class_record[field] += record[field]
+
+    return {"checks": checks, "classes": classes}
+
+
+def merge(other):
+    """
+    Adds the metrics in the snapshot `other` (e.g. from another process) to
+    those of this process.
+
+    :param other: dictionary returned by `snapshot()`
+    """
+    items = [((record["check"], record["short_name"]),
+              [record.get(field, 0) for field in _FIELDS]) for record in other["checks"]]
+
+    with _LOCK:
+        _add_values(_MERGED, items)
+
+
+def reset():
+    "Removes all metrics recorded so far."
+    with _LOCK:
+        for store in list(_STORES.values()) + [_MERGED]:
+            store.clear()
+
+
+def collect():
+    """
+    Returns a snapshot of the metrics and then resets them. Used to pass the
+    metrics of a worker process back to the parent process.
+
+    :return: dictionary returned by `snapshot()`
+    """
+    data = snapshot()
+    reset()
+    return data
+
+
+def _write_atomically(path, content):
+    "Writes `content` to a temporary file then renames it, so readers never see a partial file."
+    import tempfile
+
+    dr = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=dr, prefix=".tmp-", suffix=".metrics")
+
+    try:
+        with os.fdopen(fd, "w") as writer:
+            writer.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def to_json(data=None):
+    """
+    Returns a snapshot of the metrics as a JSON string.
+
+    :param data: snapshot to encode (default: the current metrics) [dictionary]
+    :return: string
+    """
+    return json.dumps(data if data is not None else snapshot(), indent=2, sort_keys=True)
+
+
+def write_json(path, data=None):
+    """
+    Writes a snapshot of the metrics to the JSON file at `path`.
+
+    :param path: output file path [string]
+    :param data: snapshot to write (default: the current metrics) [dictionary]
+    """
+    _write_atomically(path, to_json(data) + "\n")
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def to_prometheus(data=None):
+    """
+    Returns a snapshot of the metrics in the Prometheus text exposition
+    format. Each metric is labelled with the check class and short name.
+
+    :param data: snapshot to encode (default: the current metrics) [dictionary]
+    :return: string
+    """
+    data = data if data is not None else snapshot()
+    lines = []
+
+    for field, name, description in _PROMETHEUS_METRICS:
+        lines.append("# HELP {} {}".format(name, description))
+        lines.append("# TYPE {} counter".format(name))
+
+        for record in data["checks"]:
+            lines.append('{}{{check="{}",short_name="{}"}} {}'.format(
+                         name, _escape_label(record["check"]),
+                         _escape_label(record["short_name"]), record[field]))
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path, data=None):
+    """
+    Writes a snapshot of the metrics to the file at `path` in the Prometheus
+    text exposition format. The file is replaced atomically so it can be read
+    by a scraper at any time.
+
+    :param path: output file path (usually ending ".prom") [string]
+    :param data: snapshot to write (default: the current metrics) [dictionary]
+    """
+    _write_atomically(path, to_prometheus(data))
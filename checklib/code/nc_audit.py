@@ -0,0 +1,233 @@
+"""
+nc_audit.py
+===========
+
+Wrappers around netCDF4 Dataset and Variable objects that record any reads
+of variable data, so that checks that should only need the file header can
+be audited.
+
+Auditing is switched off by default. When it is switched on (with `enable()`),
+each check that declares `header_only = True` is run against an
+`AuditedDataset` and any data it reads is reported as a violation.
+
+I/O accounting is also switched off by default. When it is switched on (with
+`enable_accounting()`), every check given a Dataset is run against an
+`AuditedDataset` and a summary of the data it read (see
+`DataReadRecorder.get_summary`) is added to the "io" item of the
+`details` of its Result (and to the metrics, if they are enabled).
+
+"""
+
+import threading
+import warnings
+
+
+_AUDIT = {"enabled": False, "accounting": False}
+_VIOLATIONS = []
+_LOCK = threading.Lock()
+
+
+class HeaderAuditWarning(UserWarning):
+    pass
+
+
+class DataReadRecorder(object):
+    """
+    Records reads of variable data made through audited objects.
+    Each read is recorded as a tuple of:
+     (variable name, index, number of elements, number of bytes).
+    The size (number of elements) of each variable read is also recorded.
+    """
+
+    def __init__(self, check=None):
+        """
+        :param check: name of the check the reads are made by [string]
+        """
+        self.check = check
+        self.reads = []
+        self.sizes = {}
+
+    def record(self, var_id, index, data, size=None):
+        import numpy as np
+        self.reads.append((var_id, index, int(np.size(data)),
+                           int(getattr(data, "nbytes", 0))))
+
+        if size is not None:
+            self.sizes[var_id] = int(size)
+
+    def get_variables_read(self):
+        "Returns a sorted list of the names of variables that have been read."
+        return sorted(set(read[0] for read in self.reads))
+
+    def get_summary(self):
+        """
+        Returns a summary of the reads as a dictionary of: check, slices,
+        elements, bytes (totals over all reads), variables (a dictionary of
+        the same totals per variable) and whole_variables (a sorted list of
+        the variables that were read in full, in one or many slices).
+        Bytes are estimated from the size of the arrays returned, so do not
+        account for compression.
+
+        :return: dictionary
+        """
+        variables = {}
+
+        for var_id, _, n_elements, n_bytes in self.reads:
+            totals = variables.setdefault(var_id, {"slices": 0, "elements": 0, "bytes": 0})
+            totals["slices"] += 1
+            totals["elements"] += n_elements
+            totals["bytes"] += n_bytes
+
+        whole_variables = sorted(var_id for var_id, totals in variables.items()
+                                 if totals["elements"] >= self.sizes.get(var_id, float("inf")))
+
+        return {"check": self.check,
+                "slices": len(self.reads),
+                "elements": sum(read[2] for read in self.reads),
+                "bytes": sum(read[3] for read in self.reads),
+                "variables": variables,
+                "whole_variables": whole_variables}
+
+
+class AuditedVariable(object):
+    """
+    Proxy for a netCDF4 Variable that records data reads. All other attribute
+    and method access is passed through to the wrapped variable.
+    """
+    __slots__ = ("_variable", "_recorder", "__weakref__")
+
+    def __init__(self, variable, recorder):
+        self._variable = variable
+        self._recorder = recorder
+
+    @property
+    def __dict__(self):
+        return self._variable.__dict__
+
+    def __getattr__(self, name):
+        return getattr(self._variable, name)
+
+    def __getitem__(self, index):
+        data = self._variable[index]
+        self._recorder.record(self._variable.name, index, data, self._variable.size)
+        return data
+
+    def getValue(self):
+        data = self._variable.getValue()
+        self._recorder.record(self._variable.name, Ellipsis, data, self._variable.size)
+        return data
+
+    def __len__(self):
+        return len(self._variable)
+
+    def __repr__(self):
+        return "<AuditedVariable: {!r}>".format(self._variable)
+
+
+class AuditedDataset(object):
+    """
+    Proxy for a netCDF4 Dataset whose variables are wrapped as
+    `AuditedVariable` objects. All other attribute and method access is
+    passed through to the wrapped dataset.
+    """
+    __slots__ = ("_dataset", "_recorder", "_variables", "__weakref__")
+
+    def __init__(self, dataset, recorder):
+        self._dataset = dataset
+        self._recorder = recorder
+        self._variables = None
+
+    @property
+    def __dict__(self):
+        return self._dataset.__dict__
+
+    @property
+    def variables(self):
+        if self._variables is None:
+            self._variables = dict((var_id, AuditedVariable(variable, self._recorder))
+                                   for var_id, variable in self._dataset.variables.items())
+        return self._variables
+
+    def __getattr__(self, name):
+        return getattr(self._dataset, name)
+
+    def __getitem__(self, name):
+        if name in self._dataset.variables:
+            return self.variables[name]
+        return self._dataset[name]
+
+    def __repr__(self):
+        return "<AuditedDataset: {!r}>".format(self._dataset)
+
+
+def unwrap(ds):
+    """
+    Returns the netCDF4 Dataset wrapped by an `AuditedDataset`
+    (or `ds` itself if it is not wrapped).
+
+    :param ds: netCDF4 Dataset or AuditedDataset object
+    :return: netCDF4 Dataset object
+    """
+    return ds._dataset if isinstance(ds, AuditedDataset) else ds
+
+
+def enable():
+    "Switches on auditing of data reads by header-only checks."
+    _AUDIT["enabled"] = True
+
+
+def disable():
+    "Switches off auditing of data reads by header-only checks."
+    _AUDIT["enabled"] = False
+
+
+def is_enabled():
+    return _AUDIT["enabled"]
+
+
+def enable_accounting():
+    "Switches on accounting of the data read by each check."
+    _AUDIT["accounting"] = True
+
+
+def disable_accounting():
+    "Switches off accounting of the data read by each check."
+    _AUDIT["accounting"] = False
+
+
+def is_accounting_enabled():
+    return _AUDIT["accounting"]
+
+
+def report_violation(check, recorder):
+    """
+    Records (and warns) that a header-only check has read variable data.
+
+    :param check: check instance
+    :param recorder: DataReadRecorder instance used when running the check
+    """
+    violation = {"check": check.__class__.__name__,
+                 "short_name": check.get_short_name(),
+                 "variables": recorder.get_variables_read(),
+                 "n_reads": len(recorder.reads),
+                 "n_bytes": sum(read[3] for read in recorder.reads)}
+
+    with _LOCK:
+        _VIOLATIONS.append(violation)
+
+    warnings.warn("Header-only check '{check}' read data from variables: "
+                  "{variables}.".format(**violation), HeaderAuditWarning)
+
+
+def get_violations():
+    """
+    Returns the list of violations recorded so far. Each is a dictionary of:
+    check, short_name, variables, n_reads, n_bytes.
+    """
+    with _LOCK:
+        return list(_VIOLATIONS)
+
+
+def clear_violations():
+    with _LOCK:
+        del _VIOLATIONS[:]
@@ -0,0 +1,260 @@
+"""
+nc_header.py
+============
+
+Immutable, picklable snapshots of the header of a netCDF4 Dataset: its global
+attributes, dimensions and variables (with their dtypes, shapes, chunking and
+attributes). A snapshot is read from the Dataset in a single pass, after which
+no calls are made to the netCDF library.
+
+Header-only checks (those with `header_only = True`) accept a `HeaderSnapshot`
+as their primary argument in place of a Dataset. The snapshot provides the
+parts of the netCDF4 Dataset/Variable API that only need the header; any
+attempt to read variable data raises a `HeaderOnlyError`.
+
+Usage:
+    snapshot = HeaderSnapshot.from_dataset(Dataset("file.nc"))
+    result = VariableExistsInFileCheck(kwargs={"var_id": "tas"})(snapshot)
+
+"""
+
+import functools
+import threading
+import types
+import weakref
+
+import numpy as np
+
+from checklib.code import nc_audit
+
+
+class HeaderOnlyError(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def _get_slot_names(cls):
+    "Returns the names of the slots of snapshot class `cls` (and its bases)."
+    return tuple(name for klass in cls.__mro__ for name in getattr(klass, "__slots__", ())
+                 if name != "__weakref__")
+
+
+def _freeze(value):
+    """
+    Returns a read-only version of `value`: a copy of a dictionary (with its
+    values frozen) as a `types.MappingProxyType`, or a read-only copy of a
+    numpy array. Other values are returned as they are.
+    """
+    if isinstance(value, (dict, types.MappingProxyType)):
+        return types.MappingProxyType(dict((key, _freeze(item)) for key, item in value.items()))
+
+    if isinstance(value, np.ndarray):
+        value = value.copy()
+        value.flags.writeable = False
+
+    return value
+
+
+class _Snapshot(object):
+    """
+    Base class for snapshot objects. Attributes are set once, when the
+    snapshot is created, and netCDF attributes can be read as Python
+    attributes (as with netCDF4 objects). Dictionaries (of dimensions,
+    variables and attributes) are held as read-only mappings.
+    """
+    __slots__ = ()
+
+    def _init(self, **values):
+        for name, value in values.items():
+            object.__setattr__(self, name, _freeze(value))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("'{}' objects cannot be modified.".format(self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("'{}' objects cannot be modified.".format(self.__class__.__name__))
+
+    def __reduce__(self):
+        # Read-only mappings cannot be pickled so they are converted back to
+        # dictionaries (and frozen again by `__setstate__`)
+        state = {}
+
+        for name in _get_slot_names(type(self)):
+            value = object.__getattribute__(self, name)
+            state[name] = dict(value) if isinstance(value, types.MappingProxyType) else value
+
+        return (object.__new__, (type(self),), state)
+
+    def __setstate__(self, state):
+        self._init(**state)
+
+    def __getattr__(self, name):
+        # Only called if `name` is not found as a slot (or method). Slot names
+        # and special names are not looked up in the attributes, which stops
+        # infinite recursion when `_attrs` is not yet set (e.g. while
+        # unpickling). Other names, including "_FillValue", are attributes.
+        if name in _get_slot_names(type(self)) or (name.startswith("__") and name.endswith("__")):
+            raise AttributeError(name)
+
+        try:
+            return self._attrs[name]
+        except KeyError:
+            raise AttributeError("'{}' object has no attribute '{}'".format(
+                                 self.__class__.__name__, name))
+
+    @property
+    def __dict__(self):
+        # As with netCDF4 objects: a dictionary of the netCDF attributes
+        return dict(self._attrs)
+
+    def ncattrs(self):
+        "Returns the names of the netCDF attributes (in file order)."
+        return list(self._attrs)
+
+    def getncattr(self, name):
+        "Returns the value of netCDF attribute `name`."
+        try:
+            return self._attrs[name]
+        except KeyError:
+            raise AttributeError("NetCDF: Attribute not found: {}".format(name))
+
+
+class DimensionSnapshot(_Snapshot):
+    "Snapshot of a netCDF4 Dimension."
+    __slots__ = ("name", "size", "_unlimited")
+
+    def __init__(self, name, size, unlimited=False):
+        self._init(name=name, size=size, _unlimited=unlimited)
+
+    @classmethod
+    def from_dimension(cls, dimension):
+        return cls(dimension.name, dimension.size, dimension.isunlimited())
+
+    def isunlimited(self):
+        return self._unlimited
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return "<DimensionSnapshot: {} = {}{}>".format(self.name, self.size,
+                                                      " (unlimited)" if self._unlimited else "")
+
+
+class VariableSnapshot(_Snapshot):
+    "Snapshot of the header of a netCDF4 Variable."
+    __slots__ = ("name", "dtype", "dimensions", "shape", "_chunking", "_attrs")
+
+    def __init__(self, name, dtype, dimensions, shape, chunking, attrs):
+        self._init(name=name, dtype=dtype, dimensions=tuple(dimensions), shape=tuple(shape),
+                   _chunking=chunking, _attrs=attrs)
+
+    @classmethod
+    def from_variable(cls, variable):
+        return cls(variable.name, variable.dtype, variable.dimensions, variable.shape,
+                   variable.chunking(), variable.__dict__)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        size = 1
+        for length in self.shape:
+            size *= length
+        return size
+
+    def chunking(self):
+        return self._chunking
+
+    def __len__(self):
+        if not self.shape:
+            raise TypeError("len() of unsized object")
+        return self.shape[0]
+
+    def _no_data(self, *args):
+        raise HeaderOnlyError("Variable data cannot be read from a header snapshot: "
+                              "'{}'.".format(self.name))
+
+    __getitem__ = getValue = _no_data
+
+    def __repr__(self):
+        return "<VariableSnapshot: {} {}{}>".format(self.dtype, self.name, self.dimensions)
+
+
+class HeaderSnapshot(_Snapshot):
+    """
+    Snapshot of the header of a netCDF4 Dataset. It can be given to
+    header-only checks in place of the Dataset.
+    """
+    __slots__ = ("_filepath", "file_format", "data_model", "dimensions", "variables",
+                 "_attrs", "__weakref__")
+
+    def __init__(self, filepath, file_format, data_model, dimensions, variables, attrs):
+        """
+        :param filepath: path of the file [string]
+        :param file_format: netCDF file format [string]
+        :param data_model: netCDF data model [string]
+        :param dimensions: dictionary of {name: DimensionSnapshot}
+        :param variables: dictionary of {name: VariableSnapshot}
+        :param attrs: dictionary of global attributes
+        """
+        self._init(_filepath=filepath, file_format=file_format, data_model=data_model,
+                   dimensions=dimensions, variables=variables, _attrs=attrs)
+
+    @classmethod
+    def from_dataset(cls, ds):
+        """
+        Reads a snapshot of the header of `ds` (in a single pass).
+
+        :param ds: netCDF4 Dataset object
+        :return: HeaderSnapshot instance
+        """
+        ds = nc_audit.unwrap(ds)
+
+        dimensions = dict((name, DimensionSnapshot.from_dimension(dimension))
+                          for name, dimension in ds.dimensions.items())
+        variables = dict((name, VariableSnapshot.from_variable(variable))
+                         for name, variable in ds.variables.items())
+
+        return cls(ds.filepath(), getattr(ds, "file_format", None), getattr(ds, "data_model", None),
+                   dimensions, variables, ds.__dict__)
+
+    def filepath(self):
+        return self._filepath
+
+    def __getitem__(self, name):
+        return self.variables[name]
+
+    def __repr__(self):
+        return "<HeaderSnapshot: {}>".format(self._filepath)
+
+
+# Snapshot of each Dataset (weakly keyed, so that they are discarded with the Dataset)
+_SNAPSHOTS = weakref.WeakKeyDictionary()
+_SNAPSHOT_LOCK = threading.Lock()
+
+
+def get_header_snapshot(ds):
+    """
+    Returns a HeaderSnapshot of a netCDF4 Dataset. The snapshot is read once
+    per Dataset and shared by all later calls for the same Dataset. If `ds`
+    is already a HeaderSnapshot it is returned as it is.
+
+    :param ds: netCDF4 Dataset or HeaderSnapshot object
+    :return: HeaderSnapshot instance
+    """
+    if isinstance(ds, HeaderSnapshot):
+        return ds
+
+    key = nc_audit.unwrap(ds)
+    snapshot = _SNAPSHOTS.get(key)
+
+    if snapshot is None:
+        snapshot = HeaderSnapshot.from_dataset(key)
+
+        with _SNAPSHOT_LOCK:
+            _SNAPSHOTS[key] = snapshot
+
+    return snapshot
@@ -7,9 +7,93 @@ netCDF4 Dataset objects.
 
 """
 
+import hashlib
+import itertools
+import json
+import os
 import re
+import threading
+import weakref
+from collections import namedtuple
+
 import numpy as np
 
+from checklib.code import file_util, nc_audit
+
+# Default upper limit on the size of each block of data read from a variable (bytes)
+DEFAULT_MAX_BLOCK_BYTES = 64 * 2**20
+
+# Default fill values used by the netCDF library when `_FillValue` is not set
+_DEFAULT_FILL_VALUES = {'i2': -32767, 'u2': 65535, 'i4': -2147483647, 'u4': 4294967295,
+                        'i8': -9223372036854775806, 'u8': 18446744073709551614,
+                        'f4': 9.969209968386869e+36, 'f8': 9.969209968386869e+36}
+
+
+def get_file_format(fpath):
+    """
+    Returns the netCDF sub-format (as in the `file_format` property of netCDF4
+    Datasets) of the file at `fpath`. The format is read from the file header
+    where possible, otherwise the file is opened with netCDF4.
+
+    :param fpath: file path [string] or StatFile object
+    :return: netCDF sub-format [string] or None if not readable as netCDF
+    """
+    formats = file_util.sniff_netcdf_formats(fpath)
+
+    # The format is certain from the header (none for a truncated file)
+    if formats is not None and len(formats) < 2:
+        return formats[0] if formats else None
+
+    from netCDF4 import Dataset
+
+    try:
+        with Dataset(os.fspath(fpath)) as ds:
+            return ds.file_format
+    except Exception:
+        return None
+
+
+# Main variable analysis of each Dataset, weakly keyed so that entries are
+# dropped when the Dataset is garbage collected
+_MAIN_VARIABLE_ANALYSES = weakref.WeakKeyDictionary()
+_MAIN_VARIABLE_LOCK = threading.Lock()
+
+# Result of the main variable analysis:
+#  - main_var_id: name of the main variable (None if it cannot be identified)
+#  - ranking: list of (variable name, size) tuples - biggest first
+#  - candidates: names of all variables that share the biggest size
+MainVariableAnalysis = namedtuple("MainVariableAnalysis", ["main_var_id", "ranking", "candidates"])
+
+
+def get_main_variable_analysis(ds):
+    """
+    Analyses the variables in a NetCDF4 Dataset to identify the main variable
+    (that which has the biggest shape/size). The analysis is done once per
+    Dataset and shared by all later calls for the same Dataset.
+
+    :param ds: netCDF4 Dataset object
+    :return: MainVariableAnalysis named tuple
+    """
+    key = nc_audit.unwrap(ds)
+
+    try:
+        return _MAIN_VARIABLE_ANALYSES[key]
+    except KeyError:
+        pass
+
+    dsv = key.variables
+    ranking = sorted(((ncvar, dsv[ncvar].size) for ncvar in dsv),
+                     key=lambda item: item[1], reverse=True)
+
+    candidates = tuple(ncvar for ncvar, size in ranking if size == ranking[0][1])
+    main_var_id = candidates[0] if len(candidates) == 1 else None
+
+    analysis = MainVariableAnalysis(main_var_id, ranking, candidates)
+
+    with _MAIN_VARIABLE_LOCK:
+        _MAIN_VARIABLE_ANALYSES[key] = analysis
+
+    return analysis
 
 
 def get_main_variable(ds):
@@ -22,17 +106,15 @@ def get_main_variable(ds):
     :param ds: netCDF4 Dataset object
     :return: netCDF4 Variable object
     """
-    dsv = ds.variables
-    sizes = {}
+    analysis = get_main_variable_analysis(ds)
 
-    for ncvar in dsv:
-        sizes[ncvar] = dsv[ncvar].size
+    if not analysis.candidates:
+        raise Exception("No variables found in netCDF4 file.")
 
-    mx_size = max(sizes.values())
-    if list(sizes.values()).count(mx_size) > 1:
+    if analysis.main_var_id is None:
         raise Exception("More than one 'main' variable found in netCDF4 file.")
 
-    return [dsv[ncvar] for ncvar, size in sizes.items() if dsv[ncvar].size == mx_size][0]
+    return ds.variables[analysis.main_var_id]
 
 
 def check_main_variable_type(ds, datatype):
@@ -58,11 +140,84 @@ def is_there_only_one_main_variable(ds):
     :param ds: netCDF4 Dataset object
     :return: boolean
     """
-    try:
-        get_main_variable(ds)
-        return True
-    except:
-        return False
+    return get_main_variable_analysis(ds).main_var_id is not None
+
+
+# Header fingerprint of each Dataset (weakly keyed, as above)
+_HEADER_FINGERPRINTS = weakref.WeakKeyDictionary()
+_HEADER_FINGERPRINT_LOCK = threading.Lock()
+
+
+def _get_canonical_value(value):
+    "Returns an attribute value in a form that can be encoded as JSON."
+    if isinstance(value, (np.ndarray, np.generic)):
+        return [str(value.dtype), value.tolist()]
+
+    if isinstance(value, bytes):
+        return ["bytes", value.hex()]
+
+    return value
+
+
+def _get_canonical_attrs(obj):
+    "Returns the attributes of a Dataset or Variable as a list of [name, value] pairs."
+    return [[attr, _get_canonical_value(obj.getncattr(attr))] for attr in obj.ncattrs()]
+
+
+def get_header_fingerprint(ds):
+    """
+    Returns a fingerprint of the header of a NetCDF4 Dataset: a hash of its
+    file format, global attributes, dimensions (names, sizes and whether they
+    are unlimited) and variables (names, dtypes, dimensions and attributes).
+    Files with the same fingerprint give the same result for any check that
+    only reads the header. The fingerprint is computed once per Dataset.
+
+    :param ds: netCDF4 Dataset (or HeaderSnapshot) object
+    :return: hex digest [string]
+    """
+    key = nc_audit.unwrap(ds)
+    fingerprint = _HEADER_FINGERPRINTS.get(key)
+
+    if fingerprint is not None:
+        return fingerprint
+
+    header = {"file_format": getattr(key, "file_format", None),
+              "global_attrs": _get_canonical_attrs(key),
+              "dimensions": [[name, len(dim), dim.isunlimited()]
+                             for name, dim in key.dimensions.items()],
+              "variables": [[name, str(variable.dtype), list(variable.dimensions),
+                             _get_canonical_attrs(variable)]
+                            for name, variable in key.variables.items()]}
+
+    encoded = json.dumps(header, sort_keys=True, default=repr).encode("utf-8")
+    fingerprint = hashlib.sha256(encoded).hexdigest()
+
+    with _HEADER_FINGERPRINT_LOCK:
+        _HEADER_FINGERPRINTS[key] = fingerprint
+
+    return fingerprint
+
+
+def get_global_attrs(ds):
+    """
+    Returns a dictionary of all global attributes in a NetCDF Dataset,
+    read in a single call.
+
+    :param ds: netCDF4 Dataset (or HeaderSnapshot) object
+    :return: dictionary of {attribute name: value}
+    """
+    return ds.__dict__
+
+
+def compile_global_attr_regex(regex):
+    """
+    Returns a compiled regular expression that matches the whole of a global
+    attribute value against `regex`.
+
+    :regex: a regular expression definition [string]
+    :return: compiled regular expression
+    """
+    return re.compile("^{}$".format(regex), re.DOTALL)
 
 
 def check_global_attr_against_regex(ds, attr, regex):
@@ -72,20 +227,48 @@ def check_global_attr_against_regex(ds, attr, regex):
 
     :param ds: netCDF4 Dataset object
     :param attr: global attribute name [string]
-    :regex: a regular expression definition [string]
+    :regex: a regular expression definition [string] or compiled regular
+            expression (from `compile_global_attr_regex`)
     :return: an integer (see above)
     """
     if attr not in ds.ncattrs():
         return 0
 
+    if isinstance(regex, str):
+        regex = compile_global_attr_regex(regex)
+
     # Always coerce the attribute to a string to do the regex check
-    if not re.match("^{}$".format(regex), str(getattr(ds, attr)), re.DOTALL):
+    if not regex.match(str(getattr(ds, attr))):
         return 1
 
     # Success
     return 2
 
 
+def check_global_attrs_against_regexes(ds, regexes):
+    """
+    Checks many global attributes against regular expressions in a single
+    pass over the global attributes. Each score is as returned by
+    `check_global_attr_against_regex`.
+
+    :param ds: netCDF4 Dataset object
+    :param regexes: sequence of (attribute name, compiled regular expression)
+    :return: list of integers (one per item in `regexes`)
+    """
+    nc_attrs = get_global_attrs(ds)
+    scores = []
+
+    for attr, regex in regexes:
+        if attr not in nc_attrs:
+            scores.append(0)
+        elif not regex.match(str(nc_attrs[attr])):
+            scores.append(1)
+        else:
+            scores.append(2)
+
+    return scores
+
+
 def check_variable_type(ds, var_id, datatype):
     """
     Checks variables in a NetCDF Dataset and returns boolean regarding
@@ -112,28 +295,462 @@ def is_variable_in_dataset(ds, var_id):
     return var_id in ds.variables
 
 
-def variable_is_within_valid_bounds(ds, var_id, minimum, maximum):
+def get_block_shape(variable, max_bytes=DEFAULT_MAX_BLOCK_BYTES):
+    """
+    Returns the shape of the blocks used to read `variable` in pieces. Blocks
+    are aligned with the chunking of the variable and are grown, starting
+    from the last dimension, to fill (but not exceed) `max_bytes`. A block is
+    never smaller than one chunk.
+
+    :param variable: netCDF4 Variable object
+    :param max_bytes: upper limit on the size of each block (bytes) [integer]
+    :return: tuple of block sizes (one per dimension)
+    """
+    shape = variable.shape
+    chunking = variable.chunking()
+
+    if chunking in (None, "contiguous"):
+        block = [1] * len(shape)
+    else:
+        block = [max(1, min(chunk, size)) for chunk, size in zip(chunking, shape)]
+
+    chunks = list(block)
+    itemsize = getattr(variable.dtype, "itemsize", 8)
+
+    for axis in reversed(range(len(shape))):
+        other_bytes = itemsize * int(np.prod(block)) // block[axis]
+        n_chunks = max(1, max_bytes // (other_bytes * chunks[axis]))
+        block[axis] = max(1, min(shape[axis], n_chunks * chunks[axis]))
+
+        # Only grow earlier dimensions if this one is read in full
+        if block[axis] < shape[axis]:
+            break
+
+    return tuple(block)
+
+
+def iter_variable_blocks(variable, max_bytes=DEFAULT_MAX_BLOCK_BYTES):
+    """
+    Yields indices (tuples of slices) that cover the whole of `variable` in
+    blocks with the shape given by `get_block_shape`.
+
+    :param variable: netCDF4 Variable object
+    :param max_bytes: upper limit on the size of each block (bytes) [integer]
+    :return: generator of tuples of slices
+    """
+    shape = variable.shape
+
+    # Scalar variables are read in one go
+    if not shape:
+        yield Ellipsis
+        return
+
+    if 0 in shape:
+        return
+
+    block = get_block_shape(variable, max_bytes)
+    starts = [range(0, size, step) for size, step in zip(shape, block)]
+
+    for start in itertools.product(*starts):
+        yield tuple(slice(i, min(i + step, size))
+                    for i, step, size in zip(start, block, shape))
+
+
+def _get_unsigned_dtype(variable):
+    """
+    Returns the unsigned integer dtype that the data of `variable` is viewed
+    as (by the netCDF4 library) if it is a signed integer variable with the
+    attribute `_Unsigned = "true"`, otherwise None.
+
+    :param variable: netCDF4 Variable object
+    :return: numpy dtype or None
+    """
+    dtype = np.dtype(variable.dtype)
+
+    if dtype.kind == "i" and str(getattr(variable, "_Unsigned", "false")).lower() == "true":
+        return np.dtype("{}u{}".format(dtype.byteorder, dtype.itemsize))
+
+    return None
+
+
+def _as_unsigned(variable, values):
+    """
+    Returns a list of (packed) `values` of `variable`, as read from the file,
+    viewed as unsigned integers if the variable has `_Unsigned = "true"` (see
+    `_get_unsigned_dtype`), otherwise unchanged.
+
+    :param variable: netCDF4 Variable object
+    :param values: list of values
+    :return: list of values
+    """
+    unsigned_dtype = _get_unsigned_dtype(variable)
+
+    if unsigned_dtype is None or not values:
+        return values
+
+    # Values are stored with the signed type (so wrap around to it first)
+    signed = np.asarray(values).astype(variable.dtype)
+    return signed.view(unsigned_dtype).tolist()
+
+
+def _read_raw_block(variable, index):
+    """
+    Reads block `index` (from `iter_variable_blocks`) of `variable` as it is
+    stored in the file: not masked, unpacked or viewed as unsigned. Auto mask
+    and scale are turned off for the read and the previous settings of the
+    Variable are restored afterwards.
+
+    :param variable: netCDF4 Variable object
+    :param index: tuple of slices (with unit steps) or Ellipsis
+    :return: numpy array
+    """
+    mask, scale = variable.mask, variable.scale
+    variable.set_auto_maskandscale(False)
+
+    try:
+        return variable[index]
+    finally:
+        variable.set_auto_mask(mask)
+        variable.set_auto_scale(scale)
+
+
+def _get_invalid_values(variable):
+    """
+    Returns a list of the (packed) values that the netCDF4 library would mask
+    when reading `variable`: `_FillValue` (or the default fill value) and any
+    `missing_value`.
+
+    :param variable: netCDF4 Variable object
+    :return: list of values
+    """
+    attrs = variable.ncattrs()
+    invalid = []
+
+    if "_FillValue" in attrs:
+        invalid.append(variable.getncattr("_FillValue"))
+    else:
+        fill_value = _DEFAULT_FILL_VALUES.get(np.dtype(variable.dtype).str[1:])
+        if fill_value is not None:
+            invalid.append(fill_value)
+
+    if "missing_value" in attrs:
+        invalid.extend(np.atleast_1d(variable.getncattr("missing_value")).tolist())
+
+    return _as_unsigned(variable, invalid)
+
+
+def _get_valid_limits(variable):
+    """
+    Returns the (packed) valid minimum and maximum for `variable` from its
+    `valid_min`, `valid_max` and `valid_range` attributes. Either can be None.
+
+    :param variable: netCDF4 Variable object
+    :return: tuple of (valid minimum, valid maximum)
+    """
+    attrs = variable.ncattrs()
+    valid_min = valid_max = None
+
+    if "valid_range" in attrs:
+        valid_min, valid_max = variable.getncattr("valid_range")[:2]
+
+    if "valid_min" in attrs:
+        valid_min = variable.getncattr("valid_min")
+
+    if "valid_max" in attrs:
+        valid_max = variable.getncattr("valid_max")
+
+    return tuple(None if value is None else _as_unsigned(variable, [value])[0]
+                 for value in (valid_min, valid_max))
+
+
+def _unpack_range(variable, mn, mx):
+    """
+    Applies `scale_factor` and `add_offset` (if set) to a packed range.
+
+    :param variable: netCDF4 Variable object
+    :param mn: packed minimum (a number)
+    :param mx: packed maximum (a number)
+    :return: tuple of unpacked (minimum, maximum)
+    """
+    scale_factor = getattr(variable, "scale_factor", 1)
+    add_offset = getattr(variable, "add_offset", 0)
+
+    mn, mx = mn * scale_factor + add_offset, mx * scale_factor + add_offset
+    return min(mn, mx), max(mn, mx)
+
+
+def iter_variable_block_ranges(variable, max_bytes=DEFAULT_MAX_BLOCK_BYTES):
+    """
+    Reads `variable` in blocks (see `iter_variable_blocks`) and yields the
+    (unpacked) minimum and maximum of the valid values in each block. Fill,
+    missing and out-of-valid-range values are excluded, as the netCDF4
+    library would mask them, but without building masked arrays. Signed
+    integers with `_Unsigned = "true"` are read as unsigned. Blocks without
+    any valid values are skipped. The auto mask and scale settings of the
+    Variable are restored after each block is read (see `_read_raw_block`).
+
+    :param variable: netCDF4 Variable object
+    :param max_bytes: upper limit on the size of each block (bytes) [integer]
+    :return: generator of (minimum, maximum) tuples
+    """
+    invalid_values = _get_invalid_values(variable)
+    valid_min, valid_max = _get_valid_limits(variable)
+    unsigned_dtype = _get_unsigned_dtype(variable)
+    scale = "scale_factor" in variable.ncattrs() or "add_offset" in variable.ncattrs()
+
+    for index in iter_variable_blocks(variable, max_bytes):
+        data = np.asarray(_read_raw_block(variable, index)).ravel()
+
+        if unsigned_dtype is not None:
+            data = data.view(unsigned_dtype)
+
+        if data.dtype.kind == "f":
+            data = data[~np.isnan(data)]
+
+        for value in invalid_values:
+            data = data[data != value]
+
+        if valid_min is not None:
+            data = data[data >= valid_min]
+
+        if valid_max is not None:
+            data = data[data <= valid_max]
+
+        if data.size == 0:
+            continue
+
+        if scale:
+            yield _unpack_range(variable, data.min(), data.max())
+        else:
+            yield data.min(), data.max()
+
+
+def _get_unpacked_valid_limits(variable):
+    """
+    Returns the (unpacked) valid minimum and maximum for `variable` from its
+    `valid_min`, `valid_max` and `valid_range` attributes (see
+    `_get_valid_limits`). Either can be None.
+
+    :param variable: netCDF4 Variable object
+    :return: tuple of (valid minimum, valid maximum)
+    """
+    valid_min, valid_max = _get_valid_limits(variable)
+
+    if valid_min is not None and valid_max is not None:
+        return _unpack_range(variable, valid_min, valid_max)
+
+    # A single limit can only be used if unpacking does not reverse the order
+    if getattr(variable, "scale_factor", 1) < 0:
+        return None, None
+
+    if valid_min is not None:
+        valid_min = _unpack_range(variable, valid_min, valid_min)[0]
+    elif valid_max is not None:
+        valid_max = _unpack_range(variable, valid_max, valid_max)[0]
+
+    return valid_min, valid_max
+
+
+def _get_actual_range(variable):
+    """
+    Returns the (minimum, maximum) held in the `actual_range` attribute of
+    `variable`, or None if it is missing or does not hold exactly two finite
+    values (in which case it is ignored).
+
+    :param variable: netCDF4 Variable object
+    :return: tuple of (minimum, maximum) or None
+    """
+    if "actual_range" not in variable.ncattrs():
+        return None
+
+    try:
+        actual_range = np.atleast_1d(variable.getncattr("actual_range")).astype("f8")
+    except (TypeError, ValueError):
+        return None
+
+    if actual_range.shape != (2,) or not np.all(np.isfinite(actual_range)):
+        return None
+
+    return actual_range[0], actual_range[1]
+
+
+def get_variable_range_from_attrs(variable):
+    """
+    Returns the (unpacked) lower and upper limits that the attributes of
+    `variable` place on its data, without reading the data. The limits come
+    from `actual_range` and from `valid_min`, `valid_max` and `valid_range`
+    (values outside the valid range are masked when the data is read). If
+    several attributes are set the tightest limits are used.
+
+    :param variable: netCDF4 Variable object
+    :return: tuple of (lower limit or None, upper limit or None,
+             list of attribute names used)
+    """
+    attrs = variable.ncattrs()
+    lower, upper, used = [], [], []
+    actual_range = _get_actual_range(variable)
+
+    if actual_range is not None:
+        actual_min, actual_max = actual_range
+        lower.append(actual_min)
+        upper.append(actual_max)
+        used.append("actual_range")
+
+    valid_min, valid_max = _get_unpacked_valid_limits(variable)
+
+    if valid_min is not None:
+        lower.append(valid_min)
+    if valid_max is not None:
+        upper.append(valid_max)
+
+    used.extend([attr for attr in ("valid_range", "valid_min", "valid_max") if attr in attrs])
+
+    return (max(lower) if lower else None, min(upper) if upper else None, used)
+
+
+def check_variable_bounds_from_attrs(ds, var_id, minimum, maximum):
+    """
+    Checks whether the attributes of variable `var_id` settle whether its
+    values are within the bounds set by `minimum` and `maximum`. No data is
+    read. The answer is:
+     - True: the attributes prove that the values are within bounds (see
+       `get_variable_range_from_attrs`).
+     - False: `actual_range` shows that there are values out of bounds
+       (that are not excluded by the valid range).
+     - None: the attributes are missing or do not settle it, so the data
+       must be read.
+
+    :param ds: netCDF4 Dataset object
+    :paran var_id: the variable ID.
+    :param minimum: the minimum allowed value (a number)
+    :param maximum: the maximum allowed value (a number)
+    :return: tuple of (answer: True, False or None, list of attribute names used)
+    """
+    if var_id not in ds.variables: return None, []
+
+    variable = ds.variables[var_id]
+    lower, upper, used = get_variable_range_from_attrs(variable)
+
+    if lower is not None and upper is not None and lower >= minimum and upper <= maximum:
+        return True, used
+
+    actual_range = _get_actual_range(variable)
+
+    if actual_range is not None:
+        actual_min, actual_max = actual_range
+        valid_min, valid_max = _get_unpacked_valid_limits(variable)
+
+        def is_valid(value):
+            return ((valid_min is None or value >= valid_min) and
+                    (valid_max is None or value <= valid_max))
+
+        if (actual_min < minimum and is_valid(actual_min)) or \
+                (actual_max > maximum and is_valid(actual_max)):
+            return False, ["actual_range"] + [attr for attr in ("valid_range", "valid_min", "valid_max")
+                                              if attr in variable.ncattrs()]
+
+    return None, []
+
+
+def variable_is_within_valid_bounds(ds, var_id, minimum, maximum,
+                                    max_bytes=DEFAULT_MAX_BLOCK_BYTES):
     """
     Checks whether variable `var_id` is out of bounds set by arguments
-    `minimum` and `maximum`.
+    `minimum` and `maximum`. The variable is read in blocks of at most
+    `max_bytes` and the check stops at the first block with values out of
+    bounds.
 
     :param ds: netCDF4 Dataset object
     :paran var_id: the variable ID.
     :param minimum: the minimum allowed value (a number)
     :param maximum: the maximum allowed value (a number)
+    :param max_bytes: upper limit on the size of each block (bytes) [integer]
     :return: boolean
     """
     if var_id not in ds.variables: return False
 
-    data = ds.variables[var_id][:]
-    mn, mx = data.min(), data.max()
-
-    if mn < minimum or mx > maximum:
-        return False
+    for mn, mx in iter_variable_block_ranges(ds.variables[var_id], max_bytes):
+        if mn < minimum or mx > maximum:
+            return False
 
     return True
 
 
+def compare_variable_values(variable, expected_values, rtol=1e-05, atol=1e-08,
+                            max_bytes=DEFAULT_MAX_BLOCK_BYTES):
+    """
+    Compares the values of `variable` with `expected_values`, which must have
+    the same number of items as the variable. The variable is read in blocks
+    (see `iter_variable_blocks`) and the comparison stops at the first
+    difference. Numeric values are compared within the tolerances `rtol` and
+    `atol` (as used by `numpy.isclose`); other values must be equal. Masked
+    values never match.
+
+    :param variable: netCDF4 Variable object
+    :param expected_values: sequence (or array) of expected values
+    :param rtol: relative tolerance [float]
+    :param atol: absolute tolerance [float]
+    :param max_bytes: upper limit on the size of each block (bytes) [integer]
+    :return: None if all values match, otherwise a tuple of
+             (flat index, value found, value expected) for the first difference.
+    """
+    shape = variable.shape
+    expected = np.asarray(expected_values).reshape(shape)
+
+    for index in iter_variable_blocks(variable, max_bytes):
+        block = variable[index]
+        data = np.ma.getdata(block)
+        exp = expected[index]
+
+        if data.dtype.kind in "iufb" and exp.dtype.kind in "iufb":
+            same = np.isclose(data, exp, rtol=rtol, atol=atol)
+        else:
+            same = np.asarray(data == exp)
+
+        same = np.broadcast_to(same & ~np.ma.getmaskarray(block), data.shape)
+
+        if not same.all():
+            position = np.unravel_index(np.argmin(same), data.shape)
+            found = data[position]
+
+            if not shape:
+                return 0, found, exp[()]
+
+            starts = [sl.start for sl in index]
+            flat_index = np.ravel_multi_index([i + start for i, start in zip(position, starts)], shape)
+            return int(flat_index), found, exp[position]
+
+    return None
+
+
+def char_array_to_strings(array):
+    """
+    Converts a character array (where the last dimension holds the characters
+    of each string) to an array of strings with a single vectorised operation.
+    Trailing fill characters and white space padding are removed. Arrays that
+    already hold strings are returned as arrays of (trimmed) strings.
+
+    :param array: numpy (or masked) array of characters or strings.
+    :return: numpy array of strings.
+    """
+    array = np.ma.getdata(array)
+
+    if array.dtype.kind == "S" and array.dtype.itemsize == 1 and array.ndim > 1:
+        n_chars = array.shape[-1]
+
+        if n_chars == 0:
+            return np.full(array.shape[:-1], "", dtype=str)
+
+        array = np.ascontiguousarray(array).view("S{}".format(n_chars)).reshape(array.shape[:-1])
+
+    if array.dtype.kind == "S":
+        strings = np.char.decode(array, "utf-8")
+    else:
+        strings = np.asarray(array, dtype=str)
+
+    return np.char.rstrip(strings, " \x00")
+
+
 def check_nc_attribute(variable, attr, expected_value):
     """
     Checks that attribute ``attr`` is in the netCDF4 Variable and the value
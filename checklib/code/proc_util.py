@@ -0,0 +1,282 @@
+"""
+proc_util.py
+============
+
+Utilities for running functions in a pool of reusable ("warm") worker
+processes, with a timeout on each call and a cap on the memory of each worker.
+
+A worker that times out (including a worker whose initializer does not finish
+within the startup timeout) or dies (e.g. from a segmentation fault or running
+out of memory) is terminated and replaced by a new one when next needed.
+
+"""
+
+import atexit
+import multiprocessing
+import queue
+import threading
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Default time limit (in seconds) for a worker to start and run its initializer
+DEFAULT_STARTUP_TIMEOUT = 120
+
+
+class ProcessTimeout(Exception):
+    pass
+
+
+class ProcessFailure(Exception):
+    pass
+
+
+def _set_memory_limit(memory_limit):
+    "Sets the maximum address space (in bytes) of the current process."
+    if memory_limit and resource is not None:
+        hard = resource.getrlimit(resource.RLIMIT_AS)[1]
+
+        if hard != resource.RLIM_INFINITY:
+            memory_limit = min(memory_limit, hard)
+
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, hard))
+
+
+def _worker_main(conn, memory_limit, initializer, initargs):
+    """
+    Main loop of a worker process: runs the initializer, then receives
+    (function, args) tasks and sends back (success, result or error message).
+    The memory limit is set after the initializer so that it only applies to
+    the tasks.
+    """
+    if initializer is not None:
+        initializer(*initargs)
+
+    _set_memory_limit(memory_limit)
+    conn.send("ready")
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+
+        if task is None:
+            break
+
+        func, args = task
+
+        try:
+            conn.send((True, func(*args)))
+        except BaseException as err:
+            conn.send((False, "{}: {}".format(type(err).__name__, err)))
+
+
+class _Worker(object):
+    "A worker process (and the connection used to send it tasks)."
+
+    def __init__(self, context, memory_limit, initializer, initargs, startup_timeout):
+        self._startup_timeout = startup_timeout
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_worker_main,
+                                        args=(child_conn, memory_limit, initializer, initargs),
+                                        daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._ready = False
+
+    def run(self, func, args, timeout):
+        # Wait for the initializer to finish (not included in the timeout)
+        if not self._ready:
+            if not self._conn.poll(self._startup_timeout):
+                raise ProcessTimeout("Worker process did not start within {} seconds.".format(
+                                     self._startup_timeout))
+
+            self._receive()
+            self._ready = True
+
+        self._conn.send((func, args))
+
+        if not self._conn.poll(timeout):
+            raise ProcessTimeout("Worker process did not respond within {} seconds.".format(timeout))
+
+        success, value = self._receive()
+
+        if not success:
+            raise ProcessFailure(value)
+
+        return value
+
+    def _receive(self):
+        try:
+            return self._conn.recv()
+        except (EOFError, OSError):
+            self._process.join(1)
+            raise ProcessFailure("Worker process exited with code: {}.".format(
+                                 self._process.exitcode))
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def stop(self):
+        try:
+            self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+
+        self._process.join(1)
+        self.terminate()
+
+    def terminate(self):
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+
+        self._conn.close()
+
+
+class ProcessPool(object):
+    """
+    A pool of reusable worker processes. Each worker runs `initializer` once
+    when it starts (e.g. to import slow modules) and then runs many tasks.
+    Workers are started when first needed.
+
+    Usage:
+        pool = ProcessPool(size=2, timeout=60, memory_limit=2**31)
+        result = pool.run(func, arg1, arg2)
+    """
+
+    def __init__(self, size=1, timeout=None, memory_limit=None, initializer=None,
+                 initargs=(), mp_context="spawn", startup_timeout=DEFAULT_STARTUP_TIMEOUT):
+        """
+        :param size: number of worker processes [integer]
+        :param timeout: default time limit for each task (in seconds) [float]
+        :param memory_limit: maximum address space of each worker (in bytes) [integer]
+        :param initializer: function run by each worker process when it starts
+        :param initargs: arguments for `initializer` [tuple]
+        :param mp_context: multiprocessing start method [string] (default: "spawn",
+                           so that workers do not inherit the state of this process)
+        :param startup_timeout: time limit for a worker to start and run `initializer`
+                                (in seconds) [float]
+        """
+        self.size = size
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.memory_limit = memory_limit
+        self._initializer = initializer
+        self._initargs = initargs
+        self._context = multiprocessing.get_context(mp_context)
+
+        # Slots for the workers (None until started) - most recently used first
+        self._slots = queue.LifoQueue()
+        self._all_workers = set()
+        self._lock = threading.Lock()
+
+        for _ in range(size):
+            self._slots.put(None)
+
+    def run(self, func, *args, **kwargs):
+        """
+        Runs `func(*args)` in a worker process and returns the result. The
+        function, arguments and result must be picklable.
+
+        Raises ProcessTimeout if the task takes longer than `timeout` seconds
+        (or a new worker does not start within `startup_timeout` seconds)
+        and ProcessFailure if the task raises an exception or the worker dies.
+
+        :param func: module-level function
+        :param timeout: time limit (in seconds), overriding the pool default [float]
+        :return: result of `func(*args)`
+        """
+        timeout = kwargs.get("timeout", self.timeout)
+        worker = self._slots.get()
+
+        try:
+            if worker is None or not worker.is_alive():
+                worker = self._start_worker(worker)
+
+            return worker.run(func, args, timeout)
+
+        except ProcessTimeout:
+            worker = self._discard_worker(worker)
+            raise
+
+        except ProcessFailure:
+            if worker is not None and not worker.is_alive():
+                worker = self._discard_worker(worker)
+            raise
+
+        finally:
+            self._slots.put(worker)
+
+    def _start_worker(self, old_worker):
+        if old_worker is not None:
+            self._discard_worker(old_worker)
+
+        worker = _Worker(self._context, self.memory_limit, self._initializer, self._initargs,
+                         self.startup_timeout)
+
+        with self._lock:
+            self._all_workers.add(worker)
+
+        return worker
+
+    def _discard_worker(self, worker):
+        worker.terminate()
+
+        with self._lock:
+            self._all_workers.discard(worker)
+
+        return None
+
+    def close(self):
+        "Stops all worker processes."
+        with self._lock:
+            workers = list(self._all_workers)
+            self._all_workers.clear()
+
+        for worker in workers:
+            worker.stop()
+
+
+# Shared pools, keyed by the arguments used to create them
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_process_pool(size=1, memory_limit=None, initializer=None, initargs=(),
+                     startup_timeout=DEFAULT_STARTUP_TIMEOUT):
+    """
+    Returns a shared ProcessPool for the given arguments, creating it on
+    first request. Shared pools are closed when the interpreter exits.
+
+    :param size: number of worker processes [integer]
+    :param memory_limit: maximum address space of each worker (in bytes) [integer]
+    :param initializer: function run by each worker process when it starts
+    :param initargs: arguments for `initializer` [tuple]
+    :param startup_timeout: time limit for a worker to start and run `initializer`
+                            (in seconds) [float]
+    :return: ProcessPool instance
+    """
+    key = (size, memory_limit, initializer, tuple(initargs), startup_timeout)
+
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = ProcessPool(size=size, memory_limit=memory_limit,
+                                      initializer=initializer, initargs=initargs,
+                                      startup_timeout=startup_timeout)
+        return _POOLS[key]
+
+
+@atexit.register
+def close_process_pools():
+    "Closes all shared ProcessPools."
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+
+    for pool in pools:
+        pool.close()
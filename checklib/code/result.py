@@ -0,0 +1,104 @@
+"""
+result.py
+=========
+
+Creation of the Result objects returned by checks.
+
+Importing compliance_checker also imports netCDF4, numpy, owslib, requests,
+etc. (about 0.3s), so checks that do not otherwise need it (e.g. file name
+checks) build a `LightResult`: a duck type of `compliance_checker.base.Result`
+with the same arguments, attributes and methods (and equal when serialised).
+
+Calling a check (as compliance-checker plugins and the CheckSuite do) always
+returns a `compliance_checker.base.Result`: a LightResult is converted with
+`LightResult.to_result()`. Short-lived callers (e.g. ingest hooks) can use
+`check.run(...)` to get the LightResult without importing compliance_checker.
+
+"""
+
+import pprint
+
+# Weight of a Result (as `compliance_checker.base.BaseCheck.MEDIUM`)
+_MEDIUM = 2
+
+
+class LightResult(object):
+    """
+    Stand-in for `compliance_checker.base.Result` (with the same arguments,
+    attributes and methods) that does not need compliance_checker.
+    """
+
+    def __init__(self, weight=_MEDIUM, value=None, name=None, msgs=None, children=None,
+                 checker=None, check_method=None, variable_name=None):
+        self.weight = weight
+
+        if value is None:
+            self.value = None
+        elif isinstance(value, tuple):
+            assert len(value) == 2, "Result value must be 2-tuple or boolean!"
+            self.value = value
+        else:
+            self.value = bool(value)
+
+        self.name = name
+        self.msgs = msgs or []
+        self.children = children or []
+
+        self.checker = checker
+        self.check_method = check_method
+        self.variable_name = variable_name
+
+    def __repr__(self):
+        ret = "{} (*{}): {}".format(self.name, self.weight, self.value)
+
+        if len(self.msgs):
+            if len(self.msgs) == 1:
+                ret += " ({})".format(self.msgs[0])
+            else:
+                ret += " ({!s} msgs)".format(len(self.msgs))
+
+        if len(self.children):
+            ret += " ({!s} children)".format(len(self.children))
+            ret += "\n" + pprint.pformat(self.children)
+
+        return ret
+
+    def serialize(self):
+        "Returns a serializable dictionary that represents the result."
+        return {"name": self.name, "weight": self.weight, "value": self.value,
+                "msgs": self.msgs, "children": [i.serialize() for i in self.children]}
+
+    def __eq__(self, other):
+        return self.serialize() == other.serialize()
+
+    def to_result(self):
+        "Returns the equivalent `compliance_checker.base.Result` (importing it)."
+        from compliance_checker.base import Result
+
+        result = Result(self.weight, self.value, self.name, self.msgs,
+                        children=[child.to_result() if isinstance(child, LightResult) else child
+                                  for child in self.children],
+                        checker=self.checker, check_method=self.check_method,
+                        variable_name=self.variable_name)
+        result.__dict__.update(dict((key, value) for key, value in self.__dict__.items()
+                                    if not hasattr(result, key)))
+        return result
+
+
+def make_result(*args, **kwargs):
+    "Returns a new LightResult for the arguments given (as for a Result)."
+    return LightResult(*args, **kwargs)
+
+
+def to_result(result):
+    """
+    Returns `result` as a `compliance_checker.base.Result`, converting it if
+    it is a LightResult.
+
+    :param result: LightResult or Result object
+    :return: Result object
+    """
+    if isinstance(result, LightResult):
+        return result.to_result()
+
+    return result
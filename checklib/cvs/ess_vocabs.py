@@ -12,19 +12,59 @@ using a local file-system cache of the files.
 
 """
 
-import os, re, site
-from netCDF4 import Dataset
+import hashlib
+import json
+import os, re
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from checklib.code import nc_util
 
-# Check that ESSV directory exists, or give warning
 PYESSV_ARCHIVE_HOME = 'PYESSV_ARCHIVE_HOME'
-VOCABS_DIR = os.environ.get(PYESSV_ARCHIVE_HOME, 
-    os.path.join(site.getsitepackages()[0], 'amf-pyessv-vocabs'))
-os.environ['PYESSV_ARCHIVE_HOME'] = VOCABS_DIR
 
-if not os.path.isdir(VOCABS_DIR):
-    import warnings
-    warnings.warn('Could not find PYESSV vocabularies directory. Vocabulary checks '
-                  'will not work. Directory should exist at: {}'.format(VOCABS_DIR))
+# Vocabulary directories that have already been checked for existence
+_CHECKED_VOCABS_DIRS = set()
+
+
+def get_vocabs_dir():
+    """
+    Returns the directory holding the PYESSV vocabularies. This is read from
+    the 'PYESSV_ARCHIVE_HOME' environment variable, which is set to a default
+    location (in site-packages) if not already set so that pyessv can find it.
+    A warning is given (once) if the directory does not exist.
+
+    This is only called when vocabularies are first loaded, so that importing
+    this module has no side-effects.
+
+    :return: directory path [string]
+    """
+    vocabs_dir = os.environ.get(PYESSV_ARCHIVE_HOME)
+
+    if vocabs_dir is None:
+        import site
+        vocabs_dir = os.path.join(site.getsitepackages()[0], 'amf-pyessv-vocabs')
+        os.environ[PYESSV_ARCHIVE_HOME] = vocabs_dir
+
+    # Check that ESSV directory exists, or give warning
+    if vocabs_dir not in _CHECKED_VOCABS_DIRS:
+        _CHECKED_VOCABS_DIRS.add(vocabs_dir)
+
+        if not os.path.isdir(vocabs_dir):
+            import warnings
+            warnings.warn('Could not find PYESSV vocabularies directory. Vocabulary checks '
+                          'will not work. Directory should exist at: {}'.format(vocabs_dir))
+
+    return vocabs_dir
+
+
+def __getattr__(name):
+    # `VOCABS_DIR` was previously set when this module was imported
+    if name == 'VOCABS_DIR':
+        return get_vocabs_dir()
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 # Set pyessv as None, then import and set inside the class.
@@ -33,6 +73,11 @@ if not os.path.isdir(VOCABS_DIR):
 pyessv = None
 
 
+# Compiled parser for file names built from a given sequence of keys
+_FileNameParser = namedtuple("_FileNameParser", ["n_items", "delimiter", "template_parser",
+                                                 "n_collections", "collection_indices", "regexs"])
+
+
 def validate_daterange(frequency):
     if frequency == "yr" or frequency == "decadal":
         template = "yyyy"
@@ -56,12 +101,21 @@ class ESSVocabs(object):
         Instantiates class by setting authority, scope and loading the CVs 
         from local cache.
         """
-        # Import pyessv and set the import in global scope
+        # Import pyessv (once the vocabularies directory is set) and set the
+        # import in global scope
+        get_vocabs_dir()
+
         global pyessv
         import pyessv
 
         self.authority = authority
         self.scope = scope
+        self._term_index = {}
+        self._value_cache = {}
+        self._allowed_values_cache = {}
+        self._file_name_parsers = {}
+        self._term_values_cache = {}
+        self._version = None
         self._cache_controlled_vocabularies()
 
 
@@ -90,15 +144,90 @@ class ESSVocabs(object):
         else:
             return fixed_attr
 
+    def _get_term(self, colln, item):
+        """
+        Returns the term in collection `colln` whose canonical name or label
+        matches `item`. An index of each collection is built on first access
+        so that subsequent lookups are dictionary look-ups.
+
+        :param colln: collection ID/lookup [string]
+        :param item: canonical name or label of term [string]
+        :return: pyessv.Term
+        """
+        return self._get_term_index(colln)[item]
+
+    def _get_term_index(self, colln):
+        """
+        Returns the index of terms in collection `colln` keyed by both
+        canonical name and label (building it on first access).
+
+        :param colln: collection ID/lookup [string]
+        :return: dictionary of {name: pyessv.Term}
+        """
+        index = self._term_index.get(colln)
+
+        if index is None:
+            index = {}
+
+            # The first matching term wins, as with a scan of the collection
+            for term in self._cvs[colln]:
+                index.setdefault(term.canonical_name, term)
+                index.setdefault(term.label, term)
+
+            self._term_index[colln] = index
+
+        return index
+
+    def get_version(self):
+        """
+        Returns a version identifier for the vocabularies in the scope: a hash
+        of the content of every term, so it changes whenever any term changes.
+
+        :return: hex digest [string]
+        """
+        if self._version is None:
+            digest = hashlib.sha256()
+
+            for collection in self._cvs:
+                for term in collection:
+                    digest.update(json.dumps([collection.name, term.canonical_name, term.label,
+                                              term.data], sort_keys=True, default=str).encode("utf-8"))
+
+            self._version = digest.hexdigest()
+
+        return self._version
+
+    def preload(self):
+        """
+        Builds the term index of every collection in the scope up front.
+        This is useful before forking worker processes so that they share
+        the indexes rather than each building their own.
+        """
+        for collection in self._cvs:
+            self._get_term_index(collection.name)
+
     def get_value(self, term, property="label"):
         """
         Makes the lookup for a given term and matches against the property given.
         Copes with nested dictionary lookups that are expressed by the ":" convention in the value of `attr`.
+        Values of string lookups are cached, so repeated lookups are cheap.
 
         :param term: term to lookup (either string as '<collection>:<term>' or pyessv Term instance).
         :param property: property of term to match against (even including sub-dictionary lookups).
         :return: value or None if not found.
         """
+        if isinstance(term, str):
+            cache_key = (term, property)
+
+            if cache_key not in self._value_cache:
+                self._value_cache[cache_key] = self._get_value(term, property)
+
+            return self._value_cache[cache_key]
+
+        return self._get_value(term, property)
+
+    def _get_value(self, term, property):
+        "Does the work for `get_value` (see above)."
         # Delay nested looks up if required
         if ":" in property:
             property, key_chain = property.split(":", 2)
@@ -112,7 +241,7 @@ class ESSVocabs(object):
             try:
                 # Use only the last 2 values (collection, item) to do the lookup
                 colln, item = term.split(":")[-2:]
-                term = [v for v in self._cvs[colln] if item in (v.canonical_name, v.label)][0]
+                term = self._get_term(colln, item)
             except:
                 raise Exception("Could not get value of term based on vocabulary lookup: '{}'.".format(term))
 
@@ -127,6 +256,52 @@ class ESSVocabs(object):
 
         return value
 
+    def get_allowed_values(self, collection, property="label"):
+        """
+        Returns the values of `property` for all terms in `collection`. The
+        result is computed once per (collection, property) and cached as a
+        frozenset (or a tuple if the values cannot be hashed).
+
+        :param collection: vocabulary collection ID/lookup [string]
+        :param property: property of term (even including sub-dictionary lookups).
+        :return: frozenset (or tuple) of allowed values
+        """
+        cache_key = (self._get_lookup_id(collection), property)
+        allowed_values = self._allowed_values_cache.get(cache_key)
+
+        if allowed_values is None:
+            values = [self.get_value(term, property) for term in self._cvs[cache_key[0]]]
+
+            try:
+                allowed_values = frozenset(values)
+            except TypeError:
+                allowed_values = tuple(values)
+
+            self._allowed_values_cache[cache_key] = allowed_values
+
+        return allowed_values
+
+    def _is_allowed_value(self, value, vocab_lookups):
+        """
+        Returns True if `value` is an allowed value for any of the vocabulary
+        lookups (each expressed as '<collection>:<property>').
+
+        :param value: value to check.
+        :param vocab_lookups: sequence of vocabulary lookups [strings]
+        :return: boolean
+        """
+        for vocab_lookup in vocab_lookups:
+            this_lookup, property = vocab_lookup.split(":", 1)
+
+            try:
+                if value in self.get_allowed_values(this_lookup, property):
+                    return True
+            except (TypeError, ValueError):
+                # Unhashable or array values cannot match a vocabulary term
+                pass
+
+        return False
+
     def check_global_attribute(self, ds, attr, vocab_lookup):
         """
         Checks that global attribute `attr` is in allowed values (from CV).
@@ -145,18 +320,36 @@ class ESSVocabs(object):
         nc_attr = ds.getncattr(attr) 
         vocab_lookups = (vocab_lookup or attr).split()
 
-        allowed_values = []
-
-        for vocab_lookup in vocab_lookups:
-            this_lookup, property = vocab_lookup.split(":",1)
-            allowed_values.extend([self.get_value(term, property) \
-                for term in self._cvs[self._get_lookup_id(this_lookup)]])
-
-        if nc_attr not in allowed_values:
+        if not self._is_allowed_value(nc_attr, vocab_lookups):
             return 1
             
         return 2
 
+    def check_global_attributes(self, ds, vocab_lookups):
+        """
+        Checks many global attributes against their allowed values (from CV)
+        in one pass, reading the global attributes from `ds` only once.
+
+        :param ds: NetCDF4 Dataset object
+        :param vocab_lookups: dictionary of {attribute name: vocab_lookup} where
+               each `vocab_lookup` is as described for `check_global_attribute`
+               (or None to use the attribute name).
+        :return: dictionary of {attribute name: score} where each score is an
+                 Integer (0: not found; 1: found (not recognised); 2: found and recognised.
+        """
+        nc_attrs = nc_util.get_global_attrs(ds)
+        scores = {}
+
+        for attr, vocab_lookup in vocab_lookups.items():
+            if attr not in nc_attrs:
+                scores[attr] = 0
+            elif not self._is_allowed_value(nc_attrs[attr], (vocab_lookup or attr).split()):
+                scores[attr] = 1
+            else:
+                scores[attr] = 2
+
+        return scores
+
 
     def get_terms(self, collection):
         """
@@ -174,6 +367,55 @@ class ESSVocabs(object):
         return terms
 
 
+    def get_term_values(self, collection, prop="raw_name"):
+        """
+        Returns an array of the property `prop` of all terms (in alphabetical
+        order) for a given collection. The array is built once and cached.
+
+        :param collection: vocabulary collection ID/lookup
+        :param prop: property of term
+        :return: numpy array
+        """
+        cache_key = (self._get_lookup_id(collection), prop)
+        term_values = self._term_values_cache.get(cache_key)
+
+        if term_values is None:
+            term_values = np.array([getattr(term, prop) for term in self.get_terms(collection)])
+            self._term_values_cache[cache_key] = term_values
+
+        return term_values
+
+    def get_array_mismatch(self, array, collection, prop="raw_name"):
+        """
+        Compares the values in `array` with those in the vocabulary collection
+        with each term being matched by its property specified by `prop`.
+        Character arrays are converted to strings before comparing them.
+        Raises an exception if no terms are found.
+
+        :param array: array/list of strings (or character array)
+        :param collection: vocabulary collection ID/lookup
+        :param prop: property of term to compare with item in array
+        :return: None if all items match, otherwise a tuple of
+                 (index, value found, value expected) for the first mismatch.
+                 If the lengths differ then the missing value is None.
+        """
+        term_values = self.get_term_values(collection, prop)
+        values = nc_util.char_array_to_strings(np.asarray(array))
+
+        n = min(len(values), len(term_values))
+        mismatches = np.flatnonzero(values[:n] != term_values[:n])
+
+        if mismatches.size:
+            i = mismatches[0]
+            return i, values[i], term_values[i]
+
+        if len(values) != len(term_values):
+            found = values[n] if n < len(values) else None
+            expected = term_values[n] if n < len(term_values) else None
+            return n, found, expected
+
+        return None
+
     def check_array_matches_terms(self, array, collection, prop="raw_name"):
         """
         Checks that the values in `array` match those in the vocabulary collection
@@ -185,26 +427,10 @@ class ESSVocabs(object):
         :return: boolean
         """
         try:
-            terms = self.get_terms(collection)
+            return self.get_array_mismatch(array, collection, prop) is None
         except:
             return False
 
-        term_values = [getattr(term, prop) for term in terms]
-
-        # If not the same length return False
-        if len(array) != len(term_values):
-            return False
-
-        # If any items do not match, return False
-        for i, item in enumerate(term_values):
-
-            # Convert character array to string for each element
-            if item != ''.join([_.decode('utf-8') for _ in array[i]]):
-                return False
-
-        return True
-
-
     def check_global_attribute_value(self, ds, attr, value, property="label"):
         """
         Checks that global attribute `attr` is in allowed values (from CV) and
@@ -231,9 +457,7 @@ class ESSVocabs(object):
                             format(attr=attr, nc_attr=nc_attr, value=value))
             score = 1
 
-        allowed_values = [self.get_value(term, property) for term in self._cvs[self._get_lookup_id(attr)]]
-
-        if nc_attr not in allowed_values:
+        if not self._is_allowed_value(nc_attr, ["{}:{}".format(attr, property)]):
             messages.append("Required '{attr}' global attribute value "
                             "'{nc_attr}' is invalid.".
                             format(attr=attr, nc_attr=nc_attr))
@@ -264,49 +488,105 @@ class ESSVocabs(object):
         :keys  sequence of attribute keys to look-up values from in CVs.
         :delimiter  string used as delimiter in file name: string.
         :extension  the file extension: string.
-        :return: boolean
+        :return: tuple of (score, messages)
+        """
+        parser = self._get_file_name_parser(keys, delimiter)
+        return self._check_file_name(filename, parser, extension)
+
+    def check_file_names(self, filenames, keys=None, delimiter="_", extension=".nc"):
+        """
+        Checks a sequence of file names using a single compiled parser.
+        See `check_file_name` for details of the scoring.
+
+        :param filenames: sequence of file names [strings]
+        :keys  sequence of attribute keys to look-up values from in CVs.
+        :delimiter  string used as delimiter in file name: string.
+        :extension  the file extension: string.
+        :return: list of (score, messages) tuples - one per file name.
+        """
+        parser = self._get_file_name_parser(keys, delimiter)
+        return [self._check_file_name(filename, parser, extension)
+                for filename in filenames]
+
+    def _get_file_name_parser(self, keys, delimiter):
+        """
+        Returns a parser for file names made up of `keys` separated by
+        `delimiter`. The parser is built once per (keys, delimiter) and cached.
+
+        :keys  sequence of attribute keys to look-up values from in CVs.
+        :delimiter  string used as delimiter in file name: string.
+        :return: _FileNameParser instance
         """
         if not keys or type(keys) not in (type([]), type(())):
             raise Exception("File name checks require an input of attribute keys to check against. "
                             "None given.")
 
+        cache_key = (tuple(keys), delimiter)
+        parser = self._file_name_parsers.get(cache_key)
+
+        if parser is None:
+            template, regexs = _get_templates(keys, delimiter)
+            collections = self._get_collections(keys)
+            indices = tuple(i for i, key in enumerate(keys) if not key.startswith("regex:"))
+
+            # Set strictness of check
+            strictness_level = 1  # Uses raw-name - which matches case
+
+            template_parser = None
+            if collections:
+                template_parser = pyessv.create_template_parser(template, collections,
+                                                                seperator=delimiter,
+                                                                strictness=strictness_level)
+
+            compiled_regexs = tuple((i, regex, re.compile(regex)) for i, regex in regexs)
+            parser = _FileNameParser(len(keys), delimiter, template_parser,
+                                     len(collections), indices, compiled_regexs)
+            self._file_name_parsers[cache_key] = parser
+
+        return parser
+
+    def _check_file_name(self, filename, parser, extension):
+        """
+        Checks file name against a parser from `_get_file_name_parser`.
+
+        :param filename: string
+        :param parser: _FileNameParser instance
+        :extension  the file extension: string.
+        :return: tuple of (score, messages)
+        """
         score = 0
         messages = []
 
         filebase, ext = os.path.splitext(filename)
-        items = filebase.split(delimiter)
+        items = filebase.split(parser.delimiter)
 
         # Check extension
         if ext == extension:
             score += 1
 
-        # Now check
-        template, regexs = _get_templates(keys, delimiter, items)
-        collections = self._get_collections(keys)
-
-        # Set strictness of check
-        strictness_level = 1  # Uses raw-name - which matches case
-
-        if '{}' in template:
+        # Now check the vocabulary components
+        if parser.template_parser:
             try:
-                parser = pyessv.create_template_parser(template, collections,
-                                                       seperator=delimiter,
-                                                       strictness=strictness_level)
-                parser.parse(filebase)
-                score += len(collections)
+                if len(items) != parser.n_items:
+                    raise pyessv.TemplateParsingError(filebase)
+
+                parser.template_parser.parse(parser.delimiter.join(
+                    [items[i] for i in parser.collection_indices]))
+                score += parser.n_collections
             except AssertionError as ex:
-                messages.append(ex.message)
+                messages.append(str(ex))
             except pyessv.TemplateParsingError as ex:
                 messages.append('File name does not match global attributes.')
 
         # test any regexs that were found
-        for i, regex in regexs:
-            regex_c = re.compile(regex)
-            if regex_c.match(items[i]):
+        for i, regex, regex_c in parser.regexs:
+            item = items[i] if i < len(items) else ''
+
+            if regex_c.match(item):
                 score += 1
             else:
                 messages.append('File name fragment {item} does not match '
-                                'regex {regex}.'.format(item=items[i],
+                                'regex {regex}.'.format(item=item,
                                                         regex=regex))
         return score, messages
 
@@ -325,28 +605,117 @@ class ESSVocabs(object):
         return tuple(collections)
 
 
-def _get_templates(keys, delimiter, items):
+class ESSVocabsRegistry(object):
+    """
+    Thread-safe, bounded registry of loaded ESSVocabs instances, keyed by
+    (authority, scope). Each vocabulary is loaded once and then shared by
+    every check that refers to it. The least recently used instance is
+    dropped when `max_size` is exceeded.
+    """
+
+    def __init__(self, max_size=32, factory=None):
+        """
+        :param max_size: maximum number of ESSVocabs instances held [integer]
+        :param factory: callable taking (authority, scope) that returns a
+                        new instance (defaults to ESSVocabs)
+        """
+        self.max_size = max_size
+        self._factory = factory or ESSVocabs
+        self._vocabs = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, authority, scope):
+        """
+        Returns the ESSVocabs instance for (authority, scope), loading it on
+        first request.
+
+        :param authority: vocabulary authority [string]
+        :param scope: vocabulary scope [string]
+        :return: ESSVocabs instance
+        """
+        key = (authority, scope)
+
+        with self._lock:
+            if key in self._vocabs:
+                self.hits += 1
+                self._vocabs.move_to_end(key)
+                return self._vocabs[key]
+
+            self.misses += 1
+            vocabs = self._factory(authority, scope)
+            self._vocabs[key] = vocabs
+
+            while len(self._vocabs) > self.max_size:
+                self._vocabs.popitem(last=False)
+
+            return vocabs
+
+    def invalidate(self, authority=None, scope=None):
+        """
+        Removes cached instances so that they are reloaded on next request.
+        If `authority` and/or `scope` are given then only matching instances
+        are removed, otherwise the registry is emptied.
+
+        :param authority: vocabulary authority [string]
+        :param scope: vocabulary scope [string]
+        :return: number of instances removed [integer]
+        """
+        with self._lock:
+            keys = [key for key in self._vocabs
+                    if authority in (None, key[0]) and scope in (None, key[1])]
+
+            for key in keys:
+                del self._vocabs[key]
+
+            return len(keys)
+
+    def stats(self):
+        """
+        Returns a dictionary of usage statistics for the registry.
+
+        :return: dictionary of: size, max_size, hits, misses
+        """
+        with self._lock:
+            return {"size": len(self._vocabs), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._vocabs)
+
+
+# Process-wide registry used by the checks
+VOCABS_REGISTRY = ESSVocabsRegistry()
+
+
+def get_ess_vocabs(vocabulary_ref):
+    """
+    Returns a shared ESSVocabs instance from the process-wide registry.
+
+    :param vocabulary_ref: vocabulary reference as '<authority>:<scope>' [string]
+    :return: ESSVocabs instance
+    """
+    return VOCABS_REGISTRY.get(*vocabulary_ref.split(":")[:2])
+
+
+def _get_templates(keys, delimiter):
     """
-    Get the template and list of regex constructed from the items.
+    Get the template and list of regex constructed from the keys. The
+    template only includes the vocabulary components of the file name.
 
     :keys  sequence of attribute keys to look-up values from in CVs.
     :delimiter  string used as delimiter in file name: string.
-    :items a list of the components from the file name
-    :return: the template and a list of regex
+    :return: the template and a list of (index, regex) tuples
     """
     regex_list = []
+    n_collections = 0
+
     for i, key in enumerate(keys):
         if key.startswith("regex:"):
             regex_list.append((i, key.split('regex:')[1]))
-            if i == 0:
-                template = items[i]
-            else:
-                template = delimiter.join([template, items[i]])
         else:
-            if i == 0:
-                template = '{}'
-            else:
-                template = delimiter.join([template, '{}'])
+            n_collections += 1
 
+    template = delimiter.join(['{}'] * n_collections)
     return template, regex_list
-
@@ -1,10 +1,45 @@
-import inspect
+import importlib
 
 from checklib.register.callable_check_base import *
-from checklib.register.file_checks_register import *
-from checklib.register.nc_var_checks_register import *
-from checklib.register.nc_file_checks_register import *
-from checklib.register.nc_coords_checks_register import *
+
+
+# Map of check identifiers (class names) to the register modules that define
+# them. A register module is only imported when one of its checks is requested.
+CHECK_MODULES = {
+    "FileNameRegexCheck": "file_checks_register",
+    "FileNameStructureCheck": "file_checks_register",
+    "FileSizeCheck": "file_checks_register",
+    "NCFileIsReadableCheck": "format_checks_register",
+    "NCFileSoftwareCheck": "format_checks_register",
+    "NCCoordVarHasBoundsCheck": "nc_coords_checks_register",
+    "NCCoordVarHasLengthInVocabCheck": "nc_coords_checks_register",
+    "NCCoordVarHasValuesInVocabCheck": "nc_coords_checks_register",
+    "GlobalAttrRegexCheck": "nc_file_checks_register",
+    "GlobalAttrVocabCheck": "nc_file_checks_register",
+    "MainVariableAttributeCheck": "nc_file_checks_register",
+    "MainVariableTypeCheck": "nc_file_checks_register",
+    "MultiGlobalAttrRegexCheck": "nc_file_checks_register",
+    "NCMainVariableMetadataCheck": "nc_file_checks_register",
+    "NCVariableMetadataCheck": "nc_file_checks_register",
+    "NetCDFDimensionCheck": "nc_file_checks_register",
+    "NetCDFFormatCheck": "nc_file_checks_register",
+    "OneMainVariablePerFileCheck": "nc_file_checks_register",
+    "ValidGlobalAttrsMatchFileNameCheck": "nc_file_checks_register",
+    "VariableExistsInFileCheck": "nc_file_checks_register",
+    "VariableRangeCheck": "nc_file_checks_register",
+    "VariableTypeCheck": "nc_file_checks_register",
+    "NCArrayMatchesVocabTermsCheck": "nc_var_checks_register",
+}
+
+# Other classes that can be accessed as attributes of this package
+_BASE_CLASS_MODULES = {
+    "FileCheckBase": "file_checks_register",
+    "NCFileCheckBase": "nc_file_checks_register",
+}
+
+
+def _import_register(module_name):
+    return importlib.import_module("{}.{}".format(__name__, module_name))
 
 
 def get_check_class(id):
@@ -15,8 +50,28 @@ def get_check_class(id):
     :return: class
     """
     try:
-        assert id.endswith("Check")
-        return eval(id)
-    except:
+        return CHECK_REGISTRY[id]
+    except KeyError:
+        pass
+
+    if id not in CHECK_MODULES:
         raise Exception("Cannot identify Check with identifier: {}".format(id))
 
+    _import_register(CHECK_MODULES[id])
+    return CHECK_REGISTRY[id]
+
+
+def __getattr__(name):
+    # Allow access to checks (e.g. `checklib.register.FileSizeCheck`) without
+    # importing all the register modules up front
+    if name in CHECK_MODULES:
+        return get_check_class(name)
+
+    if name in _BASE_CLASS_MODULES:
+        return getattr(_import_register(_BASE_CLASS_MODULES[name]), name)
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(CHECK_MODULES) | set(_BASE_CLASS_MODULES))
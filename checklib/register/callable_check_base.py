@@ -1,8 +1,52 @@
-from netCDF4 import Dataset
+import hashlib
+import json
+from types import MappingProxyType
 
-from compliance_checker import MemoizedDataset
-from compliance_checker.base import BaseCheck, Dataset, Result
-from checklib.code.errors import FileError, ParameterError
+from checklib.code.errors import FileError, ParameterError, RegistryError
+from checklib.code import metrics, nc_audit
+from checklib.code.result import make_result, to_result
+
+# NOTE: netCDF4 and compliance_checker are slow to import so they are only
+#       imported when needed (i.e. when a check is run rather than defined).
+
+# Check levels (as defined in `compliance_checker.base.BaseCheck`)
+_LEVELS = {"HIGH": 3, "MEDIUM": 2, "LOW": 1}
+
+
+def _get_level(level):
+    "Returns the integer value of the named check `level`."
+    try:
+        return _LEVELS[level]
+    except KeyError:
+        from compliance_checker.base import BaseCheck
+        return getattr(BaseCheck, level)
+
+
+class _SupportedDatasets(object):
+    "Descriptor that imports the supported Dataset classes on first access."
+
+    def __get__(self, instance, owner):
+        from compliance_checker import MemoizedDataset
+        from netCDF4 import Dataset
+        return {Dataset, MemoizedDataset}
+
+
+def __getattr__(name):
+    # Names previously imported into this module at import time
+    if name in ("BaseCheck", "Dataset", "Result"):
+        import compliance_checker.base
+        return getattr(compliance_checker.base, name)
+
+    if name == "MemoizedDataset":
+        import compliance_checker
+        return compliance_checker.MemoizedDataset
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+# Registry of all check classes, keyed by class name. Classes are added when
+# they are defined (see `CallableCheckBase.__init_subclass__`).
+CHECK_REGISTRY = {}
 
 
 class CallableCheckBase(object):
@@ -15,8 +59,46 @@ class CallableCheckBase(object):
     #                       are NOT set in `defaults`
     required_args = []
     message_templates = []
-    level = BaseCheck.HIGH
-    supported_ds = {Dataset, MemoizedDataset}
+    level = _LEVELS["HIGH"]
+    supported_ds = _SupportedDatasets()
+
+    # Set to True in checks that only need the file header (not variable data)
+    header_only = False
+
+    # Set to True in checks whose result depends on the file name
+    uses_file_name = False
+
+    # Increment in a check whose behaviour changes between releases of
+    # checklib, so that its cached results are not reused (see `get_config_hash`)
+    version = 1
+
+    # Set to True at the end of `__init__`: instances cannot be modified after
+    # `_setup` so that one instance can be called from many threads at once.
+    # Any state needed while running a check must be local to `_get_result`.
+    _frozen = False
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Registers each (public) check class that is defined: i.e. '*Check'.
+        Raises a RegistryError if the name is already registered to a
+        different class (a class that is defined again, e.g. when its module
+        is reloaded, replaces the old one).
+        """
+        super().__init_subclass__(**kwargs)
+
+        name = cls.__name__
+        if not name.endswith("Check") or name.startswith("_"):
+            return
+
+        registered = CHECK_REGISTRY.get(name)
+
+        if registered is not None and \
+                (registered.__module__, registered.__qualname__) != (cls.__module__, cls.__qualname__):
+            raise RegistryError("Cannot register check '{}.{}': the name '{}' is already registered "
+                                "to '{}.{}'.".format(cls.__module__, cls.__qualname__, name,
+                                                     registered.__module__, registered.__qualname__))
+
+        CHECK_REGISTRY[name] = cls
 
     def __init__(self, kwargs, messages=None, level="HIGH", vocabulary_ref=None):
         self.kwargs = self.defaults.copy()
@@ -26,12 +108,37 @@ class CallableCheckBase(object):
 
         self._define_messages(messages)
         self.out_of = len(self.messages)
-        self.level = getattr(BaseCheck, level)
+        self.level = _get_level(level)
         # Allow vocab. ref to be given as kwarg or in params dict
         self.vocabulary_ref = vocabulary_ref or self.kwargs.get("vocabulary_ref", "")
 
         self._setup()
 
+        self.kwargs = MappingProxyType(self.kwargs)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise AttributeError("Cannot set attribute '{}': '{}' instances cannot be modified "
+                                 "after they are set up.".format(name, self.__class__.__name__))
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        if self._frozen:
+            raise AttributeError("Cannot delete attribute '{}': '{}' instances cannot be modified "
+                                 "after they are set up.".format(name, self.__class__.__name__))
+        object.__delattr__(self, name)
+
+    def __getstate__(self):
+        # Mapping proxies cannot be pickled
+        state = self.__dict__.copy()
+        state["kwargs"] = dict(self.kwargs)
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state, kwargs=MappingProxyType(state["kwargs"]))
+        self.__dict__.update(state)
+
     def _setup(self):
         "Child classes can override this to perform validation or modification of arguments."
         pass
@@ -77,6 +184,33 @@ class CallableCheckBase(object):
         """
         return self.__doc__.format(**self.kwargs)
 
+    def get_config_hash(self):
+        """
+        Returns a stable hash of the configuration of the check: its class
+        (and version), the version of checklib, its keyword arguments, level,
+        messages and vocabulary (with its version). Two checks with the same
+        hash give the same result for the same file.
+
+        :return: hex digest [string]
+        """
+        import checklib
+
+        cls = self.__class__
+        vocabulary_version = None
+
+        if self.vocabulary_ref:
+            from checklib.cvs.ess_vocabs import get_ess_vocabs
+            vocabulary_version = get_ess_vocabs(self.vocabulary_ref).get_version()
+
+        config = {"check": "{}.{}".format(cls.__module__, cls.__qualname__),
+                  "check_version": self.version, "checklib_version": checklib.__version__,
+                  "kwargs": dict(self.kwargs), "level": self.level, "messages": self.messages,
+                  "vocabulary_ref": self.vocabulary_ref,
+                  "vocabulary_version": vocabulary_version}
+
+        encoded = json.dumps(config, sort_keys=True, default=repr).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
     def get_short_name(self):
         return self.short_name.format(**self.kwargs)
 
@@ -95,13 +229,62 @@ class CallableCheckBase(object):
         :param primary_arg: main argument (object to check)
         :return: Result object (from compliance checker)
         """
+        return to_result(self.run(primary_arg))
+
+    def run(self, primary_arg):
+        """
+        Runs the check as `__call__` does but returns the result as it was
+        built by the check: a LightResult for checks that do not use
+        compliance_checker (so that it is not imported), otherwise a Result.
+
+        :param primary_arg: main argument (object to check)
+        :return: LightResult or Result object (see `checklib.code.result`)
+        """
+        if metrics.is_enabled():
+            return metrics.record_call(self, self._call, primary_arg)
+
+        return self._call(primary_arg)
+
+    def _call(self, primary_arg):
         try:
             self._check_primary_arg(primary_arg)
         except FileError as ex:
-            return Result(self.level, (0, self.out_of),
-                          self.get_short_name(), ex.args[0])
+            return make_result(self.level, (0, self.out_of),
+                               self.get_short_name(), ex.args[0])
+
+        if nc_audit.is_accounting_enabled() or (self.header_only and nc_audit.is_enabled()):
+            from netCDF4 import Dataset
+
+            if isinstance(primary_arg, Dataset):
+                return self._get_audited_result(primary_arg)
+
         return self._get_result(primary_arg)
 
+    def _get_audited_result(self, primary_arg):
+        """
+        Runs the check against a wrapped Dataset that records data reads.
+        Reports a violation if a header-only check reads any data (when
+        auditing is enabled) and adds a summary of the data read to the
+        Result details (when I/O accounting is enabled).
+
+        :param primary_arg: netCDF4 Dataset object
+        :return: Result object (from compliance checker)
+        """
+        recorder = nc_audit.DataReadRecorder(self.__class__.__name__)
+        result = self._get_result(nc_audit.AuditedDataset(primary_arg, recorder))
+
+        if recorder.reads and self.header_only and nc_audit.is_enabled():
+            nc_audit.report_violation(self, recorder)
+
+        if nc_audit.is_accounting_enabled():
+            io = recorder.get_summary()
+            result.details = dict(getattr(result, "details", None) or {}, io=io)
+
+            if metrics.is_enabled():
+                metrics.record_io(self, io)
+
+        return result
+
     def _get_result(self, primary_arg):
         raise NotImplementedError
 
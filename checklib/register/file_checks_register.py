@@ -8,11 +8,10 @@ A register of checks at the file-level.
 
 import os, re
 
-from compliance_checker.base import Result, GenericFile
-
 from .callable_check_base import CallableCheckBase
 
 from checklib.code import file_util
+from checklib.code.result import make_result
 
 class FileCheckBase(CallableCheckBase):
     "Base class for all File Checks (that work on a file path."
@@ -21,7 +20,7 @@ class FileCheckBase(CallableCheckBase):
         """
         Return the path on disk to the dataset
         :param primary_arg: Dataset to check -- can be an instance of Dataset,
-                            GenericFile or str
+                            GenericFile, StatFile or str
         :return:            Path to file on disk
         """
         try:
@@ -30,9 +29,12 @@ class FileCheckBase(CallableCheckBase):
             return primary_arg
 
     def _check_primary_arg(self, primary_arg):
-        fpath = self._get_filepath(primary_arg)
-        if not os.path.isfile(fpath):
-            raise Exception("File not found: {}".format(fpath))
+        # Keep a StatFile (if given) so that its cached stat result is used
+        if not isinstance(primary_arg, file_util.StatFile):
+            primary_arg = self._get_filepath(primary_arg)
+
+        if not file_util._is_file(primary_arg):
+            raise Exception("File not found: {}".format(primary_arg))
 
 
 class FileSizeCheck(FileCheckBase):
@@ -45,10 +47,12 @@ class FileSizeCheck(FileCheckBase):
     level = "HIGH"
 
     def _get_result(self, primary_arg):
-        fpath = self._get_filepath(primary_arg)
+        if not isinstance(primary_arg, file_util.StatFile):
+            primary_arg = self._get_filepath(primary_arg)
+
         threshold = float(self.kwargs["threshold"])
 
-        success = file_util._is_file_size_less_than(fpath, threshold * (2.**30))
+        success = file_util._is_file_size_less_than(primary_arg, threshold * (2.**30))
         messages = []
 
         if success:
@@ -57,8 +61,8 @@ class FileSizeCheck(FileCheckBase):
             score = 0
             messages.append(self.get_messages()[score])
 
-        return Result(self.level, (score, self.out_of),
-                      self.get_short_name(), messages)
+        return make_result(self.level, (score, self.out_of),
+                           self.get_short_name(), messages)
 
 
 class FileNameStructureCheck(FileCheckBase):
@@ -73,12 +77,14 @@ class FileNameStructureCheck(FileCheckBase):
     level = "HIGH"
     _ALLOWED_CHARACTERS = '[A-Za-z0-9\-\.]'
 
+    def _setup(self):
+        "Compiles the regex used to check the file name."
+        self._regex = re.compile("{AC}+({delimiter}{AC}+)+\{extension}".format(
+                                 AC=self._ALLOWED_CHARACTERS, **self.kwargs))
+
     def _get_result(self, primary_arg):
         fpath = os.path.basename(self._get_filepath(primary_arg))
-        self.kwargs["AC"] = self._ALLOWED_CHARACTERS
-        regex = re.compile("{AC}+({delimiter}{AC}+)+\{extension}".format(**self.kwargs))
-
-        success = regex.match(fpath)
+        success = self._regex.match(fpath)
         messages = []
 
         if success:
@@ -87,8 +93,8 @@ class FileNameStructureCheck(FileCheckBase):
             score = 0
             messages.append(self.get_messages()[score])
 
-        return Result(self.level, (score, self.out_of),
-                      self.get_short_name(), messages)
+        return make_result(self.level, (score, self.out_of),
+                           self.get_short_name(), messages)
 
 
 class FileNameRegexCheck(FileCheckBase):
@@ -101,19 +107,20 @@ class FileNameRegexCheck(FileCheckBase):
 
     def _setup(self):
         """
-        Fix backslashes in regex
+        Fix backslashes in regex and compile it
         """
         self.kwargs["regex"] = self.kwargs["regex"].replace("\\\\", "\\")
+        self._regex = re.compile(self.kwargs["regex"])
 
     def _get_result(self, primary_arg):
         fpath = os.path.basename(self._get_filepath(primary_arg))
         messages = []
-        if re.match(self.kwargs["regex"], fpath):
+        if self._regex.match(fpath):
             score = self.out_of
         else:
             print("Failed to match {} against regex {}".format(fpath, self.kwargs["regex"]))
             score = 0
             messages.append(self.get_messages()[score])
-        return Result(self.level, (score, self.out_of),
-                      self.get_short_name(), messages)
+        return make_result(self.level, (score, self.out_of),
+                           self.get_short_name(), messages)
 
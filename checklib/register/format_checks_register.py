@@ -7,11 +7,14 @@ given the file path.
 
 """
 
+import importlib
+import importlib.util
+import os
 from collections import OrderedDict
 
-from compliance_checker.base import Result
-
 from .file_checks_register import FileCheckBase
+from checklib.code import file_util, nc_audit, proc_util, util
+from checklib.code.result import make_result
 
 
 class NCFileIsReadableCheck(FileCheckBase):
@@ -23,17 +26,31 @@ class NCFileIsReadableCheck(FileCheckBase):
     message_templates = ["File is not in required netCDF format: {file_format}."]
     level = "HIGH"
 
+    def _check_primary_arg(self, primary_arg):
+        from netCDF4 import Dataset
+
+        # An open Dataset shows that the file exists (without another stat)
+        if not isinstance(primary_arg, Dataset):
+            FileCheckBase._check_primary_arg(self, primary_arg)
+
     def _get_result(self, primary_arg):
         from netCDF4 import Dataset
 
-        try:
-            ds = Dataset(primary_arg)
-            assert(type(ds.variables) == dict)
-            assert(type(ds.dimensions) == dict)
-            assert(ds.file_format == self.kwargs['file_format'])
-            success = True
-        except Exception as err:
+        # The Dataset may be wrapped (when auditing or I/O accounting is enabled)
+        primary_arg = nc_audit.unwrap(primary_arg)
+
+        # Fail fast if the file header shows that the file cannot have the
+        # required format (unless an open Dataset has been given), otherwise
+        # open the file to check that it is readable
+        formats = None
+
+        if not isinstance(primary_arg, Dataset):
+            formats = file_util.sniff_netcdf_formats(self._get_filepath(primary_arg))
+
+        if formats is not None and self.kwargs['file_format'] not in formats:
             success = False
+        else:
+            success = self._is_readable(primary_arg)
 
         messages = []
 
@@ -43,8 +60,102 @@ class NCFileIsReadableCheck(FileCheckBase):
             score = 0
             messages.append(self.get_messages()[score])
 
-        return Result(self.level, (score, self.out_of),
-                      self.get_short_name(), messages)
+        return make_result(self.level, (score, self.out_of),
+                           self.get_short_name(), messages)
+
+    def _is_readable(self, primary_arg):
+        """
+        Returns True if the file can be read by netCDF4 in the required format.
+        An open Dataset (e.g. from a CheckSuite) is used as it is; otherwise
+        the file is opened here and closed again afterwards.
+
+        :param primary_arg: netCDF4 Dataset object or file path
+        :return: boolean
+        """
+        from netCDF4 import Dataset
+
+        if isinstance(primary_arg, Dataset):
+            ds, close_after = primary_arg, False
+        else:
+            ds, close_after = None, True
+
+        try:
+            if close_after:
+                ds = Dataset(self._get_filepath(primary_arg))
+
+            assert(type(ds.variables) == dict)
+            assert(type(ds.dimensions) == dict)
+            assert(ds.file_format == self.kwargs['file_format'])
+            return True
+        except Exception as err:
+            return False
+        finally:
+            if close_after and ds is not None:
+                ds.close()
+
+
+# Modules used by NCFileSoftwareCheck to read files
+_READERS = ("iris", "xarray")
+
+
+def _import_readers():
+    """
+    Imports the readers used by NCFileSoftwareCheck (in each worker process)
+    so that they are only imported once. Each reader is imported separately;
+    a missing reader is reported by its probe.
+    """
+    for name in _READERS:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def _check_readers_installed():
+    "Raises ModuleNotFoundError if any reader is not installed (without importing them)."
+    for name in _READERS:
+        if importlib.util.find_spec(name) is None:
+            raise ModuleNotFoundError("No module named '{}'".format(name), name=name)
+
+
+def _probe_iris(fpath):
+    """
+    Returns True if the file can be loaded by iris (the data is loaded lazily).
+
+    :param fpath: file path [string]
+    :return: boolean
+    """
+    import iris
+
+    try:
+        cl = iris.load(fpath)
+        assert(type(cl) in (iris.cube.Cube, iris.cube.CubeList))
+        return True
+    except Exception as err:
+        return False
+
+
+def _probe_xarray(fpath):
+    """
+    Returns True if the file can be opened by xarray (with the default
+    decoding of the variables). No data is loaded and the file is closed again.
+
+    :param fpath: file path [string]
+    :return: boolean
+    """
+    import xarray as xr
+
+    try:
+        with xr.open_dataset(fpath, cache=False) as ds:
+            assert(type(ds) in (xr.Dataset, xr.DataArray))
+        return True
+    except Exception as err:
+        return False
+
+
+def _probe_file(fpath):
+    "Runs all reader probes on `fpath` and returns a list of their outcomes."
+    return [_probe_iris(fpath), _probe_xarray(fpath)]
 
 
 class NCFileSoftwareCheck(FileCheckBase):
@@ -52,35 +163,52 @@ class NCFileSoftwareCheck(FileCheckBase):
     Data file is recognised as a valid netCDF file by multiple python packages (iris/xarray).
     """
     short_name = "File is netCDF readable by multiple packages"
-    defaults = {}
+    defaults = {"isolated": False, "timeout": 300, "memory_limit": 0, "workers": 1}
     message_templates = ["File cannot be read by iris.",
                          "File cannot be read by xarray."]
     level = "HIGH"
 
-    def _get_result(self, primary_arg):
-        import iris
-        import xarray as xr
-
-        score = 0
+    def _setup(self):
+        """
+        If `isolated` is set then the readers are run in a pool of `workers`
+        reusable subprocesses (where iris and xarray are imported once). Each
+        file must be read within `timeout` seconds and each subprocess can use
+        up to `memory_limit` Mbytes (0 means no limit). Files are read in the
+        same way in both modes.
+        """
+        self._isolated = util._parse_boolean(self.kwargs["isolated"])
+        self._timeout = float(self.kwargs["timeout"]) or None
+        self._memory_limit = int(float(self.kwargs["memory_limit"]) * 2**20) or None
+        self._workers = int(self.kwargs["workers"])
+
+    def _get_outcomes(self, fpath):
+        """
+        Returns a list of booleans: whether each reader could read the file.
+        In isolated mode, a timeout or failure of the subprocess counts as
+        a failure of all readers.
+        """
+        if not self._isolated:
+            return _probe_file(fpath)
+
+        # A missing reader is an error (as in-process) rather than a failed read
+        _check_readers_installed()
+
+        pool = proc_util.get_process_pool(size=self._workers, memory_limit=self._memory_limit,
+                                          initializer=_import_readers)
 
         try:
-            cl = iris.load(primary_arg)
-            assert(type(cl) in (iris.cube.Cube, iris.cube.CubeList))
-            score += 1
-        except Exception as err:
-            pass
+            return pool.run(_probe_file, fpath, timeout=self._timeout)
+        except (proc_util.ProcessTimeout, proc_util.ProcessFailure):
+            return [False] * self.out_of
 
-        try:
-            ds = xr.open_dataset(primary_arg)
-            assert(type(ds) in (xr.Dataset, xr.DataArray))
-            score += 1
-        except Exception as err:
-            pass
+    def _get_result(self, primary_arg):
+        fpath = os.fspath(self._get_filepath(primary_arg))
+        score = sum(self._get_outcomes(fpath))
 
         messages = []
 
         if score < self.out_of:
             messages.append(self.get_messages()[score])
 
-        return Result(self.level, (score, self.out_of),
-                      self.get_short_name(), messages)
+        return make_result(self.level, (score, self.out_of),
+                           self.get_short_name(), messages)
@@ -13,7 +13,7 @@ from compliance_checker.base import Result
 
 from .nc_file_checks_register import NCFileCheckBase
 from checklib.code import nc_util
-from checklib.cvs.ess_vocabs import ESSVocabs
+from checklib.cvs.ess_vocabs import get_ess_vocabs
 from checklib.code.errors import FileError, ParameterError
 
 
@@ -27,6 +27,7 @@ class NCCoordVarHasBoundsCheck(NCFileCheckBase):
     message_templates = ["Variable '{var_id}' not found in the file so cannot perform other checks.",
                          "A valid 'bounds' variable does not exist for variable '{var_id}'."]
     level = "HIGH"
+    header_only = True
 
     def _get_result(self, primary_arg):
         ds = primary_arg
@@ -61,7 +62,8 @@ class NCCoordVarHasValuesInVocabCheck(NCFileCheckBase):
     defined in the relevant controlled vocabulary.
     """
     short_name = "Coord Var has expected values: {var_id}"
-    defaults = {}
+    defaults = {"rtol": 1e-05, "atol": 1e-08,
+                "max_block_bytes": nc_util.DEFAULT_MAX_BLOCK_BYTES}
     required_args = ["var_id"]
     message_templates = ["Variable '{var_id}' not found in the file so cannot perform other checks.",
                          "Values for variable '{var_id}' do not match those specified in controlled vocabulary."]
@@ -82,20 +84,33 @@ class NCCoordVarHasValuesInVocabCheck(NCFileCheckBase):
 
         score += 1
 
-        vocabs = ESSVocabs(*self.vocabulary_ref.split(":")[:2])
+        vocabs = get_ess_vocabs(self.vocabulary_ref)
         expected_values = vocabs.get_value("coordinate:{}".format(var_id),
                                            "data")["value"]
 
-        actual_values = ds.variables[var_id][:]
-
         # Cast to a list if not iterable
-        if not hasattr(actual_values, "__len__"):
-            actual_values = [actual_values]
+        if not hasattr(expected_values, "__len__") or isinstance(expected_values, str):
+            expected_values = [expected_values]
 
-        if list(expected_values) == list(actual_values):
+        variable = ds.variables[var_id]
+
+        # Compare the lengths (from the header) before reading any data
+        if variable.size != len(expected_values):
+            messages = ["{} Length is {}, expected {}.".format(
+                        self.get_messages()[score], variable.size, len(expected_values))]
+            return Result(self.level, (score, self.out_of),
+                          self.get_short_name(), messages)
+
+        mismatch = nc_util.compare_variable_values(variable, expected_values,
+                                                   rtol=float(self.kwargs["rtol"]),
+                                                   atol=float(self.kwargs["atol"]),
+                                                   max_bytes=int(self.kwargs["max_block_bytes"]))
+
+        if mismatch is None:
             score += 1
         else:
-            messages = [self.get_messages()[score]]
+            messages = ["{} First difference at index {}: found {}, expected {}.".format(
+                        self.get_messages()[score], *mismatch)]
 
         return Result(self.level, (score, self.out_of),
                       self.get_short_name(), messages)
@@ -112,6 +127,7 @@ class NCCoordVarHasLengthInVocabCheck(NCFileCheckBase):
     message_templates = ["Variable '{var_id}' not found in the file so cannot perform other checks.",
                          "Length of variable '{var_id}' does not match that specified in controlled vocabulary."]
     level = "HIGH"
+    header_only = True
 
     def _get_result(self, primary_arg):
 
@@ -129,11 +145,13 @@ class NCCoordVarHasLengthInVocabCheck(NCFileCheckBase):
 
         score += 1
 
-        vocabs = ESSVocabs(*self.vocabulary_ref.split(":")[:2])
+        vocabs = get_ess_vocabs(self.vocabulary_ref)
         expected_length = vocabs.get_value("coordinate:{}".format(var_id),
                                            "data")["length"]
 
-        actual_length = len(ds.variables[var_id][:])
+        # Use the shape from the header rather than reading the data
+        shape = ds.variables[var_id].shape
+        actual_length = shape[0] if shape else 1
 
         if expected_length == actual_length:
             score += 1
@@ -12,8 +12,8 @@ from netCDF4 import Dataset
 from compliance_checker.base import Result
 
 from .callable_check_base import CallableCheckBase
-from checklib.code import nc_util, util
-from checklib.cvs.ess_vocabs import ESSVocabs
+from checklib.code import file_util, nc_audit, nc_header, nc_util, util
+from checklib.cvs.ess_vocabs import get_ess_vocabs
 from checklib.code.errors import FileError, ParameterError
 
 
@@ -21,6 +21,10 @@ class NCFileCheckBase(CallableCheckBase):
     "Base class for all NetCDF4 File Checks (that work on a file path."
 
     def _check_primary_arg(self, primary_arg):
+        # Header-only checks can also be run against a HeaderSnapshot
+        if self.header_only and isinstance(primary_arg, nc_header.HeaderSnapshot):
+            return
+
         if not isinstance(primary_arg, Dataset):
             raise FileError("Object for testing is not a netCDF4 Dataset: {}".format(str(primary_arg)))
 
@@ -36,15 +40,17 @@ class GlobalAttrRegexCheck(NCFileCheckBase):
                          "Required '{attribute}' global attribute value does not match "
                          "regex '{regex}'."]
     level = "HIGH"
+    header_only = True
 
     def _setup(self):
-        "Modifies regex to include backslashes - required to work."
+        "Modifies regex to include backslashes - required to work - and compiles it."
         self.kwargs["regex"] = self.kwargs["regex"].replace("\\\\", "\\")
+        self._regex = nc_util.compile_global_attr_regex(self.kwargs["regex"])
 
     def _get_result(self, primary_arg):
         ds = primary_arg
 
-        score = nc_util.check_global_attr_against_regex(ds, self.kwargs["attribute"], self.kwargs["regex"])
+        score = nc_util.check_global_attr_against_regex(ds, self.kwargs["attribute"], self._regex)
         messages = []
 
         if score < self.out_of:
@@ -54,6 +60,56 @@ class GlobalAttrRegexCheck(NCFileCheckBase):
                       self.get_short_name(), messages)
 
 
+class MultiGlobalAttrRegexCheck(NCFileCheckBase):
+    """
+    Each global attribute listed in 'checks' must exist and have a valid format matching
+    its regular expression. Each item in 'checks' is a dictionary of the arguments
+    required by GlobalAttrRegexCheck ('attribute' and 'regex').
+
+    The score is made up of 2 per global attribute (exists and matches regex).
+    """
+    short_name = "Global attributes: regex checks"
+    defaults = {}
+    required_args = ['checks']
+    message_templates = []
+    level = "HIGH"
+    header_only = True
+
+    def _setup(self):
+        "Modifies and compiles each regex and works out the 'out of' value."
+        self._checks = []
+
+        for check_kwargs in self.kwargs["checks"]:
+            missing_args = [arg for arg in GlobalAttrRegexCheck.required_args if arg not in check_kwargs]
+
+            if missing_args:
+                raise ParameterError("Each item in 'checks' for '{}' must contain: {}.".format(
+                                     self.__class__.__name__, str(missing_args)))
+
+            regex = check_kwargs["regex"].replace("\\\\", "\\")
+            messages = [tmpl.format(attribute=check_kwargs["attribute"], regex=regex)
+                        for tmpl in GlobalAttrRegexCheck.message_templates]
+
+            self._checks.append((check_kwargs["attribute"],
+                                 nc_util.compile_global_attr_regex(regex), messages))
+
+        self.out_of = 2 * len(self._checks)
+
+    def _get_result(self, primary_arg):
+        ds = primary_arg
+
+        regexes = [(attr, regex) for attr, regex, _ in self._checks]
+        scores = nc_util.check_global_attrs_against_regexes(ds, regexes)
+        messages = []
+
+        for (attr, regex, check_messages), score in zip(self._checks, scores):
+            if score < 2:
+                messages.append(check_messages[score])
+
+        return Result(self.level, (sum(scores), self.out_of),
+                      self.get_short_name(), messages)
+
+
 class GlobalAttrVocabCheck(NCFileCheckBase):
     """
     The global attribute '{attribute}' must exist and have a valid value from the relevant vocabulary.
@@ -64,12 +120,13 @@ class GlobalAttrVocabCheck(NCFileCheckBase):
     message_templates = ["Required '{attribute}' global attribute is not present.",
                      "Required '{attribute}' global attribute value is invalid. Check the '{vocab_lookup}' vocabularies for the correct value. Value found: "]
     level = "HIGH"
+    header_only = True
 
 
     def _get_result(self, primary_arg):
         ds = primary_arg
         attr_value = self.kwargs["attribute"]
-        vocabs = ESSVocabs(*self.vocabulary_ref.split(":")[:2])
+        vocabs = get_ess_vocabs(self.vocabulary_ref)
 
         score = vocabs.check_global_attribute(ds, attr_value, vocab_lookup=self.kwargs["vocab_lookup"])
         messages = []
@@ -92,6 +149,7 @@ class OneMainVariablePerFileCheck(NCFileCheckBase):
     defaults = {}
     message_templates = ["More than 1 main variable found in the file. Only 1 main variable should be there."]
     level = "HIGH"
+    header_only = True
 
     def _get_result(self, primary_arg):
         ds = primary_arg
@@ -122,6 +180,7 @@ class MainVariableAttributeCheck(NCFileCheckBase):
                          "variable."
                          ]
     level = "HIGH"
+    header_only = True
 
 
     def _get_result(self, primary_arg):
@@ -131,14 +190,14 @@ class MainVariableAttributeCheck(NCFileCheckBase):
         messages = []
 
         # Check main variable is identifiable first
-        try:
-            variable = nc_util.get_main_variable(ds)
-            score += 1
-        except:
+        if not nc_util.is_there_only_one_main_variable(ds):
             messages = [self.get_messages()[score]]
             return Result(self.level, (score, self.out_of),
                           self.get_short_name(), messages)
 
+        variable = nc_util.get_main_variable(ds)
+        score += 1
+
         # Now check attribute
         attr_name = self.kwargs["attr_name"]
 
@@ -180,6 +239,8 @@ class ValidGlobalAttrsMatchFileNameCheck(NCFileCheckBase):
     message_templates = ["File name does not match global attributes.",
                          "Each global attribute is checked separately."]
     level = "HIGH"
+    header_only = True
+    uses_file_name = True
 
     def _setup(self):
         """
@@ -224,7 +285,7 @@ class ValidGlobalAttrsMatchFileNameCheck(NCFileCheckBase):
         score = 0
         messages = []
 
-        vocabs = ESSVocabs(*self.vocabulary_ref.split(":")[:2])
+        vocabs = get_ess_vocabs(self.vocabulary_ref)
         fname = os.path.basename(ds.filepath())
 
         fn_score, msg = vocabs.check_file_name(fname, keys=self.kwargs["order"],
@@ -262,6 +323,7 @@ class VariableExistsInFileCheck(NCFileCheckBase):
     defaults = {}
     message_templates = ["Required variable {var_id} is not present."]
     level = "HIGH"
+    header_only = True
 
 
     def _get_result(self, primary_arg):
@@ -286,32 +348,56 @@ class VariableRangeCheck(NCFileCheckBase):
     to {maximum}.
     """
     short_name = "Variable range {var_id}: {minimum} to {maximum}"
-    defaults = {}
+    defaults = {"max_block_bytes": nc_util.DEFAULT_MAX_BLOCK_BYTES, "use_metadata": False}
     message_templates = ["Variable {var_id} does not exist.",
                          "Variable {var_id} has values outside the permitted range: "
                          "{minimum} to {maximum}"]
     level = "HIGH"
 
+    def _setup(self):
+        """
+        If `use_metadata` is set then the `actual_range`, `valid_min`, `valid_max`
+        and `valid_range` attributes are trusted: the data is only read if they
+        do not settle whether the values are within the range.
+        """
+        self._use_metadata = util._parse_boolean(self.kwargs["use_metadata"])
 
     def _get_result(self, primary_arg):
         ds = primary_arg
         var_id = self.kwargs["var_id"]
         mn, mx = self.kwargs["minimum"], self.kwargs["maximum"]
 
+        # Record whether the result came from the metadata or the data
+        details = {"range_check_path": None}
+
         score = 0
         if nc_util.is_variable_in_dataset(ds, var_id):
             score = 1
 
-        if nc_util.variable_is_within_valid_bounds(ds, var_id, mn, mx):
-            score += 1
+            within, range_attrs = None, []
+            if self._use_metadata:
+                within, range_attrs = nc_util.check_variable_bounds_from_attrs(ds, var_id, mn, mx)
+
+            if within is not None:
+                details.update({"range_check_path": "metadata", "range_attrs": range_attrs})
+                if within:
+                    score += 1
+            else:
+                details["range_check_path"] = "data"
+
+                if nc_util.variable_is_within_valid_bounds(ds, var_id, mn, mx,
+                                                           int(self.kwargs["max_block_bytes"])):
+                    score += 1
 
         messages = []
 
         if score < self.out_of:
             messages.append(self.get_messages()[score])
 
-        return Result(self.level, (score, self.out_of),
-                      self.get_short_name(), messages)
+        result = Result(self.level, (score, self.out_of),
+                        self.get_short_name(), messages)
+        result.details = details
+        return result
 
 
 class _VariableTypeCheckBase(NCFileCheckBase):
@@ -320,6 +406,7 @@ class _VariableTypeCheckBase(NCFileCheckBase):
     """
     defaults = {}
     level = "HIGH"
+    header_only = True
 
 
     def _package_result(self, success):
@@ -370,6 +457,7 @@ class _NCVariableMetadataCheckBase(NCFileCheckBase):
     Base class for checking metadata (attributes) of netCDF4 Variables by
     looking up expected values in controlled vocabulary specified.
     """
+    header_only = True
 
     def _get_var_id(self, ds):
         raise NotImplementedError
@@ -387,11 +475,11 @@ class _NCVariableMetadataCheckBase(NCFileCheckBase):
                           self.get_short_name(), messages)
 
         # Work out the overall 'out of' value based on number of attributes
-        vocabs = ESSVocabs(*self.vocabulary_ref.split(":")[:2])
+        vocabs = get_ess_vocabs(self.vocabulary_ref)
         lookup = ":".join([self.kwargs["pyessv_namespace"], var_id])
         expected_attr_dict = vocabs.get_value(lookup, "data")
 
-        self.out_of = 1 + len(expected_attr_dict) * 2
+        out_of = 1 + len(expected_attr_dict) * 2
 
         score += 1
         variable = ds.variables[var_id]
@@ -404,13 +492,13 @@ class _NCVariableMetadataCheckBase(NCFileCheckBase):
             ignores = self.kwargs["ignores"]
 
             if ignores and attr in ignores:
-                self.out_of -= 2
+                out_of -= 2
                 continue
 
             KNOWN_IGNORE_VALUES = ("<derived from file>",)
 
             if expected_value in KNOWN_IGNORE_VALUES:
-                self.out_of -= 2
+                out_of -= 2
                 continue
 
             if attr not in variable.ncattrs():
@@ -428,7 +516,7 @@ class _NCVariableMetadataCheckBase(NCFileCheckBase):
                                                                                         getattr(variable, attr), var_id,
                                                                                         expected_value))
 
-        return Result(self.level, (score, self.out_of),
+        return Result(self.level, (score, out_of),
                       self.get_short_name(), messages)
 
 
@@ -476,12 +564,7 @@ class NCMainVariableMetadataCheck(_NCVariableMetadataCheckBase):
         :param ds: netCDF4 Dataset object
         :return: var_id [String] or None
         """
-        try:
-            variable = nc_util.get_main_variable(ds)
-        except:
-            return None
-
-        return variable.name
+        return nc_util.get_main_variable_analysis(ds).main_var_id
 
 
 class NetCDFFormatCheck(NCFileCheckBase):
@@ -494,11 +577,27 @@ class NetCDFFormatCheck(NCFileCheckBase):
     message_templates = ["The NetCDF sub-format must be: {format}."]
 
     level = "HIGH"
+    header_only = True
 
+    def _check_primary_arg(self, primary_arg):
+        # A file path (or StatFile) can be given instead of a Dataset
+        if isinstance(primary_arg, (Dataset, nc_header.HeaderSnapshot)):
+            return
+
+        if not isinstance(primary_arg, (str, file_util.StatFile)) or \
+                not file_util._is_file(primary_arg):
+            raise FileError("Object for testing is not a netCDF4 Dataset or "
+                            "file path: {}".format(str(primary_arg)))
 
     def _get_result(self, primary_arg):
-        ds = primary_arg
-        file_format = getattr(ds, "file_format", None)
+        # The Dataset may be wrapped (when auditing or I/O accounting is enabled)
+        primary_arg = nc_audit.unwrap(primary_arg)
+
+        if isinstance(primary_arg, (Dataset, nc_header.HeaderSnapshot)):
+            file_format = getattr(primary_arg, "file_format", None)
+        else:
+            # Read the format from the file header (if possible)
+            file_format = nc_util.get_file_format(primary_arg)
 
         score = 0
         if file_format == self.kwargs["format"]:
@@ -527,6 +626,7 @@ class NetCDFDimensionCheck(NCFileCheckBase):
                          "Coordinate variable for dimension '{dim_id}' does not have expected properties."]
 
     level = "HIGH"
+    header_only = True
 
 
     def _get_result(self, primary_arg):
@@ -539,19 +639,19 @@ class NetCDFDimensionCheck(NCFileCheckBase):
 
         if dim_id in ds.dimensions:
             score += 1
-            self.out_of = 1
+            out_of = 1
         else:
             messages = [self.get_messages()[score],
                         "Cannot look up coordinate variable because dimension does not exist.",
                         "Cannot assess coordinate variable properties because dimension does not exist."]
-            self.out_of = len(messages)
+            out_of = len(messages)
 
             # Now return because all other checks are irrelevant
-            return Result(self.level, (score, self.out_of), self.get_short_name(), messages)
+            return Result(self.level, (score, out_of), self.get_short_name(), messages)
 
         # Now test coordinate variable using look-up in vocabularies
         # First, work out the overall 'out of' value based on number of attributes
-        vocabs = ESSVocabs(*self.vocabulary_ref.split(":")[:2])
+        vocabs = get_ess_vocabs(self.vocabulary_ref)
         lookup = ":".join([self.kwargs["pyessv_namespace"], dim_id])
         expected_attr_dict = vocabs.get_value(lookup, "data")
 
@@ -567,7 +667,7 @@ class NetCDFDimensionCheck(NCFileCheckBase):
             else:
                 messages.append("Dimension '{}' does not have required length: {}.".format(dim_id, req_length))
 
-            self.out_of += 1
+            out_of += 1
 
         # Ignore coordinate variable check if instructed to
         if ignore_coord_var_check:
@@ -575,7 +675,7 @@ class NetCDFDimensionCheck(NCFileCheckBase):
         # Check coordinate variable exists for dimension
         elif dim_id in ds.variables:
             score += 1
-            self.out_of += 1
+            out_of += 1
 
             variable = ds.variables[dim_id]
 
@@ -584,14 +684,14 @@ class NetCDFDimensionCheck(NCFileCheckBase):
                 # Length has already been checked - so ignore here
                 if attr == "length": continue
 
-                self.out_of += 1
+                out_of += 1
 
                 if attr not in variable.ncattrs():
                     messages.append("Required variable attribute '{}' is not present for "
                                     "coorinate variable: '{}'.".format(attr, dim_id))
                 else:
                     score += 1
-                    self.out_of += 1
+                    out_of += 1
 
                     # Check the value of attribute
                     check = nc_util.check_nc_attribute(variable, attr, expected_value)
@@ -604,6 +704,6 @@ class NetCDFDimensionCheck(NCFileCheckBase):
         # If coordinate variable not found
         else:
             messages.append("Coordinate variable for dimension not found: {}.".format(dim_id))
-            self.out_of += 1
+            out_of += 1
 
-        return Result(self.level, (score, self.out_of), self.get_short_name(), messages)
+        return Result(self.level, (score, out_of), self.get_short_name(), messages)
@@ -14,7 +14,7 @@ from compliance_checker.base import Result
 
 from .nc_file_checks_register import NCFileCheckBase
 from checklib.code import nc_util
-from checklib.cvs.ess_vocabs import ESSVocabs
+from checklib.cvs.ess_vocabs import get_ess_vocabs
 from checklib.code.errors import FileError, ParameterError
 
 
@@ -40,24 +40,32 @@ class NCArrayMatchesVocabTermsCheck(NCFileCheckBase):
     def _get_result(self, primary_arg):
         ds = primary_arg
         score = 0
-        self.out_of = 1
+        out_of = 1
         messages = []
 
-        vocabs = ESSVocabs(*self.vocabulary_ref.split(":")[:2])
+        vocabs = get_ess_vocabs(self.vocabulary_ref)
 
         var_id = self.kwargs["var_id"]
         if var_id in ds.variables:
             array = self._clean_array(ds[var_id][:])
-            result = vocabs.check_array_matches_terms(array, self.kwargs["pyessv_namespace"])
 
-            if result:
+            try:
+                mismatch = vocabs.get_array_mismatch(array, self.kwargs["pyessv_namespace"])
+            except Exception:
+                mismatch = False
+
+            if mismatch is None:
                 score += 1
+            elif mismatch:
+                i, found, expected = mismatch
+                messages.append("{} (first mismatch at index {}: found '{}', expected '{}')".format(
+                                self.get_messages()[score], i, found, expected))
             else:
                 messages.append(self.get_messages()[score])
 
         else:
             messages.append("Variable '{}' not found in the file so cannot perform other checks.".format(var_id))
 
-        return Result(self.level, (score, self.out_of),
+        return Result(self.level, (score, out_of),
                       self.get_short_name(), messages)
 
@@ -0,0 +1,369 @@
+"""
+suite.py
+========
+
+Runners for applying a list of configured checks to files.
+
+`CheckSuite` runs the checks against a single file. The file is stat-ed once
+and (if any of the checks need it) opened once as a netCDF4 Dataset. Each
+check is given the primary argument that it expects and the Dataset is closed
+when all checks have run.
+
+`ParallelCheckSuite` runs a `CheckSuite` over many files in a pool of worker
+processes.
+
+"""
+
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from netCDF4 import Dataset
+
+from compliance_checker.base import Result
+
+from checklib.code import file_util, metrics, nc_audit
+from checklib.code.errors import ParameterError
+from checklib.cvs.ess_vocabs import get_ess_vocabs
+from checklib.register.nc_file_checks_register import NCFileCheckBase
+from checklib.register.format_checks_register import NCFileIsReadableCheck
+
+
+# ProcessPoolExecutor can only replace its workers from Python 3.11
+_HAS_MAX_TASKS_PER_CHILD = sys.version_info >= (3, 11)
+
+# Outcome of running one check: the check instance, its Result, the time
+# taken to run it (in seconds) and whether the Result came from a cache
+CheckRun = namedtuple("CheckRun", ["check", "result", "duration", "cached"], defaults=(False,))
+
+# Outcome of running a suite of checks against one file: the file path and
+# a list of CheckRun named tuples
+FileRun = namedtuple("FileRun", ["fpath", "check_runs"])
+
+# Checks that can be given an open Dataset as the primary argument
+_DATASET_CHECKS = (NCFileCheckBase, NCFileIsReadableCheck)
+
+
+class CheckSuite(object):
+    """
+    Runs a list of configured checks against a file.
+
+    Usage:
+        suite = CheckSuite([FileSizeCheck(kwargs={}), OneMainVariablePerFileCheck(kwargs={})])
+        for check_run in suite.run("/path/to/file.nc"):
+            print(check_run.check.get_short_name(), check_run.result.value, check_run.duration)
+    """
+
+    def __init__(self, checks, cache=None, header_memo=None):
+        """
+        :param checks: list of check instances
+        :param cache: ResultCache instance used to look up and store results
+                      (optional)
+        :param header_memo: HeaderResultMemo instance used to share results of
+                            header-only checks between files with identical
+                            headers (optional)
+        """
+        self.checks = list(checks)
+        self.cache = cache
+        self.header_memo = header_memo
+
+    def run(self, fpath):
+        """
+        Runs all checks against the file at `fpath`. If a cache is set then
+        cached results are used and the file is only opened if a check that
+        needs the Dataset has no cached result.
+
+        :param fpath: file path [string] or StatFile object
+        :return: list of CheckRun named tuples (in the order of the checks)
+        """
+        if not isinstance(fpath, file_util.StatFile):
+            fpath = file_util.StatFile(fpath)
+
+        check_runs = [None] * len(self.checks)
+        file_key = None
+
+        if self.cache is not None and fpath.is_file():
+            file_key = self.cache.get_file_key(fpath)
+            check_runs = [self._get_cached_run(check, fpath, file_key) for check in self.checks]
+
+        to_run = [i for i, check_run in enumerate(check_runs) if check_run is None]
+
+        ds = None
+        open_error = None
+
+        if any(isinstance(self.checks[i], _DATASET_CHECKS) for i in to_run) and fpath.is_file():
+            try:
+                ds = Dataset(fpath.filepath())
+            except Exception as err:
+                open_error = err
+
+        try:
+            for i in to_run:
+                check_runs[i], success = self._run_check(self.checks[i], fpath, ds, open_error)
+
+                # Only store results of checks that ran without errors
+                if file_key is not None and success:
+                    self.cache.put(fpath, self.checks[i], check_runs[i].result, file_key=file_key)
+        finally:
+            if ds is not None:
+                ds.close()
+
+        return check_runs
+
+    def _get_cached_run(self, check, fpath, file_key):
+        "Returns a CheckRun using the cached result of `check` (or None if not cached)."
+        start = time.perf_counter()
+        result = self.cache.get(fpath, check, file_key=file_key)
+
+        if result is None:
+            return None
+
+        return CheckRun(check, result, time.perf_counter() - start, True)
+
+    def _run_check(self, check, fpath, ds, open_error):
+        """
+        Runs a single check, with the appropriate primary argument, and times it.
+        Any exception raised by the check is reported as a failed Result.
+
+        :param check: check instance
+        :param fpath: StatFile object
+        :param ds: netCDF4 Dataset object (or None if not opened)
+        :param open_error: exception raised when opening the Dataset (or None)
+        :return: tuple of (CheckRun named tuple, boolean: True if the check ran
+                 without errors)
+        """
+        start = time.perf_counter()
+        success = False
+
+        use_memo = (self.header_memo is not None and ds is not None and
+                    isinstance(check, NCFileCheckBase) and self.header_memo.is_memoizable(check))
+
+        if use_memo:
+            result = self.header_memo.get(ds, check)
+
+            if result is not None:
+                return CheckRun(check, result, time.perf_counter() - start, True), True
+
+        if isinstance(check, NCFileCheckBase) and ds is None:
+            reason = open_error or "File not found: {}".format(fpath)
+            result = self._get_error_result(check, "File could not be opened as "
+                                                   "a netCDF4 Dataset: {}".format(reason))
+        else:
+            primary_arg = ds if (ds is not None and isinstance(check, _DATASET_CHECKS)) else fpath
+
+            try:
+                result = check(primary_arg)
+                success = True
+            except Exception as err:
+                result = self._get_error_result(check, "Check failed with error: {}".format(err))
+
+            if use_memo and success:
+                self.header_memo.put(ds, check, result)
+
+        return CheckRun(check, result, time.perf_counter() - start), success
+
+    def _get_error_result(self, check, message):
+        return Result(check.level, (0, check.out_of), check.get_short_name(), [message])
+
+
+# The CheckSuite used by each worker process (set by `_init_worker`)
+_WORKER = {"suite": None}
+
+
+def _init_worker(checks, vocabulary_refs, cache, header_memo, record_metrics=False,
+                 account_io=False):
+    """
+    Initialises a worker process. Vocabularies preloaded in the parent process
+    are inherited (when forked) so loading them here is then a no-op.
+
+    :param checks: list of check instances
+    :param vocabulary_refs: list of vocabulary references to preload
+    :param cache: ResultCache instance (or None)
+    :param header_memo: HeaderResultMemo instance (or None) - each worker has its own copy
+    :param record_metrics: if True, record metrics of check calls [boolean]
+    :param account_io: if True, account for the data read by each check [boolean]
+    """
+    # Metrics inherited from the parent process (when forked) are not counted again
+    metrics.reset()
+
+    if record_metrics:
+        metrics.enable()
+    else:
+        metrics.disable()
+
+    if account_io:
+        nc_audit.enable_accounting()
+    else:
+        nc_audit.disable_accounting()
+
+    for vocabulary_ref in vocabulary_refs:
+        get_ess_vocabs(vocabulary_ref).preload()
+
+    _WORKER["suite"] = CheckSuite(checks, cache=cache, header_memo=header_memo)
+
+
+def _run_chunk(fpaths):
+    """
+    Runs the worker's CheckSuite against each file in `fpaths`. Only the
+    results and durations are returned, to avoid sending the checks back to
+    the parent process. The metrics recorded by the worker (if enabled) are
+    also returned, to be merged into those of the parent process.
+
+    :param fpaths: list of file paths
+    :return: tuple of: (list (per file) of lists of (Result, duration, cached)
+             tuples, metrics snapshot or None)
+    """
+    suite = _WORKER["suite"]
+    outcomes = [[check_run[1:] for check_run in suite.run(fpath)] for fpath in fpaths]
+    return outcomes, (metrics.collect() if metrics.is_enabled() else None)
+
+
+def _iter_chunks(items, chunksize):
+    "Yields lists of up to `chunksize` items from iterable `items`."
+    items = iter(items)
+
+    while True:
+        chunk = list(itertools.islice(items, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ParallelCheckSuite(object):
+    """
+    Runs a list of configured checks against many files using a pool of
+    worker processes (`concurrent.futures.ProcessPoolExecutor`).
+
+    Files are sent to the workers in chunks of `chunksize` and only a limited
+    number of chunks are in flight at once, so `fpaths` can be a (lazy)
+    iterable of any length.
+
+    Usage:
+        suite = ParallelCheckSuite(checks, workers=8, chunksize=16)
+        for file_run in suite.run(fpaths):
+            print(file_run.fpath, [check_run.result.value for check_run in file_run.check_runs])
+    """
+
+    def __init__(self, checks, workers=None, chunksize=1, max_tasks_per_child=None,
+                 preload_vocabs=True, mp_context=None, cache=None, header_memo=None):
+        """
+        :param checks: list of check instances
+        :param workers: number of worker processes (default: number of CPUs) [integer]
+        :param chunksize: number of files sent to a worker at a time [integer]
+        :param max_tasks_per_child: number of chunks after which a worker is
+                                    replaced (default: never). Requires
+                                    Python 3.11 or later [integer]
+        :param preload_vocabs: if True, preload the vocabularies used by the
+                               checks before starting the workers; or a list
+                               of vocabulary references to preload [boolean or list]
+        :param mp_context: multiprocessing context. Note that `max_tasks_per_child`
+                           cannot be used with "fork" so the "spawn" context is
+                           used for it by default (and each worker then loads
+                           the vocabularies itself).
+        :param cache: ResultCache instance used by every worker (optional)
+        :param header_memo: HeaderResultMemo instance, copied to each worker (optional)
+        """
+        if max_tasks_per_child and not _HAS_MAX_TASKS_PER_CHILD:
+            raise ParameterError("'max_tasks_per_child' requires Python 3.11 or later "
+                                 "(running: {}.{}).".format(*sys.version_info[:2]))
+
+        self.checks = list(checks)
+        self.cache = cache
+        self.header_memo = header_memo
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = max(1, int(chunksize))
+        self.max_tasks_per_child = max_tasks_per_child
+        self.preload_vocabs = preload_vocabs
+
+        if mp_context is None and max_tasks_per_child:
+            mp_context = multiprocessing.get_context("spawn")
+
+        self.mp_context = mp_context
+
+    def _get_vocabulary_refs(self):
+        if self.preload_vocabs is True:
+            refs = [check.vocabulary_ref for check in self.checks]
+        else:
+            refs = list(self.preload_vocabs or [])
+
+        # Unique, non-empty references - keeping their order
+        return list(OrderedDict.fromkeys(ref for ref in refs if ref))
+
+    def _get_executor(self, vocabulary_refs):
+        kwargs = {"max_workers": self.workers, "mp_context": self.mp_context,
+                  "initializer": _init_worker,
+                  "initargs": (self.checks, vocabulary_refs, self.cache, self.header_memo,
+                               metrics.is_enabled(), nc_audit.is_accounting_enabled())}
+
+        if self.max_tasks_per_child:
+            kwargs["max_tasks_per_child"] = self.max_tasks_per_child
+
+        return ProcessPoolExecutor(**kwargs)
+
+    def _get_file_runs(self, chunk, future):
+        outcomes, worker_metrics = future.result()
+
+        if worker_metrics is not None:
+            metrics.merge(worker_metrics)
+
+        for fpath, results in zip(chunk, outcomes):
+            yield FileRun(fpath, [CheckRun(check, *outcome)
+                                  for check, outcome in zip(self.checks, results)])
+
+    def _get_completed_file_runs(self, in_flight):
+        "Waits for at least one future in `in_flight` to complete and yields its results."
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            yield from self._get_file_runs(in_flight.pop(future), future)
+
+    def run(self, fpaths, ordered=True):
+        """
+        Runs all checks against each file in `fpaths`, yielding the results
+        as they become available.
+
+        :param fpaths: iterable of file paths
+        :param ordered: if True, yield results in the order of `fpaths`,
+                        otherwise yield them as they are completed [boolean]
+        :return: generator of FileRun named tuples
+        """
+        vocabulary_refs = self._get_vocabulary_refs()
+
+        # Load vocabularies before the workers are forked so that they are shared
+        for vocabulary_ref in vocabulary_refs:
+            get_ess_vocabs(vocabulary_ref).preload()
+
+        executor = self._get_executor(vocabulary_refs)
+        max_in_flight = 2 * self.workers
+        chunks = _iter_chunks((os.fspath(fpath) for fpath in fpaths), self.chunksize)
+
+        try:
+            if ordered:
+                in_flight = deque()
+
+                for chunk in chunks:
+                    in_flight.append((chunk, executor.submit(_run_chunk, chunk)))
+
+                    if len(in_flight) >= max_in_flight:
+                        yield from self._get_file_runs(*in_flight.popleft())
+
+                while in_flight:
+                    yield from self._get_file_runs(*in_flight.popleft())
+
+            else:
+                in_flight = {}
+
+                for chunk in chunks:
+                    in_flight[executor.submit(_run_chunk, chunk)] = chunk
+
+                    if len(in_flight) >= max_in_flight:
+                        yield from self._get_completed_file_runs(in_flight)
+
+                while in_flight:
+                    yield from self._get_completed_file_runs(in_flight)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,81 @@
+"""
+test_benchmarks.py
+==================
+
+Unit tests for the benchmarks package (using its smallest scale).
+
+"""
+
+import json
+import subprocess
+import sys
+
+from netCDF4 import Dataset
+
+from benchmarks import generators, runner
+from checklib.checks import ALL_CHECKS
+
+
+def test_make_netcdf_file(tmp_path):
+    fpath = generators.make_netcdf_file(str(tmp_path / "a.nc"), n_times=5, n_x=40, n_stations=4,
+                                        n_variables=3, chunking=(2, 10), compression=4)
+
+    with Dataset(fpath) as ds:
+        assert(ds.data_model == "NETCDF4_CLASSIC")
+        assert(ds.variables["var0"].shape == (5, 40))
+        assert(ds.variables["var0"].chunking() == [2, 10])
+        assert(ds.variables["var0"].filters()["complevel"] == 4)
+        assert(sorted(var_id for var_id in ds.variables if var_id.startswith("var")) ==
+               ["var0", "var1", "var2"])
+
+    fpath = generators.make_netcdf_file(str(tmp_path / "b.nc"))
+
+    with Dataset(fpath) as ds:
+        assert(ds.variables["var0"].chunking() == "contiguous")
+
+
+def test_check_configs_are_complete():
+    assert(sorted(runner.get_check_configs("bench:synthetic")) == ALL_CHECKS)
+
+
+def _get_timings(**seconds):
+    return {"meta": {}, "benchmarks": dict((name, {"seconds": value, "number": 1, "repeat": 1})
+                                           for name, value in seconds.items())}
+
+
+def test_compare():
+    baseline = _get_timings(a=1.0, b=1.0, c=1e-8, d=1.0)
+    current = _get_timings(a=1.1, b=2.0, c=1e-7, e=1.0)
+
+    rows, slower = runner.compare(baseline, current, tolerance=0.25)
+
+    assert([row[0] for row in rows] == ["a", "b", "c"])
+    assert(slower == ["b"])
+
+
+def test_run_and_compare(tmp_path):
+    output = str(tmp_path / "timings.json")
+    cmd = [sys.executable, "-m", "benchmarks"]
+
+    # NCFileSoftwareCheck is left out as it is slow to run
+    subprocess.check_call(cmd + ["run", "--scale", "tiny", "--repeat", "1", "--min-time", "0",
+                                 "--filter", "^tiny/(check/(?!NCFileSoftware)|vocab/|file_name/)",
+                                 "--output", output], stdout=subprocess.DEVNULL)
+
+    with open(output) as reader:
+        timings = json.load(reader)
+
+    names = timings["benchmarks"]
+    assert("tiny/check/VariableRangeCheck/chunked-zlib" in names)
+    assert("tiny/vocab/get_value/cold" in names)
+    assert("tiny/file_name/check_file_names" in names)
+
+    # Make the baseline much faster, so that the timings fail the comparison
+    for timing in timings["benchmarks"].values():
+        timing["seconds"] /= 100.
+
+    baseline = str(tmp_path / "baseline.json")
+    runner.save_timings(timings, baseline)
+
+    assert(subprocess.call(cmd + ["compare", output, output], stdout=subprocess.DEVNULL) == 0)
+    assert(subprocess.call(cmd + ["compare", baseline, output], stdout=subprocess.DEVNULL) == 1)
@@ -0,0 +1,174 @@
+"""
+test_cache.py
+=============
+
+Unit tests for the contents of the checklib.cache module.
+
+"""
+
+import os
+import shutil
+import time
+from unittest import mock
+
+from netCDF4 import Dataset
+from compliance_checker.base import Result
+
+from tests._common import EG_DATA_DIR
+from checklib.cache import ResultCache, HeaderResultMemo
+from checklib.code import nc_util
+from checklib.suite import CheckSuite, ParallelCheckSuite
+from checklib.register.file_checks_register import FileSizeCheck
+from checklib.register.nc_file_checks_register import (NCFileCheckBase, VariableRangeCheck,
+                                                       VariableExistsInFileCheck,
+                                                       OneMainVariablePerFileCheck)
+
+
+AMF_FILE = f'{EG_DATA_DIR}/nc_file_checks_data/amf_eg_data_1.nc'
+
+
+def _get_checks():
+    return [FileSizeCheck(kwargs={}),
+            OneMainVariablePerFileCheck(kwargs={}),
+            VariableRangeCheck(kwargs={"var_id": "hour", "minimum": 0, "maximum": 10})]
+
+
+def test_get_config_hash():
+    check = VariableRangeCheck(kwargs={"var_id": "hour", "minimum": 0, "maximum": 10})
+
+    assert(check.get_config_hash() == _get_checks()[2].get_config_hash())
+    assert(check.get_config_hash() != VariableRangeCheck(
+           kwargs={"var_id": "hour", "minimum": 0, "maximum": 23}).get_config_hash())
+    assert(check.get_config_hash() != VariableRangeCheck(
+           kwargs={"var_id": "hour", "minimum": 0, "maximum": 10}, level="LOW").get_config_hash())
+
+
+def test_ResultCache_misses_after_upgrade(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    check = FileSizeCheck(kwargs={})
+    cache.put(AMF_FILE, check, check(AMF_FILE))
+    assert(cache.get(AMF_FILE, check) is not None)
+
+    # A new release of checklib
+    with mock.patch("checklib.__version__", "999.0.0"):
+        assert(cache.get(AMF_FILE, check) is None)
+
+    # A new version of the check
+    with mock.patch.object(FileSizeCheck, "version", 2):
+        assert(cache.get(AMF_FILE, check) is None)
+
+    assert(cache.get(AMF_FILE, check) is not None)
+    cache.close()
+
+
+def test_ResultCache_round_trip(tmp_path):
+    fpath = str(tmp_path / "data.nc")
+    shutil.copy(AMF_FILE, fpath)
+
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    check = _get_checks()[2]
+    result = check(Dataset(fpath))
+
+    assert(cache.get(fpath, check) is None)
+    cache.put(fpath, check, result)
+
+    cached = cache.get(fpath, check)
+    assert(cached.value == result.value)
+    assert(cached.msgs == result.msgs)
+    assert(cached.details == result.details)
+    assert(cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    # A changed file is not matched and replaces the old result when stored
+    os.utime(fpath, ns=(0, 0))
+    assert(cache.get(fpath, check) is None)
+
+    cache.put(fpath, check, result)
+    assert(len(cache) == 1)
+    cache.close()
+
+
+def test_CheckSuite_with_cache(tmp_path):
+    fpath = str(tmp_path / "data.nc")
+    shutil.copy(AMF_FILE, fpath)
+
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    first = CheckSuite(_get_checks(), cache=cache).run(fpath)
+
+    with mock.patch("checklib.suite.Dataset") as open_ds:
+        second = CheckSuite(_get_checks(), cache=cache).run(fpath)
+
+    assert(open_ds.call_count == 0)
+    assert([run.cached for run in first] == [False] * 3)
+    assert([run.cached for run in second] == [True] * 3)
+    assert([run.result.value for run in first] == [run.result.value for run in second])
+    assert(cache.stats()["hit_rate"] == 0.5)
+
+
+def test_ParallelCheckSuite_with_cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    suite = ParallelCheckSuite(_get_checks(), workers=2, cache=cache)
+
+    first = list(suite.run([AMF_FILE]))
+    second = list(suite.run([AMF_FILE]))
+
+    assert([run.cached for run in first[0].check_runs] == [False] * 3)
+    assert([run.cached for run in second[0].check_runs] == [True] * 3)
+
+
+def test_ResultCache_evict(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"))
+    result = FileSizeCheck(kwargs={})(AMF_FILE)
+
+    for check in _get_checks():
+        cache.put(AMF_FILE, check, result)
+
+    assert(len(cache) == 3)
+    assert(cache.evict(max_entries=2) == 1)
+    assert(cache.evict(max_age=3600) == 0)
+
+    with mock.patch("time.time", return_value=time.time() + 7200):
+        assert(cache.evict(max_age=3600) == 2)
+
+    assert(len(cache) == 0)
+
+
+class _FileNameInResultCheck(NCFileCheckBase):
+    "Test check that reports the file name."
+    short_name = "File name"
+    header_only = True
+    uses_file_name = True
+
+    def _get_result(self, primary_arg):
+        return Result(self.level, (1, 1), self.get_short_name(), [os.path.basename(primary_arg.filepath())])
+
+
+def test_HeaderResultMemo_with_CheckSuite(tmp_path):
+    fpaths = [str(tmp_path / "a.nc"), str(tmp_path / "b.nc")]
+    for fpath in fpaths:
+        shutil.copy(AMF_FILE, fpath)
+
+    memo = HeaderResultMemo()
+    checks = [VariableExistsInFileCheck(kwargs={"var_id": "hour"}), _FileNameInResultCheck(kwargs={}),
+              VariableRangeCheck(kwargs={"var_id": "hour", "minimum": 0, "maximum": 10})]
+    suite = CheckSuite(checks, header_memo=memo)
+
+    first, second = [suite.run(fpath) for fpath in fpaths]
+
+    assert([run.cached for run in first] == [False, False, False])
+    assert([run.cached for run in second] == [True, False, False])
+    assert([run.result.msgs for run in second[:2]] == [[], ["b.nc"]])
+    assert(memo.stats()["hits"] == 1)
+    assert(len(memo) == 3)
+
+
+def test_get_header_fingerprint(tmp_path):
+    fpath = str(tmp_path / "a.nc")
+    shutil.copy(AMF_FILE, fpath)
+
+    fingerprint = nc_util.get_header_fingerprint(Dataset(AMF_FILE))
+    assert(nc_util.get_header_fingerprint(Dataset(fpath)) == fingerprint)
+
+    with Dataset(fpath, "a") as ds:
+        ds.setncattr("title", "changed")
+
+    assert(nc_util.get_header_fingerprint(Dataset(fpath)) != fingerprint)
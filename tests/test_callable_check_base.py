@@ -6,6 +6,202 @@ Unit tests for the contents of the checklib.register.callable_check_base module.
 
 """
 
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from netCDF4 import Dataset
+from compliance_checker.base import Result
+
+from benchmarks import generators
 from checklib.register.callable_check_base import *
+from tests._common import EG_DATA_DIR
+from checklib.code import nc_audit, nc_util
+from checklib.code.nc_header import HeaderSnapshot
+from checklib.register.file_checks_register import FileNameRegexCheck, FileNameStructureCheck
+from checklib.register.nc_file_checks_register import (NCFileCheckBase, VariableExistsInFileCheck,
+                                                       GlobalAttrRegexCheck, OneMainVariablePerFileCheck,
+                                                       VariableRangeCheck, NetCDFDimensionCheck,
+                                                       NCVariableMetadataCheck, NCMainVariableMetadataCheck)
+
+
+class _DataReadingHeaderCheck(NCFileCheckBase):
+    """
+    Test check that claims to be header-only but reads data.
+    """
+    short_name = "Reads data: {var_id}"
+    message_templates = []
+    header_only = True
+
+    def _get_result(self, primary_arg):
+        primary_arg.variables[self.kwargs["var_id"]][:]
+        return Result(self.level, (0, 0), self.get_short_name(), [])
+
+
+@pytest.fixture
+def header_audit():
+    nc_audit.clear_violations()
+    nc_audit.enable()
+    yield
+    nc_audit.disable()
+    nc_audit.clear_violations()
+
+
+def test_header_audit_flags_data_read(header_audit):
+    ds = Dataset(f'{EG_DATA_DIR}/nc_file_checks_data/cmip5_example_1.nc')
+
+    with pytest.warns(nc_audit.HeaderAuditWarning):
+        _DataReadingHeaderCheck(kwargs={"var_id": "lat"})(ds)
+
+    violations = nc_audit.get_violations()
+    assert(len(violations) == 1)
+    assert(violations[0]["check"] == "_DataReadingHeaderCheck")
+    assert(violations[0]["variables"] == ["lat"])
+
+
+def test_header_audit_no_data_read(header_audit):
+    ds = Dataset(f'{EG_DATA_DIR}/nc_file_checks_data/cmip5_example_1.nc')
+    resp = VariableExistsInFileCheck(kwargs={"var_id": "lat"})(ds)
+
+    assert(resp.value == (1, 1))
+    assert(nc_audit.get_violations() == [])
+
+
+@pytest.fixture
+def io_accounting():
+    nc_audit.enable_accounting()
+    yield
+    nc_audit.disable_accounting()
+
+
+def test_io_accounting(io_accounting):
+    ds = Dataset(f'{EG_DATA_DIR}/nc_file_checks_data/amf_eg_data_1.nc')
+    resp = VariableRangeCheck(kwargs={"var_id": "hour", "minimum": 0, "maximum": 24,
+                                      "max_block_bytes": 64})(ds)
+    io = resp.details["io"]
+
+    assert(resp.details["range_check_path"] == "data")
+    assert(io["check"] == "VariableRangeCheck")
+    assert(io["elements"] == ds.variables["hour"].size)
+    assert(io["slices"] == len(list(nc_util.iter_variable_blocks(ds.variables["hour"], 64))))
+    assert(io["variables"]["hour"]["bytes"] == io["bytes"] > 0)
+    assert(io["whole_variables"] == ["hour"])
+
+    resp = VariableExistsInFileCheck(kwargs={"var_id": "hour"})(ds)
+    assert(resp.details["io"]["slices"] == 0)
+    assert(resp.details["io"]["whole_variables"] == [])
+
+
+class _CountingCheck(NCFileCheckBase):
+    """
+    Test check whose score depends on the file: one point per variable.
+    """
+    short_name = "Count variables"
+    header_only = True
+
+    def _get_result(self, primary_arg):
+        out_of = 0
+        for _ in primary_arg.variables:
+            out_of += 1
+        return Result(self.level, (out_of, out_of), self.get_short_name(), [])
+
+
+def test_check_is_frozen_after_setup():
+    check = VariableExistsInFileCheck(kwargs={"var_id": "lat"})
+
+    with pytest.raises(AttributeError):
+        check.out_of = 5
+
+    with pytest.raises(TypeError):
+        check.kwargs["var_id"] = "lon"
+
+    copied = pickle.loads(pickle.dumps(check))
+    assert(copied.get_config_hash() == check.get_config_hash())
+
+    with pytest.raises(TypeError):
+        copied.kwargs["var_id"] = "lon"
+
+
+def test_shared_checks_from_many_threads():
+    # The netCDF library is not thread-safe, so the files are read here and
+    # the threads only share the check instances, header snapshots and paths
+    fnames = ["amf_eg_data_1.nc", "cmip5_example_1.nc", "simple_nc.nc", "day.nc", "day_duff1.nc"]
+    fpaths = [f'{EG_DATA_DIR}/nc_file_checks_data/{fname}' for fname in fnames]
+    snapshots = []
+
+    for fpath in fpaths:
+        with Dataset(fpath) as ds:
+            snapshots.append(HeaderSnapshot.from_dataset(ds))
+
+    checks = [_CountingCheck(kwargs={}),
+              VariableExistsInFileCheck(kwargs={"var_id": "time"}),
+              GlobalAttrRegexCheck(kwargs={"attribute": "Conventions", "regex": "CF-1\\.\\d"}),
+              OneMainVariablePerFileCheck(kwargs={})]
+    file_check = FileNameRegexCheck(kwargs={"regex": r".+\.nc"})
+
+    def run(i):
+        snapshot, fpath = snapshots[i % len(fpaths)], fpaths[i % len(fpaths)]
+        return ([(check(snapshot).value, check(snapshot).msgs) for check in checks] +
+                [file_check(fpath).value])
+
+    expected = [run(i) for i in range(len(fpaths))]
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(run, range(1000)))
+
+    for i, result in enumerate(results):
+        assert(result == expected[i % len(fpaths)])
+
+
+def test_shared_vocab_checks_from_many_threads(tmp_path, monkeypatch):
+    # These checks used to write to instance state while running (`out_of`
+    # and `kwargs`), so the inputs are chosen to give different results
+    archive_dir = str(tmp_path / "pyessv-archive")
+    os.makedirs(archive_dir)
+    monkeypatch.setenv("PYESSV_ARCHIVE_HOME", archive_dir)
+    vocabulary_ref = generators.make_vocab_archive(archive_dir, scope="threads", n_terms=3,
+                                                   n_x=20, n_stations=4)
+
+    fpaths = [generators.make_netcdf_file(str(tmp_path / generators.get_file_name("threads")),
+                                          n_times=5, n_x=20, n_stations=4, n_variables=3),
+              generators.make_netcdf_file(str(tmp_path / "badname.nc"),
+                                          n_times=5, n_x=10, n_stations=2, n_variables=1),
+              f'{EG_DATA_DIR}/nc_file_checks_data/amf_eg_data_1.nc']
+
+    with Dataset(fpaths[1], "a") as ds:
+        ds.variables["var0"].units = "degC"
+        del ds.variables["x"].long_name
+
+    snapshots = []
+
+    for fpath in fpaths:
+        with Dataset(fpath) as ds:
+            snapshots.append(HeaderSnapshot.from_dataset(ds))
+
+    checks = [NetCDFDimensionCheck(kwargs={"dim_id": "x", "pyessv_namespace": "dimension"},
+                                   vocabulary_ref=vocabulary_ref),
+              NCVariableMetadataCheck(kwargs={"var_id": "var1", "pyessv_namespace": "variable"},
+                                      vocabulary_ref=vocabulary_ref),
+              NCMainVariableMetadataCheck(kwargs={"pyessv_namespace": "variable"},
+                                          vocabulary_ref=vocabulary_ref)]
+    file_check = FileNameStructureCheck(kwargs={})
+
+    def run(i):
+        snapshot, fpath = snapshots[i % len(fpaths)], fpaths[i % len(fpaths)]
+        results = [check(snapshot) for check in checks] + [file_check(fpath)]
+        return [(result.value, result.msgs) for result in results]
+
+    expected = [run(i) for i in range(len(fpaths))]
+
+    # The results (and the `out_of` values of the netCDF checks) vary between inputs
+    for i, results in enumerate(zip(*expected)):
+        assert(len(set(value for value, msgs in results)) > 1)
+        if i < len(checks):
+            assert(len(set(value[1] for value, msgs in results)) > 1)
 
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(run, range(1500)))
 
+    for i, result in enumerate(results):
+        assert(result == expected[i % len(fpaths)])
@@ -0,0 +1,55 @@
+"""
+test_dir_util.py
+================
+
+Unit tests for the contents of the checklib.code.dir_util module.
+
+"""
+
+import os
+from unittest import mock
+
+from checklib.code import dir_util
+
+
+def _make_tree(root):
+    for rel_path in ["a.nc", "b.txt", "sub/c.nc", "sub/deeper/d.nc", "skip/e.nc"]:
+        fpath = root / rel_path
+        fpath.parent.mkdir(parents=True, exist_ok=True)
+        fpath.write_text("x" * 10)
+
+
+def _get_names(stat_files):
+    return sorted(os.path.basename(stat_file.filepath()) for stat_file in stat_files)
+
+
+def test_get_files_in_dir(tmp_path):
+    _make_tree(tmp_path)
+    files = dir_util.get_files_in_dir(str(tmp_path))
+
+    assert(sorted(os.path.relpath(fpath, str(tmp_path)) for fpath in files) ==
+           ["a.nc", "b.txt", "skip/e.nc", "sub/c.nc", "sub/deeper/d.nc"])
+
+
+def test_iter_files_in_dir_filters(tmp_path):
+    _make_tree(tmp_path)
+
+    stat_files = list(dir_util.iter_files_in_dir(str(tmp_path), include=["*.nc"], exclude=["skip"]))
+    assert(_get_names(stat_files) == ["a.nc", "c.nc", "d.nc"])
+    assert(all(stat_file.stat().st_size == 10 for stat_file in stat_files))
+
+    assert(_get_names(dir_util.iter_files_in_dir(str(tmp_path), max_depth=0)) == ["a.nc", "b.txt"])
+    assert(_get_names(dir_util.iter_files_in_dir(str(tmp_path), max_depth=1)) ==
+           ["a.nc", "b.txt", "c.nc", "e.nc"])
+
+
+def test_has_too_many_files_stops_early(tmp_path):
+    _make_tree(tmp_path)
+
+    assert(dir_util.has_too_many_files(str(tmp_path), 4) is True)
+    assert(dir_util.has_too_many_files(str(tmp_path), 5) is False)
+
+    with mock.patch.object(dir_util, "StatFile") as stat_file:
+        assert(dir_util.has_too_many_files(str(tmp_path), 1) is True)
+
+    assert(stat_file.from_dir_entry.call_count == 2)
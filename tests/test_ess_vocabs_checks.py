@@ -8,6 +8,8 @@ Unit tests for the contents of the checklib.cvs.ess_vocabs module.
 
 import pytest
 from netCDF4 import Dataset
+
+from tests._common import EG_DATA_DIR
 import checklib.cvs.ess_vocabs as ess_vocabs
 
 
@@ -31,6 +33,16 @@ def test_get_value_string_lookup_data_success_2_ukcp(load_check_test_cvs):
     assert(resp['units'] == 'days since 1970-01-01 00:00:00')
 
 
+@pytest.mark.ukcp
+def test_get_value_string_lookup_repeated_ukcp(load_check_test_cvs):
+    x = ess_vocabs.ESSVocabs('ukcp', 'ukcp18')
+    resp = x.get_value('coordinate:time', property='data')
+
+    # Repeated lookups are served from the term index and value cache
+    assert(x.get_value('coordinate:time', property='data') is resp)
+    assert('time' in x._term_index['coordinate'])
+
+
 @pytest.mark.ncas
 def test_get_value_string_lookup_success_3_ncas(load_check_test_cvs):
     x = ess_vocabs.ESSVocabs('ncas', 'amf')
@@ -75,3 +87,76 @@ def test_get_terms_fail(load_check_test_cvs):
     with pytest.raises(Exception):
         x.get_terms(collection)
 
+
+
+def _fake_vocabs(authority, scope):
+    return object()
+
+
+def test_ESSVocabsRegistry_caches_instances():
+    registry = ess_vocabs.ESSVocabsRegistry(factory=_fake_vocabs)
+    x = registry.get('ukcp', 'ukcp18')
+
+    assert(registry.get('ukcp', 'ukcp18') is x)
+    assert(registry.get('ncas', 'amf') is not x)
+    assert(registry.stats() == {'size': 2, 'max_size': 32, 'hits': 1, 'misses': 2})
+
+
+def test_ESSVocabsRegistry_bounded_size():
+    registry = ess_vocabs.ESSVocabsRegistry(max_size=2, factory=_fake_vocabs)
+    first = registry.get('a', '1')
+    registry.get('b', '2')
+
+    # Access 'a' again so that 'b' is the least recently used
+    registry.get('a', '1')
+    registry.get('c', '3')
+
+    assert(len(registry) == 2)
+    assert(registry.get('a', '1') is first)
+    assert(registry.stats()['misses'] == 3)
+
+
+def test_ESSVocabsRegistry_invalidate():
+    registry = ess_vocabs.ESSVocabsRegistry(factory=_fake_vocabs)
+    x = registry.get('ukcp', 'ukcp18')
+    registry.get('ncas', 'amf')
+
+    assert(registry.invalidate(authority='ukcp') == 1)
+    assert(registry.get('ukcp', 'ukcp18') is not x)
+    assert(registry.invalidate() == 2)
+    assert(len(registry) == 0)
+
+
+@pytest.mark.ukcp
+def test_get_ess_vocabs_shared(load_check_test_cvs):
+    x = ess_vocabs.get_ess_vocabs('ukcp:ukcp18')
+    assert(ess_vocabs.get_ess_vocabs('ukcp:ukcp18:variable') is x)
+
+
+@pytest.mark.ukcp
+def test_check_global_attributes_ukcp(load_check_test_cvs):
+    x = ess_vocabs.ESSVocabs('ukcp', 'ukcp18')
+    ds = Dataset(f'{EG_DATA_DIR}/tasAnom_rcp85_land-prob_uk_25km_percentile_mon_20001201-20011130_good_pcs.nc')
+
+    scores = x.check_global_attributes(ds, {'domain': 'domain:canonical_name',
+                                            'RUBBISH': None})
+    assert(scores == {'domain': 2, 'RUBBISH': 0})
+    assert(x.check_global_attribute(ds, 'domain', 'domain:canonical_name') == 2)
+
+    # Allowed values are cached as a frozenset
+    assert(isinstance(x.get_allowed_values('domain', 'canonical_name'), frozenset))
+
+
+@pytest.mark.eustace
+def test_check_file_names_eustace(load_check_test_cvs):
+    x = ess_vocabs.ESSVocabs('eustace-team', 'eustace')
+    keys = ['institution_id', 'realm', 'frequency']
+    resp = x.check_file_names(['MOHC_ocean_day.nc', 'MOHC_ocean_RUBBISH.nc'], keys=keys)
+
+    assert(resp[0] == (4, []))
+    assert(resp[1] == (1, ['File name does not match global attributes.']))
+
+    # The parser is compiled once and reused for every file name
+    assert(len(x._file_name_parsers) == 1)
+    assert(x.check_file_name('MOHC_ocean_day.nc', keys=keys) == (4, []))
+    assert(len(x._file_name_parsers) == 1)
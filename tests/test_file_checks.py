@@ -58,6 +58,11 @@ def test_FileNameStructureCheck_success():
         resp = x(fpath)
         assert(resp.value == (1, 1))
 
+def test_FileNameStructureCheck_kwargs_unchanged():
+    x = FileNameStructureCheck({})
+    x(f"{EG_DATA_DIR}/file_checks_data/good_file.nc")
+    assert("AC" not in x.kwargs)
+
 def test_FileNameStructureCheck_fail_1():
     bad = [
         (f"{EG_DATA_DIR}/file_checks_data/_bad_file1.nc", {}),
@@ -6,7 +6,13 @@ Unit tests for the contents of the checklib.register.format_checks_register modu
 
 """
 
+from unittest import mock
+
+import pytest
+from netCDF4 import Dataset
+
 from tests._common import EG_DATA_DIR
+from checklib.code import file_util
 from checklib.register.format_checks_register import *
 
 TEST_FILES = [
@@ -35,6 +41,80 @@ def test_NCFileIsReadableCheck_NETCDF3_CLASSIC_fail():
     resp = x(TEST_FILES[1])
     assert (resp.value == (0, 1))
 
+@pytest.mark.parametrize("file_format", ["NETCDF3_CLASSIC", "NETCDF3_64BIT_OFFSET",
+                                         "NETCDF3_64BIT_DATA", "NETCDF4", "NETCDF4_CLASSIC"])
+def test_sniff_netcdf_formats(tmp_path, file_format):
+    fpath = str(tmp_path / "test.nc")
+    ds = Dataset(fpath, "w", format=file_format)
+    ds.createDimension("x", 3)
+    ds.createVariable("x", "f4", ("x",))
+    ds.close()
+
+    # NETCDF4 and NETCDF4_CLASSIC files can only be told apart by opening them
+    if file_format.startswith("NETCDF4"):
+        assert(file_util.sniff_netcdf_formats(fpath) == ("NETCDF4", "NETCDF4_CLASSIC"))
+    else:
+        assert(file_util.sniff_netcdf_formats(fpath) == (file_format,))
+
+
+def test_sniff_netcdf_formats_undecided():
+    assert(file_util.sniff_netcdf_formats('README.md') is None)
+    assert(file_util.sniff_netcdf_formats('not-a-file.nc') is None)
+
+
+def test_NCFileIsReadableCheck_uses_sniffed_format():
+    x = NCFileIsReadableCheck(kwargs={'file_format': 'NETCDF3_CLASSIC'})
+
+    # The file is only opened if the header shows that it may have the format
+    with mock.patch.object(NCFileIsReadableCheck, "_is_readable", return_value=True) as is_readable:
+        assert(x(TEST_FILES[1]).value == (0, 1))
+        assert(is_readable.call_count == 0)
+
+        assert(x(TEST_FILES[0]).value == (1, 1))
+        assert(is_readable.call_count == 1)
+
+
+def test_NCFileIsReadableCheck_large_header(tmp_path):
+    # Many variables and attributes push the netCDF-4 attributes a long way into the file
+    fpath = str(tmp_path / "large_header.nc")
+    ds = Dataset(fpath, "w", format="NETCDF4_CLASSIC")
+    ds.setncatts(dict(("attr_{}".format(i), "value " * 20) for i in range(20)))
+    ds.createDimension("x", 3)
+    for i in range(100):
+        var = ds.createVariable("var{}".format(i), "f4", ("x",))
+        var.setncatts({"units": "K", "long_name": "Variable {}".format(i)})
+    ds.close()
+
+    assert(NCFileIsReadableCheck(kwargs={'file_format': 'NETCDF4_CLASSIC'})(fpath).value == (1, 1))
+    assert(NCFileIsReadableCheck(kwargs={'file_format': 'NETCDF4'})(fpath).value == (0, 1))
+
+
+def test_NCFileIsReadableCheck_nc3_strict_in_attribute(tmp_path):
+    fpath = str(tmp_path / "netcdf4.nc")
+    ds = Dataset(fpath, "w", format="NETCDF4")
+    ds.comment = "Not written with _nc3_strict"
+    ds.close()
+
+    assert(NCFileIsReadableCheck(kwargs={'file_format': 'NETCDF4'})(fpath).value == (1, 1))
+    assert(NCFileIsReadableCheck(kwargs={'file_format': 'NETCDF4_CLASSIC'})(fpath).value == (0, 1))
+
+
+@pytest.mark.parametrize("content", [b"CDF\x01\x00\x00\x00\x00", b"CDF\x01garbage",
+                                     b"\x89HDF\r\n\x1a\n"])
+def test_NCFileIsReadableCheck_corrupt_file(tmp_path, content):
+    fpath = tmp_path / "corrupt.nc"
+    fpath.write_bytes(content)
+
+    for file_format in ("NETCDF3_CLASSIC", "NETCDF4", "NETCDF4_CLASSIC"):
+        x = NCFileIsReadableCheck(kwargs={'file_format': file_format})
+        assert(x(str(fpath)).value == (0, 1))
+
+
+def test_NCFileIsReadableCheck_not_netcdf():
+    x = NCFileIsReadableCheck(kwargs={'file_format': 'NETCDF3_CLASSIC'})
+    resp = x('README.md')
+    assert(resp.value == (0, 1))
+
 def test_NCFileSoftwareCheck_success():
     x = NCFileSoftwareCheck(kwargs={})
     resp = x(TEST_FILES[1])
@@ -45,3 +125,31 @@ def test_NCFileSoftwareCheck_fail():
     resp = x(f'{EG_DATA_DIR}/nc_file_checks_data/simple_nc.cdl')
     assert (resp.value == (0, 2))
 
+def test_NCFileSoftwareCheck_isolated():
+    x = NCFileSoftwareCheck(kwargs={"isolated": "true", "timeout": 120})
+    assert(x(TEST_FILES[1]).value == (2, 2))
+    assert(x(f'{EG_DATA_DIR}/nc_file_checks_data/simple_nc.cdl').value == (0, 2))
+
+def test_NCFileSoftwareCheck_isolated_matches_in_process(tmp_path):
+    # Decoding of the time units fails in xarray, in both modes
+    fpath = str(tmp_path / "bad_time_units.nc")
+
+    with Dataset(fpath, "w") as ds:
+        ds.createDimension("time", 2)
+        time = ds.createVariable("time", "f8", ("time",))
+        time.units = "days since not-a-date"
+        time[:] = [0, 1]
+
+    in_process = NCFileSoftwareCheck(kwargs={})(fpath)
+    isolated = NCFileSoftwareCheck(kwargs={"isolated": "true", "timeout": 120})(fpath)
+    assert(isolated.value == in_process.value)
+    assert(isolated.msgs == in_process.msgs)
+
+def test_NCFileSoftwareCheck_missing_reader():
+    with mock.patch.dict("sys.modules", {"iris": None}):
+        with pytest.raises(ImportError):
+            NCFileSoftwareCheck(kwargs={})(TEST_FILES[1])
+
+    with mock.patch("importlib.util.find_spec", side_effect=lambda name: None):
+        with pytest.raises(ImportError):
+            NCFileSoftwareCheck(kwargs={"isolated": "true", "timeout": 120})(TEST_FILES[1])
@@ -0,0 +1,55 @@
+"""
+test_import_time.py
+===================
+
+Benchmark of the time taken to import checklib and run a file name check
+in a fresh interpreter (as done by short-lived ingest hooks, which use
+`check.run` to get a LightResult without importing compliance_checker).
+
+The time budget (in seconds) can be changed with the environment variable:
+    CHECKLIB_IMPORT_TIME_BUDGET
+
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+# Modules that must not be imported just to run a file name check
+HEAVY_MODULES = ["numpy", "netCDF4", "pyessv", "compliance_checker", "checklib.cvs.ess_vocabs",
+                 "checklib.register.nc_file_checks_register"]
+
+COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+
+import checklib.checks
+from checklib.register import get_check_class
+check = get_check_class("FileNameRegexCheck")(kwargs={{"regex": "README.*"}})
+result = check.run("README.md")
+
+duration = time.perf_counter() - start
+print(json.dumps({{"duration": duration, "value": result.value,
+                  "loaded": [mod for mod in {heavy} if mod in sys.modules]}}))
+"""
+
+
+def _run_cold_start():
+    script = COLD_START_SCRIPT.format(heavy=HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, "-c", script])
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def test_cold_start_does_not_load_heavy_modules():
+    output = _run_cold_start()
+    assert(output["loaded"] == [])
+    assert(output["value"] == [1, 1])
+
+
+def test_cold_start_within_budget():
+    budget = float(os.environ.get("CHECKLIB_IMPORT_TIME_BUDGET", 0.25))
+
+    # Take the best of a few runs to reduce noise from the machine
+    duration = min(_run_cold_start()["duration"] for _ in range(3))
+    assert(duration < budget), "Cold start took {:.3f}s (budget: {}s)".format(duration, budget)
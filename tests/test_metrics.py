@@ -0,0 +1,149 @@
+"""
+test_metrics.py
+===============
+
+Unit tests for the contents of the checklib.code.metrics module.
+
+"""
+
+import json
+import threading
+
+import pytest
+
+from tests._common import EG_DATA_DIR
+from checklib.code import metrics, nc_audit
+from checklib.suite import CheckSuite, ParallelCheckSuite
+from checklib.register.file_checks_register import FileSizeCheck
+from checklib.register.nc_file_checks_register import (VariableExistsInFileCheck,
+                                                       OneMainVariablePerFileCheck,
+                                                       VariableRangeCheck)
+
+
+AMF_FILE = f'{EG_DATA_DIR}/nc_file_checks_data/amf_eg_data_1.nc'
+
+
+@pytest.fixture
+def recorded_metrics():
+    metrics.reset()
+    metrics.enable()
+    yield
+    metrics.disable()
+    metrics.reset()
+
+
+def _get_checks():
+    return [FileSizeCheck(kwargs={"threshold": 0}),
+            VariableExistsInFileCheck(kwargs={"var_id": "hour"}),
+            OneMainVariablePerFileCheck(kwargs={})]
+
+
+def test_metrics_disabled_by_default():
+    metrics.reset()
+    CheckSuite(_get_checks()).run(AMF_FILE)
+    assert(metrics.snapshot() == {"checks": [], "classes": {}})
+
+
+def test_metrics_with_CheckSuite(recorded_metrics):
+    suite = CheckSuite(_get_checks())
+
+    for _ in range(3):
+        suite.run(AMF_FILE)
+
+    data = metrics.snapshot()
+    records = dict((record["check"], record) for record in data["checks"])
+
+    assert(sorted(records) == ["FileSizeCheck", "OneMainVariablePerFileCheck",
+                               "VariableExistsInFileCheck"])
+    assert(records["FileSizeCheck"]["calls"] == 3)
+    assert(records["FileSizeCheck"]["failures"] == 3)
+    assert(records["VariableExistsInFileCheck"]["short_name"] == "Variable exists: hour")
+    assert(records["VariableExistsInFileCheck"]["failures"] == 0)
+    assert(all(record["wall_seconds"] > 0 for record in data["checks"]))
+    assert(data["classes"]["OneMainVariablePerFileCheck"]["calls"] == 3)
+
+    # Snapshots can be serialised as JSON
+    assert(json.loads(metrics.to_json()) == data)
+
+
+def test_metrics_exceptions(recorded_metrics):
+    check = FileSizeCheck(kwargs={})
+
+    with pytest.raises(Exception):
+        check("/no/such/file.nc")
+
+    record = metrics.snapshot()["checks"][0]
+    assert((record["calls"], record["failures"], record["exceptions"]) == (1, 0, 1))
+
+
+def test_metrics_from_many_threads(recorded_metrics):
+    check = FileSizeCheck(kwargs={})
+
+    def run():
+        for _ in range(200):
+            check(AMF_FILE)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert(metrics.snapshot()["classes"]["FileSizeCheck"]["calls"] == 1600)
+
+
+def test_metrics_from_ended_threads(recorded_metrics):
+    check = FileSizeCheck(kwargs={})
+    stores = len(metrics._STORES)
+
+    # Stores of ended threads are folded into the merged metrics
+    for _ in range(50):
+        thread = threading.Thread(target=check, args=(AMF_FILE,))
+        thread.start()
+        thread.join()
+
+    assert(len(metrics._STORES) == stores)
+    assert(metrics.snapshot()["classes"]["FileSizeCheck"]["calls"] == 50)
+
+    check(AMF_FILE)
+    assert(metrics.snapshot()["classes"]["FileSizeCheck"]["calls"] == 51)
+
+
+def test_metrics_with_ParallelCheckSuite(recorded_metrics):
+    suite = ParallelCheckSuite(_get_checks(), workers=2)
+    list(suite.run([AMF_FILE] * 4))
+
+    data = metrics.snapshot()
+    assert(sorted(record["calls"] for record in data["checks"]) == [4, 4, 4])
+
+
+def test_write_prometheus(recorded_metrics, tmp_path):
+    VariableExistsInFileCheck(kwargs={"var_id": 'say "hi"'})(AMF_FILE)
+
+    path = tmp_path / "checklib.prom"
+    metrics.write_prometheus(str(path))
+    content = path.read_text()
+
+    assert("# TYPE checklib_check_calls_total counter" in content)
+    assert('checklib_check_calls_total{check="VariableExistsInFileCheck",'
+           'short_name="Variable exists: say \\"hi\\""} 1' in content)
+    assert(list(tmp_path.iterdir()) == [path])
+
+
+def test_metrics_with_io_accounting(recorded_metrics):
+    checks = [VariableExistsInFileCheck(kwargs={"var_id": "hour"}),
+              VariableRangeCheck(kwargs={"var_id": "hour", "minimum": 0, "maximum": 24})]
+    nc_audit.enable_accounting()
+
+    try:
+        check_runs = CheckSuite(checks).run(AMF_FILE)
+    finally:
+        nc_audit.disable_accounting()
+
+    records = metrics.snapshot()["classes"]
+    io = check_runs[1].result.details["io"]
+
+    assert(records["VariableExistsInFileCheck"]["read_bytes"] == 0)
+    assert(records["VariableRangeCheck"]["read_slices"] == io["slices"] > 0)
+    assert(records["VariableRangeCheck"]["read_bytes"] == io["bytes"] > 0)
+    assert("checklib_check_read_bytes_total" in metrics.to_prometheus())
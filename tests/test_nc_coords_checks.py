@@ -46,6 +46,19 @@ def test_NCCoordVarHasValuesInVocabCheck_fail_1(load_check_test_cvs):
     assert(resp.value == (1, 2))
 
 
+@pytest.mark.ukcp
+def test_NCCoordVarHasValuesInVocabCheck_tolerance_and_blocks(load_check_test_cvs):
+    x = NCCoordVarHasValuesInVocabCheck(kwargs={"var_id": "percentile", "rtol": 0, "atol": 0,
+                                                "max_block_bytes": 16},
+                                 vocabulary_ref="ukcp:ukcp18")
+    resp = x(Dataset(f'{EG_DATA_DIR}/tasAnom_rcp85_land-prob_uk_25km_percentile_mon_20001201-20011130_good_pcs.nc'))
+    assert(resp.value == (2, 2))
+
+    resp = x(Dataset(f'{EG_DATA_DIR}/tasAnom_rcp85_land-prob_uk_25km_percentile_mon_20001201-20011130_bad_pcs.nc'))
+    assert(resp.value == (1, 2))
+    assert("Length is 113" in resp.msgs[0])
+
+
 @pytest.mark.ukcp
 def test_NCCoordVarHasLengthInVocabCheck_success_1(load_check_test_cvs):
     x = NCCoordVarHasLengthInVocabCheck(kwargs={"var_id": "percentile"},
@@ -6,10 +6,14 @@ Unit tests for the contents of the checklib.register.nc_file_checks_register mod
 
 """
 
+from unittest import mock
+
+import numpy as np
 import pytest
 from netCDF4 import Dataset
 
 from tests._common import EG_DATA_DIR
+from checklib.code import nc_audit, nc_util
 from checklib.code.errors import ParameterError
 from checklib.register.nc_file_checks_register import *
 
@@ -97,6 +101,32 @@ def test_GlobalAttrRegexCheck_fail_2():
     assert(resp.value == (1, 2))
 
 
+def test_MultiGlobalAttrRegexCheck_success():
+    x = MultiGlobalAttrRegexCheck(kwargs={"checks": [
+        {"attribute": "Conventions", "regex": "CF-\d+\.\d+"},
+        {"attribute": "project_id", "regex": "EUSTACE"},
+        {"attribute": "creator_email", "regex": ".+@.+\..+"}]})
+    resp = x(Dataset(f'{EG_DATA_DIR}/nc_file_checks_data/simple_nc.nc'))
+    assert(resp.value == (6, 6))
+
+
+def test_MultiGlobalAttrRegexCheck_fail():
+    x = MultiGlobalAttrRegexCheck(kwargs={"checks": [
+        {"attribute": "Conventions", "regex": "garbage - CF-\d+\.\d+"},
+        {"attribute": "sausages", "regex": "CF-\d+\.\d+"},
+        {"attribute": "project_id", "regex": "EUSTACE"}]})
+    resp = x(Dataset(f'{EG_DATA_DIR}/nc_file_checks_data/simple_nc.nc'))
+    assert(resp.value == (3, 6))
+    assert(resp.msgs == ["Required 'Conventions' global attribute value does not match "
+                         "regex 'garbage - CF-\d+\.\d+'.",
+                         "Required 'sausages' global attribute is not present."])
+
+
+def test_MultiGlobalAttrRegexCheck_missing_args():
+    with pytest.raises(ParameterError):
+        MultiGlobalAttrRegexCheck(kwargs={"checks": [{"attribute": "Conventions"}]})
+
+
 @pytest.mark.eustace
 def test_GlobalAttrVocabCheck_success_1(load_check_test_cvs):
     x = GlobalAttrVocabCheck(kwargs={"attribute": "frequency", "vocab_lookup": "frequency:canonical_name"},
@@ -178,6 +208,25 @@ def test_OneMainVariablePerFileCheck_fail():
     assert(resp.value == (0, 1))
 
 
+def test_main_variable_analysis_is_shared():
+    ds = Dataset(f'{EG_DATA_DIR}/nc_file_checks_data/two_vars_nc.nc')
+    analysis = nc_util.get_main_variable_analysis(ds)
+
+    assert(analysis.main_var_id is None)
+    assert(len(analysis.candidates) == 2)
+    assert(nc_util.get_main_variable_analysis(ds) is analysis)
+
+    resp = MainVariableAttributeCheck(kwargs={"attr_name": "units", "attr_value": "K"})(ds)
+    assert(resp.value == (0, 3))
+
+    try:
+        nc_util.get_main_variable(ds)
+    except Exception as ex:
+        assert(str(ex) == "More than one 'main' variable found in netCDF4 file.")
+    else:
+        assert(False), "Expecting Exception, but no exception raised"
+
+
 @pytest.mark.eustace
 # ValidGlobalAttrsMatchFileNameCheck - SUCCESS
 def test_ValidGlobalAttrsMatchFileNameCheck_success_1(load_check_test_cvs):
@@ -472,6 +521,145 @@ def test_VariableRangeCheck_fail_1():
     assert(resp.value == (1, 2)), resp.msgs
 
 
+# Check variable is within valid bounds reading small blocks - SUCCESS and FAIL
+def test_VariableRangeCheck_small_blocks():
+    ds = Dataset(f'{EG_DATA_DIR}/nc_file_checks_data/cmip5_example_1.nc')
+    x = VariableRangeCheck(kwargs={"var_id": "tas", "minimum": 200, "maximum": 330.,
+                                   "max_block_bytes": 1024})
+    assert(x(ds).value == (2, 2))
+
+    x = VariableRangeCheck(kwargs={"var_id": "tas", "minimum": 250, "maximum": 250.,
+                                   "max_block_bytes": 1024})
+    assert(x(ds).value == (1, 2))
+
+    # The masking and scaling settings of the variable are restored after reading
+    assert(ds.variables["tas"].mask and ds.variables["tas"].scale)
+
+    ds.variables["tas"].set_auto_mask(False)
+    assert(x(ds).value == (1, 2))
+    assert(not ds.variables["tas"].mask and ds.variables["tas"].scale)
+
+
+# Check variable range of unsigned bytes (stored as signed with _Unsigned = "true")
+def test_VariableRangeCheck_unsigned(tmp_path):
+    fpath = str(tmp_path / "unsigned.nc")
+    ds = Dataset(fpath, "w")
+    ds.createDimension("x", 6)
+    var = ds.createVariable("b", "i1", ("x",), fill_value=np.int8(-1))
+    var._Unsigned = "true"
+    var.missing_value = np.int8(-56)
+    var[:] = np.array([5, 100, 200, 255, 156, 7], dtype="u1").view("i1")
+    scalar = ds.createVariable("s", "f4", ())
+    scalar[...] = 1.5
+    ds.close()
+
+    ds = Dataset(fpath)
+
+    # 255 (fill value) and 200 (missing value) are excluded: 5 to 156 remain
+    x = VariableRangeCheck(kwargs={"var_id": "b", "minimum": 5, "maximum": 156})
+    assert(x(ds).value == (2, 2))
+
+    x = VariableRangeCheck(kwargs={"var_id": "b", "minimum": 6, "maximum": 255})
+    assert(x(ds).value == (1, 2))
+
+    x = VariableRangeCheck(kwargs={"var_id": "s", "minimum": 1, "maximum": 2})
+    assert(x(ds).value == (2, 2))
+
+
+# Check variable range using the valid_min/valid_max attributes only - SUCCESS
+def test_VariableRangeCheck_use_metadata_success():
+    x = VariableRangeCheck(kwargs={"var_id": "hour", "minimum": 0, "maximum": 24,
+                                   "use_metadata": True})
+    resp = x(Dataset(f"{EG_DATA_DIR}/nc_file_checks_data/amf_eg_data_1.nc"))
+    assert(resp.value == (2, 2))
+    assert(resp.details == {"range_check_path": "metadata",
+                            "range_attrs": ["valid_min", "valid_max"]})
+
+
+# Check variable range falls back to reading the data if the attributes do not settle it
+def test_VariableRangeCheck_use_metadata_fallback():
+    x = VariableRangeCheck(kwargs={"var_id": "hour", "minimum": 0, "maximum": 20,
+                                   "use_metadata": True})
+    resp = x(Dataset(f"{EG_DATA_DIR}/nc_file_checks_data/amf_eg_data_1.nc"))
+    assert(resp.details == {"range_check_path": "data"})
+
+    x = VariableRangeCheck(kwargs={"var_id": "tas", "minimum": 200, "maximum": 330.,
+                                   "use_metadata": True})
+    resp = x(Dataset(f'{EG_DATA_DIR}/nc_file_checks_data/cmip5_example_1.nc'))
+    assert(resp.value == (2, 2))
+    assert(resp.details == {"range_check_path": "data"})
+
+
+# Check variable range fails from the actual_range attribute without reading the data
+def test_VariableRangeCheck_use_metadata_outside(tmp_path):
+    fpath = str(tmp_path / "actual_range.nc")
+    ds = Dataset(fpath, "w")
+    ds.createDimension("x", 3)
+    var = ds.createVariable("hour", "f4", ("x",))
+    var.actual_range = np.array([0, 30], dtype="f4")
+    var[:] = [0, 12, 30]
+    masked = ds.createVariable("masked", "f4", ("x",))
+    masked.actual_range = np.array([0, 30], dtype="f4")
+    masked.valid_max = np.float32(28)
+    masked[:] = [0, 12, 30]
+    ds.close()
+
+    ds = Dataset(fpath)
+    x = VariableRangeCheck(kwargs={"var_id": "hour", "minimum": 0, "maximum": 24,
+                                   "use_metadata": True})
+
+    with mock.patch.object(nc_util, "variable_is_within_valid_bounds") as read_data:
+        resp = x(ds)
+
+    assert(read_data.call_count == 0)
+    assert(resp.value == (1, 2))
+    assert(resp.details == {"range_check_path": "metadata", "range_attrs": ["actual_range"]})
+
+    # The maximum is masked (by valid_max) so the attributes do not settle it
+    x = VariableRangeCheck(kwargs={"var_id": "masked", "minimum": 0, "maximum": 24,
+                                   "use_metadata": True})
+    resp = x(ds)
+    assert(resp.value == (2, 2))
+    assert(resp.details == {"range_check_path": "data"})
+
+
+# Check variable range ignores an actual_range attribute that does not hold two values
+def test_VariableRangeCheck_use_metadata_bad_actual_range(tmp_path):
+    fpath = str(tmp_path / "bad_actual_range.nc")
+    ds = Dataset(fpath, "w")
+    ds.createDimension("x", 3)
+    scalar = ds.createVariable("scalar", "f4", ("x",))
+    scalar.actual_range = 5.0
+    scalar.valid_min = np.float32(0)
+    scalar.valid_max = np.float32(10)
+    scalar[:] = [0, 5, 10]
+    single = ds.createVariable("single", "f4", ("x",))
+    single.actual_range = np.array([5], dtype="f4")
+    single[:] = [0, 5, 10]
+    ds.close()
+
+    ds = Dataset(fpath)
+
+    # Falls back to valid_min/valid_max
+    x = VariableRangeCheck(kwargs={"var_id": "scalar", "minimum": 0, "maximum": 10,
+                                   "use_metadata": True})
+    resp = x(ds)
+    assert(resp.value == (2, 2))
+    assert(resp.details == {"range_check_path": "metadata",
+                            "range_attrs": ["valid_min", "valid_max"]})
+
+    # Falls back to reading the data
+    x = VariableRangeCheck(kwargs={"var_id": "single", "minimum": 0, "maximum": 10,
+                                   "use_metadata": True})
+    resp = x(ds)
+    assert(resp.value == (2, 2))
+    assert(resp.details == {"range_check_path": "data"})
+
+    x = VariableRangeCheck(kwargs={"var_id": "single", "minimum": 0, "maximum": 4,
+                                   "use_metadata": True})
+    assert(x(ds).value == (1, 2))
+
+
 # Check variable is within valid bounds - FAIL (no variable in file)
 def test_VariableRangeCheck_fail_2():
     x = VariableRangeCheck(kwargs={"var_id": "tasTADOS", "minimum": 250, "maximum": 250.})
@@ -554,6 +742,40 @@ def test_NetCDFFormatCheck_fail():
     assert(resp.msgs[0] == "The NetCDF sub-format must be: NOTcdf.")
 
 
+def test_NetCDFFormatCheck_file_path():
+    x = NetCDFFormatCheck(kwargs={"format": "NETCDF4_CLASSIC"})
+    assert(x(f'{EG_DATA_DIR}/nc_file_checks_data/simple_nc4.nc').value == (1, 1))
+    assert(x(f'{EG_DATA_DIR}/nc_file_checks_data/simple_nc.nc').value == (0, 1))
+    assert(x('README.md').value == (0, 1))
+    assert(x('not-a-file.nc').value == (0, 1))
+
+
+def test_NetCDFFormatCheck_audited():
+    x = NetCDFFormatCheck(kwargs={"format": "NETCDF3_CLASSIC"})
+    ds = Dataset(f'{EG_DATA_DIR}/nc_file_checks_data/simple_nc.nc')
+
+    for enable, disable in [(nc_audit.enable, nc_audit.disable),
+                            (nc_audit.enable_accounting, nc_audit.disable_accounting)]:
+        enable()
+        try:
+            assert(x(ds).value == (1, 1))
+        finally:
+            disable()
+
+
+def test_NetCDFFormatCheck_large_header(tmp_path):
+    fpath = str(tmp_path / "large_header.nc")
+    ds = Dataset(fpath, "w", format="NETCDF4_CLASSIC")
+    ds.setncatts(dict(("attr_{}".format(i), "value " * 20) for i in range(20)))
+    ds.createDimension("x", 3)
+    for i in range(100):
+        ds.createVariable("var{}".format(i), "f4", ("x",)).units = "K"
+    ds.close()
+
+    assert(NetCDFFormatCheck(kwargs={"format": "NETCDF4_CLASSIC"})(fpath).value == (1, 1))
+    assert(NetCDFFormatCheck(kwargs={"format": "NETCDF4"})(fpath).value == (0, 1))
+
+
 @pytest.mark.ncas
 def test_NetCDFDimensionCheck_success_1(load_check_test_cvs):
     ncfile = f"{EG_DATA_DIR}/nc_file_checks_data/amf_eg_data_1.nc"
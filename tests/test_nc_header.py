@@ -0,0 +1,167 @@
+"""
+test_nc_header.py
+=================
+
+Unit tests for the contents of the checklib.code.nc_header module.
+
+"""
+
+import pickle
+from unittest import mock
+
+import pytest
+from netCDF4 import Dataset
+from compliance_checker.base import Result
+
+from tests._common import EG_DATA_DIR
+from checklib.code import nc_util
+from checklib.code.nc_header import HeaderSnapshot, HeaderOnlyError, get_header_snapshot
+from checklib.register.file_checks_register import FileSizeCheck
+from checklib.register.nc_file_checks_register import (GlobalAttrRegexCheck, MainVariableAttributeCheck,
+                                                       NetCDFFormatCheck, OneMainVariablePerFileCheck,
+                                                       VariableExistsInFileCheck, VariableRangeCheck,
+                                                       VariableTypeCheck, NCVariableMetadataCheck)
+from checklib.register.nc_coords_checks_register import NCCoordVarHasBoundsCheck
+
+
+TAS_FILE = f'{EG_DATA_DIR}/tasAnom_rcp85_land-prob_uk_25km_cdf_mon_20001201-20011130.nc'
+
+
+def _get_header_checks():
+    return [GlobalAttrRegexCheck(kwargs={"attribute": "institution_id", "regex": "MOHC"}),
+            GlobalAttrRegexCheck(kwargs={"attribute": "missing", "regex": ".+"}),
+            MainVariableAttributeCheck(kwargs={"attr_name": "units", "attr_value": "K"}),
+            NetCDFFormatCheck(kwargs={"format": "NETCDF4_CLASSIC"}),
+            OneMainVariablePerFileCheck(kwargs={}),
+            VariableExistsInFileCheck(kwargs={"var_id": "tasAnom"}),
+            VariableTypeCheck(kwargs={"var_id": "tasAnom", "dtype": "float32"}),
+            NCCoordVarHasBoundsCheck(kwargs={"var_id": "projection_x_coordinate"})]
+
+
+def test_HeaderSnapshot_matches_dataset():
+    ds = Dataset(TAS_FILE)
+    snapshot = HeaderSnapshot.from_dataset(ds)
+
+    assert(snapshot.filepath() == ds.filepath())
+    assert(snapshot.file_format == ds.file_format)
+    assert(snapshot.ncattrs() == ds.ncattrs())
+    assert(snapshot.variable == ds.variable == snapshot.getncattr("variable"))
+    assert(list(snapshot.dimensions) == list(ds.dimensions))
+    assert(snapshot.dimensions["time"].isunlimited())
+    assert(len(snapshot.dimensions["percentile"]) == 111)
+
+    variable = snapshot.variables["tasAnom"]
+    assert(variable is snapshot["tasAnom"])
+    assert(variable.dtype == ds.variables["tasAnom"].dtype)
+    assert(variable.dimensions == ds.variables["tasAnom"].dimensions)
+    assert(variable.shape == ds.variables["tasAnom"].shape)
+    assert(variable.chunking() == ds.variables["tasAnom"].chunking())
+    assert(variable.units == "K")
+    assert(variable.__dict__ == ds.variables["tasAnom"].__dict__)
+
+    assert(nc_util.get_header_fingerprint(snapshot) == nc_util.get_header_fingerprint(ds))
+
+
+def test_HeaderSnapshot_is_immutable_and_picklable():
+    snapshot = HeaderSnapshot.from_dataset(Dataset(TAS_FILE))
+
+    with pytest.raises(AttributeError):
+        snapshot.variable = "tas"
+
+    with pytest.raises(AttributeError):
+        snapshot.variables["tasAnom"].units = "degC"
+
+    with pytest.raises(AttributeError):
+        snapshot.not_an_attribute
+
+    copy = pickle.loads(pickle.dumps(snapshot))
+    assert(copy.filepath() == snapshot.filepath())
+    assert(copy.__dict__ == snapshot.__dict__)
+    assert(copy.variables["tasAnom"].__dict__ == snapshot.variables["tasAnom"].__dict__)
+    assert(nc_util.get_header_fingerprint(copy) == nc_util.get_header_fingerprint(snapshot))
+
+
+def test_HeaderSnapshot_mappings_are_read_only():
+    snapshot = HeaderSnapshot.from_dataset(Dataset(TAS_FILE))
+
+    for copy in (snapshot, pickle.loads(pickle.dumps(snapshot))):
+        variable = copy.variables["tasAnom"]
+
+        with pytest.raises(TypeError):
+            copy.dimensions["y"] = 1
+
+        with pytest.raises(TypeError):
+            copy.variables["v"] = variable
+
+        with pytest.raises(TypeError):
+            copy._attrs["title"] = "changed"
+
+        with pytest.raises(TypeError):
+            variable._attrs["units"] = "degC"
+
+        assert(variable.units == "K")
+        assert("y" not in copy.dimensions)
+
+
+def test_HeaderSnapshot_has_no_data():
+    snapshot = HeaderSnapshot.from_dataset(Dataset(TAS_FILE))
+
+    with pytest.raises(HeaderOnlyError):
+        snapshot.variables["percentile"][:]
+
+
+def test_get_header_snapshot_is_cached():
+    ds = Dataset(TAS_FILE)
+    snapshot = get_header_snapshot(ds)
+
+    assert(get_header_snapshot(ds) is snapshot)
+    assert(get_header_snapshot(snapshot) is snapshot)
+
+
+def test_header_checks_accept_snapshot():
+    ds = Dataset(TAS_FILE)
+    snapshot = pickle.loads(pickle.dumps(HeaderSnapshot.from_dataset(ds)))
+
+    for check in _get_header_checks():
+        expected, result = check(ds), check(snapshot)
+        assert(isinstance(result, Result))
+        assert((result.value, result.msgs) == (expected.value, expected.msgs)), check.__class__.__name__
+
+
+def test_data_checks_reject_snapshot():
+    snapshot = HeaderSnapshot.from_dataset(Dataset(TAS_FILE))
+
+    x = VariableRangeCheck(kwargs={"var_id": "tasAnom", "minimum": -10, "maximum": 10})
+    resp = x(snapshot)
+    assert(resp.value == (0, 2))
+    assert(resp.msgs == f"Object for testing is not a netCDF4 Dataset: {snapshot}")
+
+    # File checks use the path of the file
+    resp = FileSizeCheck(kwargs={"threshold": 2})(snapshot)
+    assert(resp.value == (1, 1))
+
+
+def test_HeaderSnapshot_private_attributes():
+    snapshot = HeaderSnapshot.from_dataset(Dataset(TAS_FILE))
+    variable = snapshot.variables["tasAnom"]
+
+    assert(getattr(variable, "_FillValue") == 1e20)
+    assert(nc_util.check_nc_attribute(variable, "_FillValue", 1e20))
+
+    # Slots are not looked up in the attributes
+    with pytest.raises(AttributeError):
+        _ = pickle.loads(pickle.dumps(variable))._not_an_attribute
+
+
+def test_NCVariableMetadataCheck_FillValue_on_snapshot():
+    ds = Dataset(TAS_FILE)
+    snapshot = HeaderSnapshot.from_dataset(ds)
+
+    x = NCVariableMetadataCheck(kwargs={"var_id": "tasAnom", "pyessv_namespace": "variable"},
+                                vocabulary_ref="test:vocabs")
+
+    with mock.patch("checklib.register.nc_file_checks_register.get_ess_vocabs") as get_ess_vocabs:
+        get_ess_vocabs.return_value.get_value.return_value = {"_FillValue": 1e20, "units": "K"}
+        expected, resp = x(ds), x(snapshot)
+
+    assert(resp.value == expected.value == (5, 5))
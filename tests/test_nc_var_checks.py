@@ -30,3 +30,4 @@ def test_NCArrayMatchesVocabTermsCheck_fail(load_check_test_cvs):
                                       vocabulary_ref='ukcp:ukcp18')
     resp = x(Dataset(f'{EG_DATA_DIR}/river_basin_bad_order.nc'))
     assert(resp.value == (0, 1)), resp.msgs
+    assert("first mismatch at index" in resp.msgs[0])
@@ -0,0 +1,102 @@
+"""
+test_proc_util.py
+=================
+
+Unit tests for the contents of the checklib.code.proc_util module.
+
+"""
+
+import os
+import time
+
+import pytest
+
+from checklib.code import proc_util
+
+
+def _get_pid():
+    return os.getpid()
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def _raise():
+    raise ValueError("bad value")
+
+
+def _crash():
+    os._exit(3)
+
+
+def _allocate(n_bytes):
+    return len(bytearray(n_bytes))
+
+
+@pytest.fixture
+def pool():
+    pool = proc_util.ProcessPool(size=1, timeout=10)
+    yield pool
+    pool.close()
+
+
+def test_ProcessPool_reuses_worker(pool):
+    pid = pool.run(_get_pid)
+    assert(pid != os.getpid())
+    assert(pool.run(_get_pid) == pid)
+
+
+def test_ProcessPool_timeout_replaces_worker(pool):
+    pid = pool.run(_get_pid)
+
+    with pytest.raises(proc_util.ProcessTimeout):
+        pool.run(_sleep, 10, timeout=0.5)
+
+    assert(pool.run(_get_pid) != pid)
+
+
+def test_ProcessPool_failures(pool):
+    pid = pool.run(_get_pid)
+
+    with pytest.raises(proc_util.ProcessFailure, match="ValueError: bad value"):
+        pool.run(_raise)
+
+    # Worker is kept after an exception in the task, but replaced if it dies
+    assert(pool.run(_get_pid) == pid)
+
+    with pytest.raises(proc_util.ProcessFailure, match="exited with code: 3"):
+        pool.run(_crash)
+
+    assert(pool.run(_get_pid) != pid)
+
+
+def test_ProcessPool_memory_limit():
+    pool = proc_util.ProcessPool(size=1, timeout=10, memory_limit=2**30)
+
+    try:
+        assert(pool.run(_allocate, 2**20) == 2**20)
+
+        with pytest.raises(proc_util.ProcessFailure, match="MemoryError"):
+            pool.run(_allocate, 2**31)
+    finally:
+        pool.close()
+
+
+def test_ProcessPool_startup_timeout():
+    pool = proc_util.ProcessPool(size=1, timeout=10, initializer=_sleep, initargs=(60,),
+                                 startup_timeout=2)
+
+    try:
+        start = time.time()
+
+        with pytest.raises(proc_util.ProcessTimeout, match="did not start within 2 seconds"):
+            pool.run(_get_pid)
+
+        assert(time.time() - start < 30)
+
+        # The worker is killed (and a new one is started when next needed)
+        assert(not pool._all_workers)
+    finally:
+        pool.close()
@@ -0,0 +1,65 @@
+"""
+test_register.py
+================
+
+Unit tests for the check registry in the checklib.register package.
+
+"""
+
+import importlib
+import pkgutil
+
+import pytest
+
+import checklib.register
+from checklib.code.errors import RegistryError
+from checklib.checks import ALL_CHECKS
+from checklib.register import CHECK_MODULES, CHECK_REGISTRY, get_check_class
+
+
+def test_CHECK_MODULES_is_complete():
+    for module_info in pkgutil.iter_modules(checklib.register.__path__):
+        importlib.import_module("checklib.register.{}".format(module_info.name))
+
+    registered = dict((name, cls.__module__.split(".")[-1]) for name, cls in CHECK_REGISTRY.items()
+                      if cls.__module__.startswith("checklib.register."))
+
+    assert(registered == CHECK_MODULES)
+    assert(ALL_CHECKS == sorted(CHECK_MODULES))
+
+
+def test_get_check_class_success():
+    cls = get_check_class("NCFileIsReadableCheck")
+    assert(cls.__name__ == "NCFileIsReadableCheck")
+    assert(checklib.register.NCFileIsReadableCheck is cls)
+
+
+def test_get_check_class_fail():
+    for id in ["NotACheck", "CallableCheckBase", "__import__('os')"]:
+        try:
+            get_check_class(id)
+        except Exception as ex:
+            assert(str(ex) == "Cannot identify Check with identifier: {}".format(id))
+        else:
+            assert(False), "Expecting Exception, but no exception raised"
+
+
+def test_registry_rejects_duplicate_names():
+    original = get_check_class("FileSizeCheck")
+    base = checklib.register.FileCheckBase
+
+    with pytest.raises(RegistryError):
+        class FileSizeCheck(base):
+            pass
+
+    assert(CHECK_REGISTRY["FileSizeCheck"] is original)
+
+    # A class that is defined again (e.g. when its module is reloaded) replaces the old one
+    try:
+        class FileSizeCheck(base):
+            __module__ = original.__module__
+            __qualname__ = original.__qualname__
+
+        assert(get_check_class("FileSizeCheck") is FileSizeCheck)
+    finally:
+        CHECK_REGISTRY["FileSizeCheck"] = original
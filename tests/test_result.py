@@ -0,0 +1,59 @@
+"""
+test_result.py
+==============
+
+Unit tests for the contents of the checklib.code.result module.
+
+"""
+
+import sys
+from unittest import mock
+
+from compliance_checker.base import Result
+
+from checklib.code.result import LightResult, make_result, to_result
+from checklib.register.file_checks_register import FileNameRegexCheck
+
+
+def test_make_result():
+    # The type does not depend on the modules already imported
+    assert(type(make_result(3, (1, 1), "name")) is LightResult)
+
+    with mock.patch.dict(sys.modules, {"compliance_checker.base": None}):
+        assert(type(make_result(3, (1, 1), "name")) is LightResult)
+
+
+def test_LightResult_matches_Result():
+    args = (3, (1, 2), "Check name", ["Message."])
+    light, result = LightResult(*args), Result(*args)
+
+    # LightResult is a duck type of Result
+    public = set(name for name in vars(result) if not name.startswith("_"))
+    assert(public <= set(vars(light)))
+    assert(all(hasattr(light, name) for name in ("serialize", "__repr__", "__eq__")))
+
+    assert(light.serialize() == result.serialize())
+    assert(repr(light) == repr(result))
+    assert(light == result)
+
+    converted = light.to_result()
+    assert(isinstance(converted, Result))
+    assert(converted == result)
+    assert(to_result(light) == result)
+    assert(to_result(result) is result)
+
+
+def test_check_result_types():
+    check = FileNameRegexCheck(kwargs={"regex": "README.*"})
+
+    # Calling a check always gives a Result; `run` gives the LightResult
+    for modules in ({}, {"compliance_checker.base": None}):
+        with mock.patch.dict(sys.modules, modules):
+            light = check.run("README.md")
+
+        assert(type(light) is LightResult)
+        assert(light.value == (1, 1))
+
+    resp = check("README.md")
+    assert(type(resp) is Result)
+    assert(resp == light)
@@ -0,0 +1,117 @@
+"""
+test_suite.py
+=============
+
+Unit tests for the contents of the checklib.suite module.
+
+"""
+
+import sys
+from unittest import mock
+
+import pytest
+from netCDF4 import Dataset
+
+from tests._common import EG_DATA_DIR
+from checklib import suite as suite_module
+from checklib.code import file_util
+from checklib.code.errors import ParameterError
+from checklib.suite import CheckSuite, ParallelCheckSuite
+from checklib.register.file_checks_register import FileSizeCheck, FileNameRegexCheck
+from checklib.register.format_checks_register import NCFileIsReadableCheck
+from checklib.register.nc_file_checks_register import (OneMainVariablePerFileCheck,
+                                                       GlobalAttrRegexCheck)
+
+
+SIMPLE_NC4 = f'{EG_DATA_DIR}/nc_file_checks_data/simple_nc4.nc'
+
+
+def _get_checks():
+    return [FileSizeCheck(kwargs={}),
+            FileNameRegexCheck(kwargs={"regex": r"simple_nc4\.nc"}),
+            NCFileIsReadableCheck(kwargs={"file_format": "NETCDF4_CLASSIC"}),
+            OneMainVariablePerFileCheck(kwargs={}),
+            GlobalAttrRegexCheck(kwargs={"attribute": "sausages", "regex": ".+"})]
+
+
+def test_CheckSuite_success():
+    check_runs = CheckSuite(_get_checks()).run(SIMPLE_NC4)
+
+    assert([run.result.value for run in check_runs] == [(1, 1), (1, 1), (1, 1), (1, 1), (0, 2)])
+    assert(all(run.duration >= 0 for run in check_runs))
+
+
+def test_CheckSuite_stats_and_opens_once():
+    with mock.patch("os.stat", wraps=file_util.os.stat) as stat, \
+         mock.patch("checklib.suite.Dataset", wraps=Dataset) as open_ds:
+        CheckSuite(_get_checks()).run(SIMPLE_NC4)
+
+    assert([call.args[0] for call in stat.call_args_list].count(SIMPLE_NC4) == 1)
+    assert(open_ds.call_count == 1)
+
+
+def test_CheckSuite_no_dataset_opened_for_file_checks():
+    with mock.patch("checklib.suite.Dataset") as open_ds:
+        check_runs = CheckSuite([FileSizeCheck(kwargs={})]).run('README.md')
+
+    assert(check_runs[0].result.value == (1, 1))
+    assert(open_ds.call_count == 0)
+
+
+def test_CheckSuite_file_is_not_netcdf():
+    check_runs = CheckSuite([FileSizeCheck(kwargs={}),
+                             OneMainVariablePerFileCheck(kwargs={})]).run('README.md')
+
+    assert(check_runs[0].result.value == (1, 1))
+    assert(check_runs[1].result.value == (0, 1))
+    assert(check_runs[1].result.msgs[0].startswith("File could not be opened as a netCDF4 Dataset"))
+
+
+PARALLEL_FILES = [SIMPLE_NC4, 'README.md',
+                  f'{EG_DATA_DIR}/nc_file_checks_data/simple_nc.nc',
+                  f'{EG_DATA_DIR}/nc_file_checks_data/two_vars_nc.nc']
+
+
+def _get_values(file_run):
+    return [check_run.result.value for check_run in file_run.check_runs]
+
+
+def test_ParallelCheckSuite_ordered_matches_serial():
+    checks = _get_checks()
+    expected = [[run.result.value for run in CheckSuite(checks).run(fpath)]
+                for fpath in PARALLEL_FILES]
+
+    file_runs = list(ParallelCheckSuite(checks, workers=2, chunksize=1).run(PARALLEL_FILES))
+
+    assert([file_run.fpath for file_run in file_runs] == PARALLEL_FILES)
+    assert([_get_values(file_run) for file_run in file_runs] == expected)
+    assert(all(file_run.check_runs[0].check is checks[0] for file_run in file_runs))
+
+
+def test_ParallelCheckSuite_as_completed():
+    checks = _get_checks()
+    suite = ParallelCheckSuite(checks, workers=2, chunksize=3)
+
+    file_runs = dict((file_run.fpath, _get_values(file_run))
+                     for file_run in suite.run(iter(PARALLEL_FILES), ordered=False))
+
+    assert(sorted(file_runs) == sorted(PARALLEL_FILES))
+    assert(file_runs[SIMPLE_NC4] == [(1, 1), (1, 1), (1, 1), (1, 1), (0, 2)])
+
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="requires Python 3.11 or later")
+def test_ParallelCheckSuite_max_tasks_per_child():
+    suite = ParallelCheckSuite([FileSizeCheck(kwargs={})], workers=1, max_tasks_per_child=1)
+    file_runs = list(suite.run(PARALLEL_FILES[:2]))
+
+    assert(suite.mp_context.get_start_method() == "spawn")
+    assert([_get_values(file_run) for file_run in file_runs] == [[(1, 1)], [(1, 1)]])
+
+
+def test_ParallelCheckSuite_max_tasks_per_child_unsupported():
+    with mock.patch.object(suite_module, "_HAS_MAX_TASKS_PER_CHILD", False):
+        with pytest.raises(ParameterError):
+            ParallelCheckSuite([FileSizeCheck(kwargs={})], workers=1, max_tasks_per_child=1)
+
+        # Workers are never replaced by default
+        ParallelCheckSuite([FileSizeCheck(kwargs={})], workers=1)